@@ -9,8 +9,9 @@ from alembic import context
 from app.core.config import settings
 from app.core.database import Base
 from app.models.user import User
-from app.models.group import Group, GroupMember
-from app.models.match import MatchRequest
+from app.models.group import Group, GroupMember, GroupCentroid, GroupProposal, GroupProposalMember
+from app.models.match import MatchRequest, UserMatchCandidate, PairScore, MatchExclusion, LobbyEntry, LobbyProposal
+from app.models.interest import Interest
 from app.models.message import Message
 from app.models.event import CalendarEvent
 from app.models.task import GroupTask, GroupTaskCompletion
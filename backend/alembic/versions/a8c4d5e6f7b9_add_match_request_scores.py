@@ -0,0 +1,29 @@
+"""Store compatibility score and breakdown on match requests
+
+Revision ID: a8c4d5e6f7b9
+Revises: f7a3b4c5d6e8
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c4d5e6f7b9'
+down_revision: Union[str, None] = 'f7a3b4c5d6e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('match_requests', sa.Column('compatibility_score', sa.Integer(), nullable=True))
+    op.add_column('match_requests', sa.Column('score_breakdown', sa.JSON(), nullable=True))
+    # Pending requests are scored by matching_service.backfill_request_scores at startup
+
+
+def downgrade() -> None:
+    op.drop_column('match_requests', 'score_breakdown')
+    op.drop_column('match_requests', 'compatibility_score')
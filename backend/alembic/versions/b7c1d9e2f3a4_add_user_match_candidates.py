@@ -0,0 +1,42 @@
+"""Add user_match_candidates table
+
+Revision ID: b7c1d9e2f3a4
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c1d9e2f3a4'
+down_revision: Union[str, None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_match_candidates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('candidate_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('compatibility_score', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['candidate_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_match_candidates_id'), 'user_match_candidates', ['id'], unique=False)
+    op.create_index(op.f('ix_user_match_candidates_candidate_id'), 'user_match_candidates', ['candidate_id'], unique=False)
+    op.create_index('ix_user_match_candidates_user_rank', 'user_match_candidates', ['user_id', 'rank'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_match_candidates_user_rank', table_name='user_match_candidates')
+    op.drop_index(op.f('ix_user_match_candidates_candidate_id'), table_name='user_match_candidates')
+    op.drop_index(op.f('ix_user_match_candidates_id'), table_name='user_match_candidates')
+    op.drop_table('user_match_candidates')
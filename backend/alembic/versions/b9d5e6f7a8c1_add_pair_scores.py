@@ -0,0 +1,43 @@
+"""Add symmetric pair score store and user profile versions
+
+Revision ID: b9d5e6f7a8c1
+Revises: a8c4d5e6f7b9
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d5e6f7a8c1'
+down_revision: Union[str, None] = 'a8c4d5e6f7b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('profile_version', sa.Integer(), nullable=False, server_default='1'))
+    op.create_table('pair_scores',
+    sa.Column('user_low_id', sa.Integer(), nullable=False),
+    sa.Column('user_high_id', sa.Integer(), nullable=False),
+    sa.Column('low_version', sa.Integer(), nullable=False),
+    sa.Column('high_version', sa.Integer(), nullable=False),
+    sa.Column('compatibility_score', sa.Integer(), nullable=False),
+    sa.Column('interest_score', sa.Float(), nullable=False),
+    sa.Column('personality_score', sa.Float(), nullable=False),
+    sa.Column('goal_score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_low_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_high_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_low_id', 'user_high_id')
+    )
+    op.create_index(op.f('ix_pair_scores_user_high_id'), 'pair_scores', ['user_high_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pair_scores_user_high_id'), table_name='pair_scores')
+    op.drop_table('pair_scores')
+    op.drop_column('users', 'profile_version')
@@ -0,0 +1,37 @@
+"""Add group centroids for group-aware matching
+
+Revision ID: c1e6f7a8b9d2
+Revises: b9d5e6f7a8c1
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1e6f7a8b9d2'
+down_revision: Union[str, None] = 'b9d5e6f7a8c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing groups get their centroids from the startup backfill
+    op.create_table('group_centroids',
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('member_count', sa.Integer(), nullable=False),
+    sa.Column('personality_sums', sa.JSON(), nullable=False),
+    sa.Column('personality_counts', sa.JSON(), nullable=False),
+    sa.Column('interest_counts', sa.JSON(), nullable=False),
+    sa.Column('goal_counts', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.PrimaryKeyConstraint('group_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('group_centroids')
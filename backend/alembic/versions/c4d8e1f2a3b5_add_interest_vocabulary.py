@@ -0,0 +1,36 @@
+"""Add interest vocabulary and packed interest bitsets
+
+Revision ID: c4d8e1f2a3b5
+Revises: b7c1d9e2f3a4
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e1f2a3b5'
+down_revision: Union[str, None] = 'b7c1d9e2f3a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('interest_vocabulary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_interest_vocabulary_id'), 'interest_vocabulary', ['id'], unique=False)
+    # Bitsets are filled in by interest_service.backfill_interest_bits on startup
+    op.add_column('users', sa.Column('interest_bits', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'interest_bits')
+    op.drop_index(op.f('ix_interest_vocabulary_id'), table_name='interest_vocabulary')
+    op.drop_table('interest_vocabulary')
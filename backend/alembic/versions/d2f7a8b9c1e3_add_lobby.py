@@ -0,0 +1,57 @@
+"""Add lobby entries and proposals for real-time matchmaking
+
+Revision ID: d2f7a8b9c1e3
+Revises: c1e6f7a8b9d2
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7a8b9c1e3'
+down_revision: Union[str, None] = 'c1e6f7a8b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('lobby_proposals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_low_id', sa.Integer(), nullable=False),
+    sa.Column('user_high_id', sa.Integer(), nullable=False),
+    sa.Column('compatibility_score', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_low_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_high_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_lobby_proposals_id'), 'lobby_proposals', ['id'], unique=False)
+    op.create_index(op.f('ix_lobby_proposals_user_low_id'), 'lobby_proposals', ['user_low_id'], unique=False)
+    op.create_index(op.f('ix_lobby_proposals_user_high_id'), 'lobby_proposals', ['user_high_id'], unique=False)
+    op.create_table('lobby_entries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('cohort', sa.String(), nullable=True),
+    sa.Column('score_band', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('proposal_id', sa.Integer(), nullable=True),
+    sa.Column('entered_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['proposal_id'], ['lobby_proposals.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_lobby_entries_cohort'), 'lobby_entries', ['cohort'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_lobby_entries_cohort'), table_name='lobby_entries')
+    op.drop_table('lobby_entries')
+    op.drop_index(op.f('ix_lobby_proposals_user_high_id'), table_name='lobby_proposals')
+    op.drop_index(op.f('ix_lobby_proposals_user_low_id'), table_name='lobby_proposals')
+    op.drop_index(op.f('ix_lobby_proposals_id'), table_name='lobby_proposals')
+    op.drop_table('lobby_proposals')
@@ -0,0 +1,52 @@
+"""Add group proposals from the batch group-formation optimizer
+
+Revision ID: d5e9f3a4b6c7
+Revises: c4d8e1f2a3b5
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e9f3a4b6c7'
+down_revision: Union[str, None] = 'c4d8e1f2a3b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('group_proposals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.String(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_group_proposals_id'), 'group_proposals', ['id'], unique=False)
+    op.create_index(op.f('ix_group_proposals_batch_id'), 'group_proposals', ['batch_id'], unique=False)
+    op.create_table('group_proposal_members',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('proposal_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['proposal_id'], ['group_proposals.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_group_proposal_members_id'), 'group_proposal_members', ['id'], unique=False)
+    op.create_index(op.f('ix_group_proposal_members_proposal_id'), 'group_proposal_members', ['proposal_id'], unique=False)
+    op.create_index(op.f('ix_group_proposal_members_user_id'), 'group_proposal_members', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_group_proposal_members_user_id'), table_name='group_proposal_members')
+    op.drop_index(op.f('ix_group_proposal_members_proposal_id'), table_name='group_proposal_members')
+    op.drop_index(op.f('ix_group_proposal_members_id'), table_name='group_proposal_members')
+    op.drop_table('group_proposal_members')
+    op.drop_index(op.f('ix_group_proposals_batch_id'), table_name='group_proposals')
+    op.drop_index(op.f('ix_group_proposals_id'), table_name='group_proposals')
+    op.drop_table('group_proposals')
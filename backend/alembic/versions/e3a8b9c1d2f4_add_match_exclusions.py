@@ -0,0 +1,36 @@
+"""Add per-user match exclusion sets
+
+Revision ID: e3a8b9c1d2f4
+Revises: d2f7a8b9c1e3
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a8b9c1d2f4'
+down_revision: Union[str, None] = 'd2f7a8b9c1e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Users with rejected requests get their sets from the startup backfill
+    op.create_table('match_exclusions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bloom', sa.LargeBinary(), nullable=False),
+    sa.Column('hash_count', sa.Integer(), nullable=False),
+    sa.Column('overflow', sa.JSON(), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.Column('rebuilt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('match_exclusions')
@@ -0,0 +1,33 @@
+"""Add resolved coordinates and geohash to users
+
+Revision ID: e6f1a2b3c4d5
+Revises: d5e9f3a4b6c7
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f1a2b3c4d5'
+down_revision: Union[str, None] = 'd5e9f3a4b6c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in from users.location by geo_service.backfill_coordinates on startup
+    op.add_column('users', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('users', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('users', sa.Column('geohash', sa.String(), nullable=True))
+    op.create_index(op.f('ix_users_geohash'), 'users', ['geohash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_geohash'), table_name='users')
+    op.drop_column('users', 'geohash')
+    op.drop_column('users', 'longitude')
+    op.drop_column('users', 'latitude')
@@ -0,0 +1,29 @@
+"""Add matching cohort key to users
+
+Revision ID: f7a3b4c5d6e8
+Revises: e6f1a2b3c4d5
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a3b4c5d6e8'
+down_revision: Union[str, None] = 'e6f1a2b3c4d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in from country and primary_goal by cohort_service.backfill_cohorts on startup
+    op.add_column('users', sa.Column('cohort', sa.String(), nullable=True))
+    op.create_index(op.f('ix_users_cohort'), 'users', ['cohort'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_cohort'), table_name='users')
+    op.drop_column('users', 'cohort')
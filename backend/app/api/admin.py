@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.models.user import User
-from app.models.match import MatchRequest
+from app.models.match import LobbyProposal, MatchExclusion, MatchRequest
 from app.models.group import GroupMember
 from app.models.message import Message
 from app.models.friend import Friend
@@ -14,6 +14,17 @@ from app.models.collection import (
     Poll, PollVote, GroupGoal, PersonalGoal, Note, AskTheGroup, AskReply
 )
 from app.models.group import Group
+from app.services import match_events
+from app.services.match_cache import match_cache
+from app.services.match_snapshots import match_snapshots
+from app.services.feature_snapshot import feature_snapshots
+from app.services import lobby_service, match_warmup
+from app.services.cohort_service import sync_cohort
+from app.services.eligibility import eligibility
+from app.services.exclusion_sets import exclusion_history, rebuild_exclusions
+from app.services.group_matching import add_group_member, remove_group_member, suggest_group_members
+from app.services.pair_scores import bump_profile_version
+from app.core import metrics
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -26,8 +37,8 @@ def reset_account(
     """
     Reset a user account by email so they go through onboarding again.
 
-    Clears: group memberships, match requests, messages, friends,
-    collection data, and profile fields.
+    Clears: group memberships, match requests, exclusions, messages,
+    friends, collection data, and profile fields.
     """
     user = db.query(User).filter(User.email == email).first()
     if not user:
@@ -39,8 +50,21 @@ def reset_account(
     user_id = user.id
 
     # Remove group memberships
+    for membership in db.query(GroupMember).filter(
+        GroupMember.user_id == user_id,
+        GroupMember.status == "active"
+    ).all():
+        remove_group_member(db, membership.group_id, user)
     db.query(GroupMember).filter(GroupMember.user_id == user_id).delete()
 
+    # Remove exclusions: the user's set, the passes behind it, and their place in partners' sets
+    excluded_partners = exclusion_history(db, user_id)
+    db.query(MatchExclusion).filter(MatchExclusion.user_id == user_id).delete()
+    db.query(LobbyProposal).filter(
+        LobbyProposal.status == "passed",
+        (LobbyProposal.user_low_id == user_id) | (LobbyProposal.user_high_id == user_id)
+    ).delete(synchronize_session=False)
+
     # Remove match requests (sent and received)
     db.query(MatchRequest).filter(
         (MatchRequest.from_user_id == user_id) | (MatchRequest.to_user_id == user_id)
@@ -71,6 +95,7 @@ def reset_account(
     user.profession = ""
     user.primary_goal = ""
     user.interests = []
+    user.interest_bits = b""
     user.personality = {}
     user.gender_preference = []
     user.age_preference = {}
@@ -87,9 +112,18 @@ def reset_account(
     user.country = None
     user.location = ""
     user.max_distance = 5
+    user.latitude = None
+    user.longitude = None
+    user.geohash = None
+    sync_cohort(user)
+    bump_profile_version(user)
 
     db.commit()
 
+    for partner_id in excluded_partners:
+        rebuild_exclusions(db, partner_id)
+    match_events.profile_updated(db, user_id)
+
     return {
         "message": f"Account {email} has been reset successfully",
         "user_id": user_id
@@ -135,19 +169,37 @@ def admin_add_member(group_id: int, email: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
 
     # Remove any existing active memberships
-    db.query(GroupMember).filter(
+    for membership in db.query(GroupMember).filter(
         GroupMember.user_id == user.id,
         GroupMember.status == "active"
-    ).update({"status": "left"})
+    ).all():
+        remove_group_member(db, membership.group_id, user)
+        membership.status = "left"
 
     # Add to new group
     new_member = GroupMember(group_id=group_id, user_id=user.id, status="active")
     db.add(new_member)
+    add_group_member(db, group_id, user)
     db.commit()
 
+    match_events.group_joined(db, [user.id])
+
     return {"message": f"{user.first_name or user.email} added to group {group_id}"}
 
 
+@router.get("/groups/suggestions")
+def admin_group_suggestions(per_group: int = 3, db: Session = Depends(get_db)):
+    """Best-fitting newcomers for every open group, to fill with add-member."""
+    suggestions = suggest_group_members(db, per_group)
+    return [
+        {
+            "group_id": group_id,
+            "candidates": [{"user_id": user_id, "compatibility_score": score} for user_id, score in candidates],
+        }
+        for group_id, candidates in suggestions.items()
+    ]
+
+
 @router.get("/user-profile")
 def admin_get_user_profile(email: str, db: Session = Depends(get_db)):
     """Inspect a user's full profile by email."""
@@ -175,3 +227,18 @@ def admin_get_user_profile(email: str, db: Session = Depends(get_db)):
         "perspective_answers": user.perspective_answers,
         "country": user.country,
     }
+
+
+@router.get("/metrics")
+def get_metrics(db: Session = Depends(get_db)):
+    """Matching counters for this process (cache hits/misses/evictions etc)."""
+    return {
+        "counters": metrics.snapshot(),
+        "match_cache": match_cache.stats(),
+        "match_snapshots": match_snapshots.stats(),
+        "feature_snapshot": feature_snapshots.stats(),
+        "lobby": lobby_service.stats(db),
+        "eligibility": eligibility.stats(),
+        "warmup": match_warmup.stats(),
+        "pipeline": metrics.stage_stats(),
+    }
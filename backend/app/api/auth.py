@@ -5,6 +5,10 @@ from app.core.security import hash_password, verify_password, create_access_toke
 from app.models.user import User
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token, VerifyEmail
 from app.services.email_service import send_verification_email, send_password_reset_email
+from app.services import match_events, match_warmup
+from app.services.interest_service import sync_interest_bits
+from app.services.geo_service import sync_coordinates
+from app.services.cohort_service import sync_cohort
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -44,6 +48,9 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         location=user_data.location,
         max_distance=user_data.max_distance
     )
+    sync_interest_bits(db, new_user)
+    sync_coordinates(new_user)
+    sync_cohort(new_user)
 
     db.add(new_user)
     db.commit()
@@ -89,6 +96,9 @@ def verify_email(verify_data: VerifyEmail, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(user)
 
+    match_events.user_verified(db, user.id)
+    match_warmup.warm_up(user.id)
+
     # Create access token
     access_token = create_access_token(data={"user_id": user.id, "email": user.email})
 
@@ -117,6 +127,8 @@ def login(login_data: UserLogin, db: Session = Depends(get_db)):
             detail="Email not verified. Please verify your email first."
         )
 
+    match_warmup.warm_up(user.id)
+
     # Create access token
     access_token = create_access_token(data={"user_id": user.id, "email": user.email})
 
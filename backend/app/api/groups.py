@@ -22,6 +22,7 @@ from app.services.group_service import (
     get_group_info
 )
 from app.services.email_service import send_group_joined_notification
+from app.services import match_events
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 router = APIRouter(prefix="/api", tags=["groups"])
@@ -152,6 +153,8 @@ def leave_group_endpoint(
             detail="Failed to leave group"
         )
 
+    match_events.group_left(db, current_user.id)
+
     return {
         "message": "Successfully left the group",
         "group_id": group_id
@@ -1,8 +1,10 @@
 """
 Matching API endpoints for finding and requesting matches.
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from typing import Any, Dict, Iterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
@@ -10,13 +12,27 @@ from app.core.security import decode_access_token
 from app.models.user import User
 from app.models.match import MatchRequest
 from app.models.group import Group, GroupMember
-from app.schemas.match import MatchResponse, MatchRequestCreate, MatchRequestResponse
+from app.core import metrics
+from app.core.config import settings
+from app.schemas.match import (
+    GroupMatchResponse, LobbyStatus, MatchResponse, MatchPage, MatchRequestCreate, MatchRequestResponse
+)
 from app.services.matching_service import (
+    build_match_entry,
     find_potential_matches,
     is_user_in_active_group,
     get_existing_match_request,
-    calculate_compatibility_score
+    load_match_profiles,
+    rank_potential_matches,
+    score_match_request
 )
+from app.services.match_candidates_service import get_provisional_matches, get_stored_matches
+from app.services.group_matching import add_group_member, group_fit_scores, rank_open_groups
+from app.services.lobby_service import enter_lobby, leave_lobby, lobby_status, pass_proposal
+from app.services.match_worker import match_worker
+from app.services.match_cache import match_cache
+from app.services.match_snapshots import decode_cursor, encode_cursor, match_snapshots
+from app.services import match_events, match_warmup
 from app.services.email_service import send_match_notification
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
@@ -54,6 +70,7 @@ def get_current_user(
 
 @router.get("", response_model=List[MatchResponse])
 def get_matches(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -62,6 +79,11 @@ def get_matches(
 
     Returns the 3 users with highest compatibility scores.
     Filters out users already in groups and those with pending requests.
+    Served from the match cache, then the precomputed match list when it
+    is fresh, otherwise scored live and queued for a rebuild.
+
+    With MATCH_SERVER_TIMING on, the time spent in each stage is returned
+    in a Server-Timing header.
     """
     # Check if user is already in a group
     if is_user_in_active_group(db, current_user.id):
@@ -70,11 +92,251 @@ def get_matches(
             detail="You are already in a group. Leave your current group to find new matches."
         )
 
-    matches = find_potential_matches(db, current_user, limit=3)
+    with metrics.trace() as timings:
+        matches = _top_matches(db, current_user)
+    if settings.MATCH_SERVER_TIMING and timings:
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+
+    return matches
+
+
+def _top_matches(db: Session, user: User) -> List[Dict[str, Any]]:
+    with metrics.stage("matches.cache"):
+        matches = match_cache.get(user.id, limit=3)
+    if matches is not None:
+        match_warmup.record_fetch(user.id, warm=True)
+        return matches
+
+    with metrics.stage("matches.stored"):
+        matches = get_stored_matches(db, user.id, limit=3)
+    match_warmup.record_fetch(user.id, warm=matches is not None)
+    if matches is None:
+        match_worker.enqueue([user.id])
+        matches = find_potential_matches(db, user, limit=3)
+
+    match_cache.set(user.id, 3, matches, shard=user.cohort)
 
     return matches
 
 
+def _stream_line(stage: str, matches: List[Dict[str, Any]]) -> bytes:
+    cards = [MatchResponse(**match).model_dump(mode="json") for match in matches]
+    return (json.dumps({"stage": stage, "matches": cards}) + "\n").encode()
+
+
+@router.get("/stream")
+def stream_matches(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the top 3 matches as a stream, a first answer before the exact one.
+
+    The response is newline-delimited JSON, one object per line with a
+    stage and the same match cards as GET /api/matches:
+
+    - {"stage": "provisional", ...}: the user's stored list even if it is
+      stale, minus anyone who can no longer match. Sent right away, and
+      skipped when the user has no stored list.
+    - {"stage": "final", ...}: what GET /api/matches would return. Always
+      the last line; served straight from the match cache or a fresh
+      stored list when there is one, with no provisional line before it.
+
+    GET /api/matches stays for clients that don't read streams.
+    """
+    if is_user_in_active_group(db, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You are already in a group. Leave your current group to find new matches."
+        )
+
+    def stages() -> Iterator[bytes]:
+        metrics.incr("match_stream.requests")
+        matches = match_cache.get(current_user.id, limit=3)
+        if matches is None:
+            matches = get_stored_matches(db, current_user.id, limit=3)
+        match_warmup.record_fetch(current_user.id, warm=matches is not None)
+        if matches is not None:
+            yield _stream_line("final", matches)
+            return
+
+        provisional = get_provisional_matches(db, current_user.id, limit=3)
+        if provisional:
+            metrics.incr("match_stream.provisional")
+            yield _stream_line("provisional", provisional)
+
+        match_worker.enqueue([current_user.id])
+        matches = find_potential_matches(db, current_user, limit=3)
+        match_cache.set(current_user.id, 3, matches, shard=current_user.cohort)
+        yield _stream_line("final", matches)
+
+    return StreamingResponse(
+        stages(),
+        media_type="application/x-ndjson",
+        # Keep proxies from buffering the provisional line
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/ranked", response_model=MatchPage)
+def get_ranked_matches(
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Page through the current user's ranked matches beyond the top 3.
+
+    The first page (no cursor) ranks the eligible pool once and snapshots
+    the ranking; each next_cursor serves the following page from the
+    snapshot. If the snapshot has been dropped (the user's eligibility
+    changed) or expired, the pool is ranked again and paging continues at
+    the same offset.
+    """
+    if is_user_in_active_group(db, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You are already in a group. Leave your current group to find new matches."
+        )
+
+    snapshot_id, offset = None, 0
+    if cursor:
+        try:
+            snapshot_id, offset = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+
+    page = match_snapshots.page(current_user.id, snapshot_id, offset, limit) if snapshot_id else None
+    if page is None:
+        ranked = rank_potential_matches(db, current_user, settings.MATCH_SNAPSHOT_MAX_CANDIDATES)
+        snapshot_id = match_snapshots.create(current_user.id, ranked)
+        page = match_snapshots.page(current_user.id, snapshot_id, offset, limit)
+    entries, has_more = page
+
+    # One query for the profiles on this page
+    profiles = load_match_profiles(db, [candidate_id for candidate_id, _ in entries])
+
+    return {
+        "matches": [
+            build_match_entry(profiles[candidate_id], compatibility)
+            for candidate_id, compatibility in entries
+            if candidate_id in profiles
+        ],
+        "next_cursor": encode_cursor(snapshot_id, offset + len(entries)) if has_more else None,
+    }
+
+
+@router.get("/groups", response_model=List[GroupMatchResponse])
+def get_group_matches(
+    limit: int = Query(3, ge=1, le=20),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the open groups the current user fits best.
+
+    Groups are scored on the centroid of their members, and only offered
+    when the user and every member pass each other's preferences, deal
+    breakers and distance.
+    """
+    if is_user_in_active_group(db, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You are already in a group. Leave your current group to find new matches."
+        )
+
+    ranked = rank_open_groups(db, current_user, limit)
+    groups = db.query(Group).filter(Group.id.in_([g["group_id"] for g in ranked])).all()
+    names = {group.id: group.name for group in groups}
+
+    return [{**g, "group_name": names.get(g["group_id"])} for g in ranked]
+
+
+def _lobby_response(db: Session, user: User) -> dict:
+    """Lobby status with the proposed partner's match card."""
+    state = lobby_status(db, user)
+    proposal = state["proposal"]
+    if proposal is not None:
+        partner = db.query(User).filter(User.id == proposal["partner_id"]).first()
+        state["proposal"] = {
+            "proposal_id": proposal["proposal_id"],
+            "partner": build_match_entry(partner, proposal["compatibility_score"]),
+            "created_at": proposal["created_at"],
+        } if partner else None
+    return state
+
+
+@router.post("/lobby", response_model=LobbyStatus)
+def join_lobby(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Wait in the matchmaking lobby to be paired with another waiting user.
+
+    Poll GET /lobby to stay in it; users not seen for a while drop out.
+    """
+    if is_user_in_active_group(db, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You are already in a group. Leave your current group to find new matches."
+        )
+    if not current_user.email_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Verify your email to find matches"
+        )
+
+    enter_lobby(db, current_user)
+    return _lobby_response(db, current_user)
+
+
+@router.get("/lobby", response_model=LobbyStatus)
+def get_lobby_status(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Poll the lobby: how long the user has waited, and their proposal once
+    they are paired. Send a match request to the partner to take it up.
+    """
+    return _lobby_response(db, current_user)
+
+
+@router.delete("/lobby", response_model=dict)
+def exit_lobby(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Leave the lobby."""
+    leave_lobby(db, [current_user.id])
+    return {"message": "Left the lobby"}
+
+
+@router.post("/lobby/{proposal_id}/pass", response_model=LobbyStatus)
+def pass_lobby_proposal(
+    proposal_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Pass on a proposal; both users keep their place in the queue and
+    aren't shown each other again.
+    """
+    proposal = pass_proposal(db, current_user.id, proposal_id)
+    if proposal is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Proposal not found"
+        )
+    match_events.lobby_proposal_passed(db, proposal.user_low_id, proposal.user_high_id)
+    return _lobby_response(db, current_user)
+
+
 @router.post("/request", response_model=dict)
 def send_match_request(
     match_request: MatchRequestCreate,
@@ -129,11 +391,14 @@ def send_match_request(
         to_user_id=target_user.id,
         status="pending"
     )
+    score_match_request(db, new_request, current_user, target_user)
 
     db.add(new_request)
     db.commit()
     db.refresh(new_request)
 
+    match_events.match_request_created(db, current_user.id, target_user.id)
+
     # Send notification email
     send_match_notification(target_user.email, current_user.first_name)
 
@@ -183,37 +448,78 @@ def get_match_requests(
 ):
     """
     Get all pending match requests received by the current user.
+
+    Reads the scores stored when each request was sent, with the sender's
+    profile, in one joined query. Senders who are already in a group also
+    get the current user's fit with that group, which accepting would join.
     """
-    requests = db.query(MatchRequest).filter(
+    rows = db.query(
+        MatchRequest.id,
+        MatchRequest.created_at,
+        MatchRequest.compatibility_score,
+        MatchRequest.score_breakdown,
+        User.id.label("user_id"),
+        User.first_name,
+        User.surname,
+        User.age,
+        User.profession,
+        User.statement,
+        User.interests,
+        User.location,
+        User.primary_goal,
+        User.focus,
+        User.headline,
+        User.profile_photo_url,
+        User.perspective_answers,
+    ).join(
+        User, User.id == MatchRequest.from_user_id
+    ).filter(
         MatchRequest.to_user_id == current_user.id,
         MatchRequest.status == "pending"
-    ).all()
+    ).order_by(MatchRequest.id).all()
+
+    # Requests sent before scores were stored and not yet backfilled
+    unscored = [row.id for row in rows if row.compatibility_score is None]
+    scores = {}
+    if unscored:
+        requests = db.query(MatchRequest).filter(MatchRequest.id.in_(unscored)).all()
+        senders = load_match_profiles(db, [r.from_user_id for r in requests])
+        for req in requests:
+            score_match_request(db, req, senders[req.from_user_id], current_user)
+            scores[req.id] = (req.compatibility_score, req.score_breakdown)
+        db.commit()
+
+    sender_groups = dict(db.query(GroupMember.user_id, GroupMember.group_id).filter(
+        GroupMember.user_id.in_([row.user_id for row in rows]),
+        GroupMember.status == "active"
+    ).all()) if rows else {}
+    group_scores = group_fit_scores(db, current_user, sorted(set(sender_groups.values())))
 
     response = []
-    for req in requests:
-        from_user = db.query(User).filter(User.id == req.from_user_id).first()
-        if from_user:
-            compatibility = calculate_compatibility_score(current_user, from_user)
-            response.append({
-                "request_id": req.id,
-                "from_user": {
-                    "user_id": from_user.id,
-                    "first_name": from_user.first_name,
-                    "surname": from_user.surname,
-                    "age": from_user.age,
-                    "profession": from_user.profession,
-                    "statement": from_user.statement,
-                    "interests": from_user.interests,
-                    "compatibility_score": compatibility,
-                    "location": from_user.location,
-                    "primary_goal": from_user.primary_goal,
-                    "focus": getattr(from_user, "focus", None),
-                    "headline": getattr(from_user, "headline", None),
-                    "profile_photo_url": getattr(from_user, "profile_photo_url", None),
-                    "perspective_answers": getattr(from_user, "perspective_answers", None),
-                },
-                "created_at": req.created_at
-            })
+    for row in rows:
+        compatibility, breakdown = scores.get(row.id, (row.compatibility_score, row.score_breakdown))
+        response.append({
+            "request_id": row.id,
+            "from_user": {
+                "user_id": row.user_id,
+                "first_name": row.first_name,
+                "surname": row.surname,
+                "age": row.age,
+                "profession": row.profession,
+                "statement": row.statement,
+                "interests": row.interests,
+                "compatibility_score": compatibility,
+                "location": row.location,
+                "primary_goal": row.primary_goal,
+                "focus": row.focus,
+                "headline": row.headline,
+                "profile_photo_url": row.profile_photo_url,
+                "perspective_answers": row.perspective_answers,
+            },
+            "score_breakdown": breakdown,
+            "group_compatibility_score": group_scores.get(sender_groups.get(row.user_id)),
+            "created_at": row.created_at
+        })
 
     return response
 
@@ -271,6 +577,7 @@ def accept_match_request(
             status="active"
         )
         db.add(new_member)
+        add_group_member(db, group_id, current_user)
     else:
         # Create new group for both users
         new_group = Group()
@@ -290,6 +597,8 @@ def accept_match_request(
         )
         db.add(sender_member)
         db.add(receiver_member)
+        add_group_member(db, new_group.id, sender)
+        add_group_member(db, new_group.id, current_user)
 
         group_id = new_group.id
 
@@ -298,6 +607,8 @@ def accept_match_request(
 
     db.commit()
 
+    match_events.group_joined(db, [sender.id, current_user.id])
+
     return {
         "message": "Match request accepted",
         "group_id": group_id
@@ -311,7 +622,7 @@ def reject_match_request(
     db: Session = Depends(get_db)
 ):
     """
-    Reject a match request.
+    Reject a match request. The pair won't be shown to each other again.
     """
     # Get the match request
     match_request = db.query(MatchRequest).filter(
@@ -330,6 +641,8 @@ def reject_match_request(
     match_request.status = "rejected"
     db.commit()
 
+    match_events.match_request_rejected(db, match_request.from_user_id, current_user.id)
+
     return {
         "message": "Match request rejected"
     }
@@ -5,6 +5,11 @@ from app.core.security import decode_access_token
 from app.models.user import User
 from app.models.group import GroupMember
 from app.schemas.user import UserProfile, UserProfileUpdate
+from app.services import match_events
+from app.services.interest_service import sync_interest_bits
+from app.services.geo_service import sync_coordinates
+from app.services.cohort_service import sync_cohort
+from app.services.pair_scores import SCORED_FIELDS, bump_profile_version
 
 router = APIRouter(prefix="/api/user", tags=["user"])
 
@@ -74,7 +79,18 @@ def update_profile(
     for field, value in update_dict.items():
         setattr(current_user, field, value)
 
+    if "interests" in update_dict:
+        sync_interest_bits(db, current_user)
+    if "location" in update_dict or "country" in update_dict:
+        sync_coordinates(current_user)
+    if "country" in update_dict or "primary_goal" in update_dict:
+        sync_cohort(current_user)
+    if SCORED_FIELDS & update_dict.keys():
+        bump_profile_version(current_user)
+
     db.commit()
     db.refresh(current_user)
 
+    match_events.profile_updated(db, current_user.id)
+
     return UserProfile.from_orm(current_user)
@@ -14,6 +14,65 @@ class Settings(BaseSettings):
     # Resend API for emails
     RESEND_API_KEY: Optional[str] = None
 
+    # Matching
+    MATCH_CANDIDATES_TOP_K: int = 20
+    MATCH_CANDIDATES_MAX_AGE_MINUTES: int = 60
+    MATCH_WORKER_REFRESH_SECONDS: int = 300
+    # Cache a user's matches when they log in or verify (see match_warmup)
+    MATCH_WARMUP_ENABLED: bool = True
+    MATCH_WARMUP_TRACK_SECONDS: int = 3600  # A first fetch later than this isn't counted
+    MATCH_WARMUP_MAX_TRACKED: int = 10000
+    # Approximate candidate retrieval kicks in once this many users are indexed
+    MATCH_ANN_MIN_POOL: int = 50000
+    MATCH_ANN_CANDIDATES: int = 300
+    MATCH_ANN_REBUILD_SECONDS: int = 3600
+    # Bound-pruned top-K ranking pays off once a pool has this many candidates
+    MATCH_CASCADE_MIN_POOL: int = 10000
+    MATCH_CACHE_MAX_ENTRIES: int = 10000
+    MATCH_CACHE_TTL_SECONDS: int = 300
+    MATCH_CACHE_REDIS_URL: Optional[str] = None  # Optional shared cache (needs the redis package)
+    MATCH_CACHE_MAX_ENTRIES_PER_SHARD: Optional[int] = None  # Per cohort shard; MATCH_CACHE_MAX_ENTRIES if None
+    # Cohort shards (country x goal family); shards too small to fill the top 3 fall back to the whole pool
+    MATCH_SHARDING_ENABLED: bool = False
+    MATCH_SHARD_MIN_MATCHES: int = 3
+    # Ranked-list snapshots paged by GET /api/matches/ranked
+    MATCH_SNAPSHOT_MAX_CANDIDATES: int = 500
+    MATCH_SNAPSHOT_MAX_USERS: int = 10000
+    MATCH_SNAPSHOT_TTL_SECONDS: int = 1800
+    # Streaming matches: stored-list rows read per match wanted for the provisional answer
+    MATCH_STREAM_PROVISIONAL_SCAN_FACTOR: int = 4
+    # Per-stage timings of GET /api/matches in a Server-Timing header (always counted in the metrics)
+    MATCH_SERVER_TIMING: bool = False
+    # Memory-mapped feature snapshot shared by all worker processes (off unless a directory is set)
+    MATCH_FEATURES_DIR: Optional[str] = None
+    MATCH_FEATURES_MIN_INTERVAL_SECONDS: int = 30  # Debounce between versions after profile changes
+    MATCH_FEATURES_MAX_AGE_SECONDS: int = 900
+    MATCH_FEATURES_CHECK_SECONDS: float = 2.0  # How often workers look for a newer version
+
+    # In-memory eligibility bitmap; reconciled with the database for events other processes handled
+    MATCH_ELIGIBILITY_RECONCILE_SECONDS: int = 60
+
+    # Per-user exclusion sets (rejected requests, passed lobby proposals)
+    MATCH_EXCLUSION_FALSE_POSITIVE_RATE: float = 0.001
+    MATCH_EXCLUSION_OVERFLOW_MAX: int = 64  # Exact IDs kept beside the Bloom filter before it is rebuilt
+    MATCH_EXCLUSION_REBUILD_SECONDS: int = 86400
+    MATCH_EXCLUSION_REBUILD_BATCH: int = 500  # Sets the match worker rebuilds per idle pass
+
+    # Lobby matchmaking for users waiting on the matching screen
+    LOBBY_TICK_SECONDS: float = 1.0
+    LOBBY_IDLE_SECONDS: int = 30  # Entries not polled for this long leave the lobby
+    LOBBY_SCORE_BAND_WIDTH: int = 10
+    LOBBY_MIN_SCORE: int = 50
+    LOBBY_WIDEN_SECONDS: int = 20  # Past this wait, pair across score bands; past twice this, across cohorts
+    LOBBY_PROPOSAL_SECONDS: int = 120  # Unanswered proposals expire and both users wait again
+
+    # Batch group-formation optimizer
+    GROUP_PROPOSAL_TARGET_SIZE: int = 4
+    GROUP_OPTIMIZER_CLUSTER_SIZE: int = 400
+    GROUP_OPTIMIZER_TIME_BUDGET_SECONDS: float = 120.0
+    # Groups with fewer active members are offered to newcomers by group-aware matching
+    GROUP_MAX_MEMBERS: int = 6
+
     # App
     APP_NAME: str = "Bridge API"
     DEBUG: bool = True
@@ -0,0 +1,127 @@
+"""
+In-process metrics.
+
+A small registry of named counters, exposed through GET /api/admin/metrics.
+Counters are per process; with several workers, sum them across processes.
+
+Pipeline stages are timed with stage(): each adds its calls, wall time and
+CPU time of the calling thread (stage.<name>.calls/.wall_us/.cpu_us), and
+filtered() counts candidates going into and out of a filter
+(filter.<name>.in/.out). Inside a trace() block the stage timings of the
+current request are also collected, for a Server-Timing header.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+_counters: Dict[str, int] = defaultdict(int)
+_lock = threading.Lock()
+# Stage name -> wall milliseconds, for the request being traced
+_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_trace", default=None)
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """Add to a counter."""
+    with _lock:
+        _counters[name] += amount
+
+
+def get(name: str) -> int:
+    """Current value of a counter."""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, int]:
+    """Copy of every counter."""
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    """Zero every counter."""
+    with _lock:
+        _counters.clear()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a pipeline stage, in the counters and the current trace.
+
+    Args:
+        name: Stage name, e.g. "matches.score"
+    """
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+        with _lock:
+            _counters[f"stage.{name}.calls"] += 1
+            _counters[f"stage.{name}.wall_us"] += int(wall * 1e6)
+            _counters[f"stage.{name}.cpu_us"] += int(cpu * 1e6)
+        timings = _trace.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + wall * 1000
+
+
+def filtered(name: str, before: int, after: int) -> None:
+    """
+    Count the candidates a filter was given and the ones it kept.
+
+    Args:
+        name: Filter name, e.g. "matches.distance"
+        before: Candidates going in
+        after: Candidates kept
+    """
+    with _lock:
+        _counters[f"filter.{name}.in"] += int(before)
+        _counters[f"filter.{name}.out"] += int(after)
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """Collect the wall time (ms) of every stage run inside the block, by stage name."""
+    timings: Dict[str, float] = {}
+    token = _trace.set(timings)
+    try:
+        yield timings
+    finally:
+        _trace.reset(token)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format trace() timings as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in timings.items())
+
+
+def stage_stats() -> Dict[str, Any]:
+    """
+    Stage and filter counters, summarized.
+
+    Returns:
+        {"stages": name -> calls, average wall and CPU ms and any other
+        per-stage counters (rows, bytes), "filters": name -> candidates
+        in, out and the fraction kept}
+    """
+    stages: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    filters: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    for key, value in snapshot().items():
+        kind, _, rest = key.partition(".")
+        name, _, field = rest.rpartition(".")
+        if kind == "stage":
+            stages[name][field] = value
+        elif kind == "filter":
+            filters[name][field] = value
+
+    for counters in stages.values():
+        calls = counters.get("calls") or 1
+        counters["wall_ms_avg"] = counters.pop("wall_us", 0) / calls / 1000
+        counters["cpu_ms_avg"] = counters.pop("cpu_us", 0) / calls / 1000
+    for counters in filters.values():
+        counters["kept"] = counters.get("out", 0) / counters["in"] if counters.get("in") else None
+    return {"stages": dict(stages), "filters": dict(filters)}
@@ -5,11 +5,20 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text, inspect
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, SessionLocal
+from app.services.match_worker import match_worker
+from app.services.interest_service import backfill_interest_bits
+from app.services.geo_service import backfill_coordinates
+from app.services.cohort_service import backfill_cohorts
+from app.services.matching_service import backfill_request_scores
+from app.services.group_matching import backfill_group_centroids
+from app.services.exclusion_sets import backfill_exclusions
+from app.services.eligibility import eligibility
+from app.services.lobby_service import lobby_scheduler
 from app.api import auth, matches, groups, user, events, tasks, collections, meetups, friends, group_settings, admin
 # Ensure all models are imported so tables are registered
 from app.models import (  # noqa: F401
-    User, Group, GroupMember, MatchRequest, Message,
+    User, Group, GroupMember, GroupCentroid, GroupProposal, GroupProposalMember, MatchRequest, UserMatchCandidate, PairScore, MatchExclusion, LobbyEntry, LobbyProposal, Interest, Message,
     GroupGoal, PersonalGoal, Poll, PollOption, PollVote,
     Note, AskTheGroup, AskReply,
     MeetupInvitation, MeetupAttendee,
@@ -36,11 +45,30 @@ def add_missing_columns():
             'age_collab_only': 'BOOLEAN',
             'gender_collab_only': 'BOOLEAN',
             'country': 'VARCHAR',
+            'interest_bits': 'BYTEA' if engine.dialect.name == 'postgresql' else 'BLOB',
+            'latitude': 'FLOAT',
+            'longitude': 'FLOAT',
+            'geohash': 'VARCHAR',
+            'cohort': 'VARCHAR',
+            'profile_version': 'INTEGER NOT NULL DEFAULT 1',
         }
         with engine.begin() as conn:
             for col_name, col_type in new_cols.items():
                 if col_name not in existing:
                     conn.execute(text(f'ALTER TABLE users ADD COLUMN {col_name} {col_type}'))
+            if 'geohash' not in existing:
+                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_geohash ON users (geohash)'))
+            if 'cohort' not in existing:
+                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_cohort ON users (cohort)'))
+
+    # Add stored scores to match_requests table
+    if 'match_requests' in inspector.get_table_names():
+        existing = {col['name'] for col in inspector.get_columns('match_requests')}
+        with engine.begin() as conn:
+            if 'compatibility_score' not in existing:
+                conn.execute(text('ALTER TABLE match_requests ADD COLUMN compatibility_score INTEGER'))
+            if 'score_breakdown' not in existing:
+                conn.execute(text('ALTER TABLE match_requests ADD COLUMN score_breakdown JSON'))
 
     # Add name to groups table
     if 'groups' in inspector.get_table_names():
@@ -102,6 +130,57 @@ app.include_router(friends.router)
 app.include_router(group_settings.router)
 app.include_router(admin.router)
 
+@app.on_event("startup")
+def start_match_worker():
+    # Existing users get their interest bitsets, coordinates and cohorts before the worker scores them,
+    # then pending requests get the scores the inbox reads, groups the centroids group matching reads
+    # and users who turned someone down their exclusion sets; the eligibility bitmap is built last
+    db = SessionLocal()
+    try:
+        backfill_interest_bits(db)
+    except Exception as e:
+        print(f"Interest bitset backfill note: {e}")
+        db.rollback()
+    try:
+        backfill_coordinates(db)
+    except Exception as e:
+        print(f"Location backfill note: {e}")
+        db.rollback()
+    try:
+        backfill_cohorts(db)
+    except Exception as e:
+        print(f"Cohort backfill note: {e}")
+        db.rollback()
+    try:
+        backfill_request_scores(db)
+    except Exception as e:
+        print(f"Match request score backfill note: {e}")
+        db.rollback()
+    try:
+        backfill_group_centroids(db)
+    except Exception as e:
+        print(f"Group centroid backfill note: {e}")
+        db.rollback()
+    try:
+        backfill_exclusions(db)
+    except Exception as e:
+        print(f"Exclusion set backfill note: {e}")
+        db.rollback()
+    try:
+        eligibility.rebuild(db)
+    except Exception as e:
+        print(f"Eligibility bitmap build note: {e}")
+    finally:
+        db.close()
+
+    match_worker.start()
+    lobby_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_match_worker():
+    lobby_scheduler.stop()
+    match_worker.stop()
+
 @app.get("/")
 def read_root():
     return {"status": "healthy", "app": settings.APP_NAME, "version": "1.0.0"}
@@ -1,6 +1,7 @@
 from .user import User
-from .group import Group, GroupMember
-from .match import MatchRequest
+from .group import Group, GroupMember, GroupCentroid, GroupProposal, GroupProposalMember
+from .match import MatchRequest, UserMatchCandidate, PairScore, MatchExclusion, LobbyEntry, LobbyProposal
+from .interest import Interest
 from .message import Message
 from .collection import GroupGoal, PersonalGoal, Poll, PollOption, PollVote, Note, AskTheGroup, AskReply
 from .meetup import MeetupInvitation, MeetupAttendee
@@ -9,7 +10,7 @@ from .timeline import WeeklyFocus
 from .settings import GroupNotificationSettings
 
 __all__ = [
-    "User", "Group", "GroupMember", "MatchRequest", "Message",
+    "User", "Group", "GroupMember", "GroupCentroid", "GroupProposal", "GroupProposalMember", "MatchRequest", "UserMatchCandidate", "PairScore", "MatchExclusion", "LobbyEntry", "LobbyProposal", "Interest", "Message",
     "GroupGoal", "PersonalGoal", "Poll", "PollOption", "PollVote",
     "Note", "AskTheGroup", "AskReply",
     "MeetupInvitation", "MeetupAttendee",
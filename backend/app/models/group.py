@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, String
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, String, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -29,3 +29,51 @@ class GroupMember(Base):
     # Relationships
     group = relationship("Group", back_populates="members")
     user = relationship("User", back_populates="group_memberships")
+
+
+class GroupCentroid(Base):
+    """
+    Running feature totals of a group's active members, for group-aware matching.
+
+    Stored as sums and counts rather than means, so a member joining or
+    leaving is a single addition or subtraction (see group_matching).
+    """
+    __tablename__ = "group_centroids"
+
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    member_count = Column(Integer, nullable=False, default=0)
+    personality_sums = Column(JSON, nullable=False, default=dict)  # trait -> sum over members with the trait
+    personality_counts = Column(JSON, nullable=False, default=dict)  # trait -> members with the trait
+    interest_counts = Column(JSON, nullable=False, default=dict)  # interest ID (as a string) -> members with it
+    goal_counts = Column(JSON, nullable=False, default=list)  # [goal, members] pairs; goal may be null
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class GroupProposal(Base):
+    """
+    A group suggested by the batch group-formation optimizer.
+
+    Proposals from one optimizer run share a batch_id; a newer run marks
+    the still-pending proposals of older runs as 'superseded'.
+    """
+    __tablename__ = "group_proposals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(String, nullable=False, index=True)
+    score = Column(Integer, nullable=False)  # Sum of pairwise compatibility within the group
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'accepted', 'dismissed', 'superseded'
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    members = relationship("GroupProposalMember", back_populates="proposal")
+
+
+class GroupProposalMember(Base):
+    __tablename__ = "group_proposal_members"
+
+    id = Column(Integer, primary_key=True, index=True)
+    proposal_id = Column(Integer, ForeignKey("group_proposals.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+
+    # Relationships
+    proposal = relationship("GroupProposal", back_populates="members")
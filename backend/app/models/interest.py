@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String
+from app.core.database import Base
+
+
+class Interest(Base):
+    """
+    Global interest vocabulary.
+
+    Maps each interest string to a small integer ID, which is the bit
+    position used in User.interest_bits.
+    """
+    __tablename__ = "interest_vocabulary"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
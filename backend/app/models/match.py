@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, Index, JSON, Float, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -13,7 +13,100 @@ class MatchRequest(Base):
     status = Column(String, nullable=False, default="pending")  # 'pending', 'accepted', 'rejected'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Scored when the request is sent, so the inbox doesn't rescore on every poll
+    compatibility_score = Column(Integer, nullable=True)
+    score_breakdown = Column(JSON, nullable=True)  # {"interests": .., "personality": .., "goal": ..}
 
     # Relationships
     from_user = relationship("User", foreign_keys=[from_user_id], back_populates="sent_match_requests")
     to_user = relationship("User", foreign_keys=[to_user_id], back_populates="received_match_requests")
+
+
+class UserMatchCandidate(Base):
+    """
+    Precomputed top-K ranked candidates for a user.
+
+    Maintained by the match candidate worker so GET /api/matches can read a
+    user's ranking instead of rescoring the whole pool.
+    """
+    __tablename__ = "user_match_candidates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    candidate_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    rank = Column(Integer, nullable=False)
+    compatibility_score = Column(Integer, nullable=False)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_user_match_candidates_user_rank", "user_id", "rank"),
+    )
+
+
+class PairScore(Base):
+    """
+    Compatibility of a pair of users, stored once per unordered pair.
+
+    Keyed by (lower user ID, higher user ID) since the score is symmetric.
+    Each row records both users' profile_version when it was computed and
+    is only used while both still match (see pair_scores service).
+    """
+    __tablename__ = "pair_scores"
+
+    user_low_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    user_high_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
+    low_version = Column(Integer, nullable=False)
+    high_version = Column(Integer, nullable=False)
+    compatibility_score = Column(Integer, nullable=False)
+    interest_score = Column(Float, nullable=False)
+    personality_score = Column(Float, nullable=False)
+    goal_score = Column(Float, nullable=False)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class MatchExclusion(Base):
+    """
+    The users someone is never matched with again (see exclusion_sets).
+
+    A Bloom filter over the partners known at the last rebuild, plus the
+    exact IDs of partners added since.
+    """
+    __tablename__ = "match_exclusions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bloom = Column(LargeBinary, nullable=False, default=b"")  # Little-endian 64-bit words
+    hash_count = Column(Integer, nullable=False, default=0)
+    overflow = Column(JSON, nullable=False, default=list)  # Partner IDs added since the rebuild
+    item_count = Column(Integer, nullable=False, default=0)  # Partners in the filter
+    rebuilt_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class LobbyEntry(Base):
+    """
+    A user waiting in the matchmaking lobby (see lobby_service).
+
+    Bucketed by cohort and score band; entered_at orders the queue and
+    last_seen_at is refreshed by every poll, so users who close the app
+    drop out.
+    """
+    __tablename__ = "lobby_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    cohort = Column(String, nullable=True, index=True)
+    score_band = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="waiting")  # 'waiting' or 'proposed'
+    proposal_id = Column(Integer, ForeignKey("lobby_proposals.id"), nullable=True)
+    entered_at = Column(DateTime(timezone=True), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class LobbyProposal(Base):
+    """A pair of waiting users put together by the lobby scheduler."""
+    __tablename__ = "lobby_proposals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    compatibility_score = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'requested', 'passed', 'expired'
+    created_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, JSON, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, JSON, DateTime, LargeBinary, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -22,7 +22,9 @@ class User(Base):
     # Matching criteria
     primary_goal = Column(String, nullable=False)
     interests = Column(JSON, nullable=False, default=list)  # Array of strings
+    interest_bits = Column(LargeBinary, nullable=True)  # Packed bitset of interest_vocabulary IDs
     personality = Column(JSON, nullable=False)  # {extroversion, openness, agreeableness, conscientiousness}
+    profile_version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped when scored fields change
     gender_preference = Column(JSON, nullable=False, default=list)  # Array of strings
     age_preference = Column(JSON, nullable=False)  # {min, max}
 
@@ -40,10 +42,14 @@ class User(Base):
     age_collab_only = Column(Boolean, nullable=True, default=False)
     gender_collab_only = Column(Boolean, nullable=True, default=False)
     country = Column(String, nullable=True)
+    cohort = Column(String, nullable=True, index=True)  # Matching shard: country x goal family (cohort_service)
 
     # Location
     location = Column(String, nullable=False)
-    max_distance = Column(Integer, nullable=False, default=5)
+    max_distance = Column(Integer, nullable=False, default=5)  # Kilometres
+    latitude = Column(Float, nullable=True)  # Resolved from location by geo_service
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True, index=True)
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -25,6 +25,36 @@ class MatchResponse(BaseModel):
         from_attributes = True
 
 
+class MatchPage(BaseModel):
+    matches: List[MatchResponse]
+    # Opaque; pass back as ?cursor= for the next page (None on the last page)
+    next_cursor: Optional[str] = None
+
+
+class GroupMatchResponse(BaseModel):
+    group_id: int
+    group_name: Optional[str] = None
+    member_count: int
+    # Fit with the group as a whole (its centroid), not with one member
+    compatibility_score: int
+    score_breakdown: Dict[str, float]
+
+
+class LobbyProposalResponse(BaseModel):
+    proposal_id: int
+    # Card for the proposed partner; its compatibility_score is the pair's
+    partner: MatchResponse
+    created_at: datetime
+
+
+class LobbyStatus(BaseModel):
+    status: str  # 'waiting', 'proposed', or 'none' when not in the lobby
+    waiting_seconds: Optional[float] = None
+    # Users waiting in the same cohort
+    queue_length: Optional[int] = None
+    proposal: Optional[LobbyProposalResponse] = None
+
+
 class MatchRequestCreate(BaseModel):
     to_user_id: int
 
@@ -32,6 +62,10 @@ class MatchRequestCreate(BaseModel):
 class MatchRequestResponse(BaseModel):
     request_id: int
     from_user: MatchResponse
+    # Component points behind from_user.compatibility_score
+    score_breakdown: Optional[Dict[str, float]] = None
+    # Fit with the sender's group, when accepting would join an existing group
+    group_compatibility_score: Optional[int] = None
     created_at: datetime
 
     class Config:
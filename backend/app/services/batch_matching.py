@@ -0,0 +1,413 @@
+"""
+Batch recompute of every user's stored match list across processes.
+
+Scoring is pure NumPy/CPU work, so one process is held back by the GIL.
+Batch mode loads the eligible pool once, copies its feature arrays into a
+single shared memory block, and hands each worker process a shard of the
+candidates. Every worker attaches to the block once (no pickled ORM
+objects) and returns, for every user, the top-K of its shard as row
+indices and scores. The parent merges the per-shard top-Ks into each
+user's global top-K and writes user_match_candidates in bulk.
+
+With cohort sharding on, each task is one cohort shard scored against
+itself, so a worker only touches its shard's rows. Users whose shard has
+fewer than MATCH_SHARD_MIN_MATCHES eligible candidates are then scored
+against the whole pool, split across the workers as above.
+
+Results are exact (no approximate index) and ranked in the same order as
+matching_service.rank_potential_matches: score desc, then user ID asc.
+"""
+import time
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import exists, insert
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.user import User
+from app.models.group import GroupMember
+from app.models.match import MatchRequest, UserMatchCandidate
+from app.services.cohort_service import sharding_enabled
+from app.services.exclusion_sets import load_exclusion_sets
+from app.services.geo_service import distances_km
+from app.services.hard_filters import HardFilters
+from app.services.interest_service import backfill_interest_bits
+from app.services.scoring_engine import PERSONALITY_TRAITS, CandidatePool, compatibility_scores
+
+# Rows written per INSERT statement
+_INSERT_CHUNK = 5000
+
+# Per-process view of the shared feature block, set by _attach
+_shared: Dict[str, Any] = {}
+
+
+class SharedArrays:
+    """A set of named NumPy arrays packed into one shared memory block."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.spec: Dict[str, Tuple[int, Tuple[int, ...], str]] = {}
+        offset = 0
+        for name, array in arrays.items():
+            self.spec[name] = (offset, array.shape, array.dtype.str)
+            # Keep every array 8-byte aligned
+            offset += -(-array.nbytes // 8) * 8
+
+        self.block = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+        for name, array in arrays.items():
+            self.view(self.block, self.spec, name)[...] = array
+
+    @property
+    def name(self) -> str:
+        return self.block.name
+
+    @staticmethod
+    def view(block: shared_memory.SharedMemory, spec: Dict[str, Tuple[int, Tuple[int, ...], str]], name: str) -> np.ndarray:
+        """Array ``name`` of a block, without copying."""
+        offset, shape, dtype = spec[name]
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+
+    def close(self) -> None:
+        """Release and unlink the block."""
+        self.block.close()
+        self.block.unlink()
+
+
+def load_batch_features(db: Session) -> Tuple[List[int], Dict[str, np.ndarray], Dict[Optional[str], int]]:
+    """
+    Load the eligible pool as column arrays, ordered by user ID.
+
+    Cohorts are coded 0..n-1 in the cohort_codes array; users without a
+    cohort get -1.
+
+    Args:
+        db: Database session
+
+    Returns:
+        (user IDs, arrays by name, goal vocabulary)
+    """
+    backfill_interest_bits(db)
+
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    rows = db.query(
+        User.id,
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+        User.cohort,
+    ).filter(
+        User.email_verified == True,
+        ~in_active_group,
+    ).order_by(User.id).all()
+
+    pool = CandidatePool(rows)
+    user_ids = [row.id for row in rows]
+    row_of = {user_id: row for row, user_id in enumerate(user_ids)}
+
+    # Pending requests exclude the pair both ways, as (user row, candidate row) sorted by user
+    pending = db.query(MatchRequest.from_user_id, MatchRequest.to_user_id).filter(
+        MatchRequest.status == "pending"
+    ).all()
+    pairs = [
+        (row_of[a], row_of[b])
+        for from_id, to_id in pending
+        for a, b in ((from_id, to_id), (to_id, from_id))
+        if a in row_of and b in row_of
+    ]
+    # So does each user's exclusion set, tested against the pool as a live ranking would
+    for user_id, exclusions in load_exclusion_sets(db, user_ids).items():
+        row = row_of[user_id]
+        pairs.extend((row, int(excluded)) for excluded in np.flatnonzero(exclusions.contains(pool.user_ids)))
+    pairs = sorted(set(pairs))
+    pending_rows = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+    cohorts = sorted({r.cohort for r in rows if r.cohort})
+    cohort_of = {cohort: code for code, cohort in enumerate(cohorts)}
+
+    arrays = {
+        # Hard-filter columns (ages, age_min, genders, ...), see hard_filters
+        **HardFilters(rows).arrays(),
+        "user_ids": pool.user_ids,
+        "interest_words": pool.interest_words,
+        "interest_counts": pool.interest_counts,
+        "personality": pool.personality,
+        "personality_mask": pool.personality_mask,
+        "goal_codes": pool.goal_codes,
+        # Unresolved locations are NaN and skip the distance rule
+        "latitudes": np.array([r.latitude if r.latitude is not None else np.nan for r in rows], dtype=np.float64),
+        "longitudes": np.array([r.longitude if r.longitude is not None else np.nan for r in rows], dtype=np.float64),
+        "radii": np.array([r.max_distance or 0 for r in rows], dtype=np.float64),
+        "cohort_codes": np.array([cohort_of.get(r.cohort, -1) for r in rows], dtype=np.int64),
+        "pending_users": pending_rows[:, 0].copy(),
+        "pending_candidates": pending_rows[:, 1].copy(),
+    }
+    return user_ids, arrays, pool.goal_vocab
+
+
+def _attach(block_name: str, spec: Dict[str, Tuple[int, Tuple[int, ...], str]],
+            goal_vocab: Dict[Optional[str], int]) -> None:
+    """Worker initializer: map the shared block once per process."""
+    block = shared_memory.SharedMemory(name=block_name)
+    arrays = {name: SharedArrays.view(block, spec, name) for name in spec}
+    _shared.clear()
+    _shared.update(arrays)
+    _shared["block"] = block
+    _shared["goal_names"] = {code: goal for goal, code in goal_vocab.items()}
+    _shared["pool"] = CandidatePool.from_arrays(
+        arrays["user_ids"], arrays["interest_words"], arrays["interest_counts"],
+        arrays["personality"], arrays["personality_mask"], arrays["goal_codes"], goal_vocab,
+    )
+    _shared["filters"] = HardFilters.from_arrays(**{name: arrays[name] for name in HardFilters.COLUMNS})
+
+
+def _user_features(row: int) -> SimpleNamespace:
+    """Rebuild the scorer's view of the user at a pool row."""
+    return SimpleNamespace(
+        interest_bits=_shared["interest_words"][row].tobytes().rstrip(b'\0'),
+        personality={
+            trait: float(_shared["personality"][row, col])
+            for col, trait in enumerate(PERSONALITY_TRAITS)
+            if _shared["personality_mask"][row, col]
+        },
+        primary_goal=_shared["goal_names"][int(_shared["goal_codes"][row])],
+    )
+
+
+def score_shard(start: int, stop: int, top_k: int, cohort: Optional[int] = None,
+                owners: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Top-K of candidate rows start:stop for a set of users.
+
+    Runs in a worker process after _attach.
+
+    Args:
+        start: First candidate row of the shard
+        stop: End of the shard (exclusive)
+        top_k: Candidates to keep per user
+        cohort: Only score this cohort's rows, as both candidates and users
+        owners: Rows of the users to score for (every user, or every
+            cohort member, if None)
+
+    Returns:
+        (user rows, candidate rows, scores); the last two are (users, top_k)
+        and unused slots hold -1
+    """
+    pool, filters = _shared["pool"], _shared["filters"]
+    cohort_codes = _shared["cohort_codes"]
+    if owners is None:
+        owners = np.arange(pool.size) if cohort is None else np.flatnonzero(cohort_codes == cohort)
+
+    # Candidate rows of this task
+    in_shard = np.zeros(pool.size, dtype=np.bool_)
+    in_shard[start:stop] = True
+    if cohort is not None:
+        in_shard &= cohort_codes == cohort
+
+    latitudes, longitudes = _shared["latitudes"], _shared["longitudes"]
+    radii = _shared["radii"]
+    pending_users, pending_candidates = _shared["pending_users"], _shared["pending_candidates"]
+
+    best_rows = np.full((len(owners), top_k), -1, dtype=np.int64)
+    best_scores = np.full((len(owners), top_k), -1, dtype=np.int64)
+
+    for slot, row in enumerate(owners.tolist()):
+        # Eligibility before scoring: hard filters both ways (age bisect,
+        # gender buckets, bitmasks), mutual distance, not themselves, no
+        # pending request or exclusion
+        columns = filters.candidates(filters, row)
+        columns = columns[in_shard[columns]]
+        if not np.isnan(latitudes[row]):
+            distance = distances_km(latitudes[row], longitudes[row], latitudes[columns], longitudes[columns])
+            columns = columns[np.isnan(distance) | (distance <= np.minimum(radii[columns], radii[row]))]
+        lo, hi = np.searchsorted(pending_users, [row, row + 1])
+        columns = columns[~np.isin(columns, np.append(pending_candidates[lo:hi], row))]
+        if not len(columns):
+            continue
+
+        scores = compatibility_scores(_user_features(row), pool.take(columns))
+
+        # Rank key: higher score first, then lower row (= lower user ID)
+        keep = min(top_k, len(columns))
+        keys = (100 - scores) * len(columns) + np.arange(len(columns))
+        top = np.argpartition(keys, keep - 1)[:keep] if keep < len(keys) else np.arange(len(keys))
+        top = top[np.argsort(keys[top])]
+
+        best_rows[slot, :keep] = columns[top]
+        best_scores[slot, :keep] = scores[top]
+
+    return owners, best_rows, best_scores
+
+
+def merge_shard_results(results: List[Tuple[np.ndarray, np.ndarray]], pool_size: int,
+                        top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge per-shard top-Ks into each user's overall top-K.
+
+    Args:
+        results: (candidate rows, scores) from score_shard
+        pool_size: Number of users in the pool
+        top_k: Candidates to keep per user
+
+    Returns:
+        (candidate rows, scores), each (users, top_k); unused slots hold -1
+    """
+    rows = np.concatenate([r for r, _ in results], axis=1)
+    scores = np.concatenate([s for _, s in results], axis=1)
+
+    # Empty slots (score -1) sort after every real candidate
+    keys = (100 - scores) * (pool_size + 1) + np.where(rows >= 0, rows, pool_size)
+    order = np.argsort(keys, axis=1, kind='stable')[:, :top_k]
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def write_batch_results(db: Session, user_ids: List[int], rows: np.ndarray, scores: np.ndarray) -> int:
+    """
+    Replace every stored list with the batch results.
+
+    Users outside the pool get no list, as with rebuild_match_candidates.
+
+    Args:
+        db: Database session
+        user_ids: Pool user IDs by row
+        rows: Candidate rows per user from merge_shard_results
+        scores: Scores per user from merge_shard_results
+
+    Returns:
+        Number of rows written
+    """
+    computed_at = datetime.now(timezone.utc)
+    db.query(UserMatchCandidate).delete(synchronize_session=False)
+
+    owners, ranks = np.nonzero(rows >= 0)
+    records = [
+        {
+            "user_id": user_ids[owner],
+            "candidate_id": user_ids[rows[owner, rank]],
+            "rank": int(rank),
+            "compatibility_score": int(scores[owner, rank]),
+            "computed_at": computed_at,
+        }
+        for owner, rank in zip(owners.tolist(), ranks.tolist())
+    ]
+    for chunk in range(0, len(records), _INSERT_CHUNK):
+        db.execute(insert(UserMatchCandidate), records[chunk:chunk + _INSERT_CHUNK])
+    db.commit()
+
+    return len(records)
+
+
+def _score_pool(executor: ProcessPoolExecutor, size: int, workers: int, top_k: int,
+                owners: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Score users against the whole pool, one candidate slice per worker."""
+    bounds = np.linspace(0, size, min(workers, size) + 1).astype(int)
+    futures = [
+        executor.submit(score_shard, int(start), int(stop), top_k, None, owners)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+    results = [future.result()[1:] for future in futures]
+    return merge_shard_results(results, size, top_k)
+
+
+def _score_cohorts(executor: ProcessPoolExecutor, cohort_codes: np.ndarray, top_k: int,
+                   rows: np.ndarray, scores: np.ndarray) -> int:
+    """Score every cohort shard against itself into rows/scores; returns the shard count."""
+    codes, sizes = np.unique(cohort_codes[cohort_codes >= 0], return_counts=True)
+    # Largest shards first so the pool stays busy
+    futures = [
+        executor.submit(score_shard, 0, len(cohort_codes), top_k, int(code))
+        for code in codes[np.argsort(-sizes, kind='stable')]
+    ]
+    for future in futures:
+        owners, best_rows, best_scores = future.result()
+        rows[owners], scores[owners] = best_rows, best_scores
+    return len(codes)
+
+
+def recompute_all_matches(db: Session, workers: int = 1, top_k: Optional[int] = None,
+                          write: bool = True) -> Dict[str, Any]:
+    """
+    Recompute every eligible user's top-K list with a process pool.
+
+    Args:
+        db: Database session
+        workers: Number of worker processes (and candidate shards)
+        top_k: Candidates per list (MATCH_CANDIDATES_TOP_K if None)
+        write: Store the results in user_match_candidates
+
+    Returns:
+        Stats: users, workers, cohort shards and fallback users (when
+        sharded), pairs scored, seconds per phase, pairs_per_second
+    """
+    top_k = top_k or settings.MATCH_CANDIDATES_TOP_K
+    workers = max(1, workers)
+
+    started = time.perf_counter()
+    with metrics.stage("batch.load"):
+        user_ids, arrays, goal_vocab = load_batch_features(db)
+    metrics.incr("stage.batch.load.rows", len(user_ids))
+    loaded = time.perf_counter()
+
+    size = len(user_ids)
+    rows = np.full((size, top_k), -1, dtype=np.int64)
+    scores = np.full((size, top_k), -1, dtype=np.int64)
+    shards = 0
+    fallback = np.arange(size)
+    pairs = size * (size - 1)
+
+    # CPU time is the parent's only; the shards are scored in worker processes
+    with metrics.stage("batch.score"):
+        if size:
+            shared = SharedArrays(arrays)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                         initargs=(shared.name, shared.spec, goal_vocab)) as executor:
+                    if not sharding_enabled():
+                        rows, scores = _score_pool(executor, size, workers, top_k)
+                    else:
+                        cohort_codes = arrays["cohort_codes"]
+                        shards = _score_cohorts(executor, cohort_codes, top_k, rows, scores)
+                        # Shards too small to fill the minimum (and users without one) rank the whole pool
+                        fallback = np.flatnonzero((scores >= 0).sum(axis=1) < settings.MATCH_SHARD_MIN_MATCHES)
+                        if len(fallback):
+                            rows[fallback], scores[fallback] = _score_pool(executor, size, workers, top_k, fallback)
+                        shard_sizes = np.bincount(cohort_codes[cohort_codes >= 0])
+                        pairs = int((shard_sizes * (shard_sizes - 1)).sum()) + len(fallback) * (size - 1)
+            finally:
+                shared.close()
+    scored = time.perf_counter()
+
+    with metrics.stage("batch.write"):
+        written = write_batch_results(db, user_ids, rows, scores) if write else 0
+    finished = time.perf_counter()
+
+    return {
+        "users": size,
+        "workers": workers,
+        "shards": shards,
+        "fallback_users": len(fallback) if shards else 0,
+        "pairs": pairs,
+        "rows_written": written,
+        "load_seconds": loaded - started,
+        "score_seconds": scored - loaded,
+        "write_seconds": finished - scored,
+        "pairs_per_second": pairs / (scored - loaded) if scored > loaded else 0.0,
+    }
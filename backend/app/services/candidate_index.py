@@ -0,0 +1,326 @@
+"""
+Approximate nearest-neighbour index over the matching feature space.
+
+Used by matching_service once the pool is too large to score in full. A
+query retrieves a few hundred high-likelihood candidates which are then
+exactly re-scored (and eligibility-checked in SQL), so the index only
+affects recall, never the scores themselves.
+
+Two structures are kept per indexed user:
+- A personality grid. Traits are integers 1-10, so every user sits in one
+  of 10^4 cells per goal and everyone in a cell has the same personality.
+  Goal + personality points are therefore exact per (goal, cell), and
+  cells are visited best first.
+- A MinHash signature of the interest set, banded into LSH buckets, to
+  reach candidates whose high interest overlap makes up for a weaker cell.
+  The signature also estimates interest Jaccard for the final ranking.
+
+Inserts and deletes are incremental. Each process keeps its own copy, and
+the match worker rebuilds it periodically so updates made by other
+processes are picked up; a stale entry costs recall, not correctness.
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+from app.models.group import GroupMember
+from app.services.scoring_engine import PERSONALITY_TRAITS, COMPATIBLE_GOALS
+
+MINHASH_BANDS = 16
+MINHASH_ROWS = 3
+_MINHASH_PRIME = (1 << 31) - 1
+
+# How many candidates to gather, per unit of budget, before estimate ranking
+_GATHER_FACTOR = 4
+
+Cell = Tuple[int, ...]
+
+
+def interest_ids_from_bits(bits: Optional[bytes]) -> np.ndarray:
+    """Decode a packed interest bitset into its interest IDs."""
+    if not bits:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.unpackbits(np.frombuffer(bits, dtype=np.uint8), bitorder='little'))
+
+
+def personality_cell(personality: Optional[Dict[str, int]]) -> Optional[Cell]:
+    """Grid cell for a personality, or None if a trait is missing or non-integer."""
+    personality = personality or {}
+    values = [personality.get(trait) for trait in PERSONALITY_TRAITS]
+    if any(not isinstance(v, int) for v in values):
+        return None
+    return tuple(values)
+
+
+def _goal_points(user_goal: Optional[str], goal: Optional[str]) -> float:
+    if goal == user_goal:
+        return 30.0
+    if goal in COMPATIBLE_GOALS.get(user_goal, []):
+        return 15.0
+    return 0.0
+
+
+def _personality_points(user_personality: Dict[str, int], grid: np.ndarray) -> np.ndarray:
+    """Exact personality points for an (n, 4) array of full cells."""
+    total_difference = np.zeros(len(grid), dtype=np.float64)
+    trait_count = 0
+    for col, trait in enumerate(PERSONALITY_TRAITS):
+        if trait in user_personality:
+            total_difference += np.abs(grid[:, col] - user_personality[trait]) / 9.0
+            trait_count += 1
+    if not trait_count:
+        return np.zeros(len(grid), dtype=np.float64)
+    return (1.0 - total_difference / trait_count) * 40.0
+
+
+class _GoalCells:
+    """Occupied personality cells of one goal, with a lazily built array."""
+
+    def __init__(self):
+        self.members: Dict[Cell, Set[int]] = {}
+        self._keys: Optional[List[Cell]] = None
+        self._member_sets: List[Set[int]] = []
+        self._grid: Optional[np.ndarray] = None
+
+    def add(self, cell: Cell, user_id: int) -> None:
+        if cell not in self.members:
+            self.members[cell] = set()
+            self._keys = None
+        self.members[cell].add(user_id)
+
+    def discard(self, cell: Cell, user_id: int) -> None:
+        members = self.members[cell]
+        members.discard(user_id)
+        if not members:
+            del self.members[cell]
+            self._keys = None
+
+    def arrays(self) -> Tuple[List[Set[int]], np.ndarray]:
+        """Member sets and the (cells, traits) grid, in matching order."""
+        if self._keys is None:
+            self._keys = list(self.members)
+            self._member_sets = [self.members[k] for k in self._keys]
+            self._grid = np.array(self._keys, dtype=np.float64).reshape(-1, len(PERSONALITY_TRAITS))
+        return self._member_sets, self._grid
+
+
+class CandidateIndex:
+    """In-process ANN index; thread-safe for concurrent queries and updates."""
+
+    def __init__(self, seed: int = 20240601):
+        rng = np.random.default_rng(seed)
+        hash_count = MINHASH_BANDS * MINHASH_ROWS
+        self._hash_a = rng.integers(1, _MINHASH_PRIME, size=hash_count, dtype=np.int64)
+        self._hash_b = rng.integers(0, _MINHASH_PRIME, size=hash_count, dtype=np.int64)
+        self._lock = threading.RLock()
+        self.built = False
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._cells: Dict[Optional[str], _GoalCells] = {}
+            # Users with incomplete personalities can't be placed in the grid
+            self._partial: Set[int] = set()
+            self._bands: List[Dict[Tuple[int, ...], Set[int]]] = [{} for _ in range(MINHASH_BANDS)]
+            # user ID -> (goal, cell, MinHash signature)
+            self._entries: Dict[int, Tuple[Optional[str], Optional[Cell], Optional[np.ndarray]]] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _signature(self, interest_bits: Optional[bytes]) -> Optional[np.ndarray]:
+        interest_ids = interest_ids_from_bits(interest_bits)
+        if interest_ids.size == 0:
+            return None
+        hashes = (self._hash_a[:, None] * interest_ids[None, :] + self._hash_b[:, None]) % _MINHASH_PRIME
+        return hashes.min(axis=1)
+
+    @staticmethod
+    def _band_keys(signature: Optional[np.ndarray]) -> List[Tuple[int, ...]]:
+        if signature is None:
+            return []
+        return [
+            tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS].tolist())
+            for band in range(MINHASH_BANDS)
+        ]
+
+    def insert(self, user_id: int, interest_bits: Optional[bytes],
+               personality: Optional[Dict[str, int]], primary_goal: Optional[str]) -> None:
+        """Add or replace a user's entry."""
+        cell = personality_cell(personality)
+        signature = self._signature(interest_bits)
+
+        with self._lock:
+            self.remove(user_id)
+            if cell is None:
+                self._partial.add(user_id)
+            else:
+                self._cells.setdefault(primary_goal, _GoalCells()).add(cell, user_id)
+            for band, key in enumerate(self._band_keys(signature)):
+                self._bands[band].setdefault(key, set()).add(user_id)
+            self._entries[user_id] = (primary_goal, cell, signature)
+
+    def remove(self, user_id: int) -> None:
+        """Remove a user's entry if present."""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is None:
+                return
+            goal, cell, signature = entry
+            if cell is None:
+                self._partial.discard(user_id)
+            else:
+                self._cells[goal].discard(cell, user_id)
+            for band, key in enumerate(self._band_keys(signature)):
+                bucket = self._bands[band][key]
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._bands[band][key]
+
+    def query(self, user: Any, limit: int) -> List[int]:
+        """
+        Retrieve about ``limit`` likely top candidates for a user.
+
+        Candidates are gathered from the best goal+personality cells and
+        from shared LSH buckets, then ranked by exact goal+personality
+        points plus 30 x the MinHash estimate of interest Jaccard.
+
+        Args:
+            user: Object with interest_bits, personality and primary_goal
+            limit: Candidate budget
+
+        Returns:
+            Candidate user IDs (unordered, may include the user themselves)
+        """
+        user_personality = user.personality or {}
+        user_signature = self._signature(user.interest_bits)
+
+        with self._lock:
+            budget = _GATHER_FACTOR * limit
+            gathered: Set[int] = set()
+
+            # Interest neighbours from shared LSH buckets, most selective first
+            buckets = [self._bands[band].get(key) for band, key in enumerate(self._band_keys(user_signature))]
+            for bucket in sorted((b for b in buckets if b), key=len):
+                if len(gathered) >= budget:
+                    break
+                gathered.update(bucket)
+
+            # Goal/personality neighbours: best exact cells first
+            budget += len(gathered)
+            for members in self._ranked_cells(user):
+                if len(gathered) >= budget:
+                    break
+                gathered.update(members)
+
+            ranked = self._rank_by_estimate(list(gathered), user.primary_goal, user_personality, user_signature)
+            return ranked[:limit] + list(self._partial)
+
+    def _ranked_cells(self, user: Any) -> Iterable[Set[int]]:
+        """Yield occupied cells' member sets, best goal+personality points first."""
+        user_personality = user.personality or {}
+        cell_lists: List[List[Set[int]]] = []
+        points: List[np.ndarray] = []
+        for goal, cells in self._cells.items():
+            member_sets, grid = cells.arrays()
+            if member_sets:
+                cell_lists.append(member_sets)
+                points.append(_goal_points(user.primary_goal, goal) + _personality_points(user_personality, grid))
+        if not points:
+            return
+
+        offsets = np.cumsum([0] + [len(p) for p in points])
+        for position in np.argsort(-np.concatenate(points), kind='stable'):
+            goal_index = int(np.searchsorted(offsets, position, side='right')) - 1
+            yield cell_lists[goal_index][position - offsets[goal_index]]
+
+    def _rank_by_estimate(self, user_ids: List[int], user_goal: Optional[str],
+                          user_personality: Dict[str, int], user_signature: Optional[np.ndarray]) -> List[int]:
+        user_ids = [u for u in user_ids if self._entries[u][1] is not None]
+        if not user_ids:
+            return []
+
+        entries = [self._entries[u] for u in user_ids]
+        goal_points = np.array([_goal_points(user_goal, goal) for goal, _, _ in entries])
+        grid = np.array([cell for _, cell, _ in entries], dtype=np.float64)
+        estimate = goal_points + _personality_points(user_personality, grid)
+
+        if user_signature is not None:
+            empty = np.full(len(user_signature), -1, dtype=np.int64)
+            signatures = np.stack([sig if sig is not None else empty for _, _, sig in entries])
+            estimate += 30.0 * (signatures == user_signature).mean(axis=1)
+
+        order = np.argsort(-estimate, kind='stable')
+        return [user_ids[row] for row in order]
+
+
+def _indexable_users_query(db: Session):
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    return db.query(
+        User.id,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+    ).filter(
+        User.email_verified == True,
+        ~in_active_group,
+    )
+
+
+def build_candidate_index(db: Session, index: Optional[CandidateIndex] = None) -> CandidateIndex:
+    """
+    (Re)build an index from every verified user not in an active group.
+
+    Args:
+        db: Database session
+        index: Index to fill (the shared candidate_index if None)
+
+    Returns:
+        The filled index
+    """
+    index = index or candidate_index
+    rows = _indexable_users_query(db).all()
+
+    fresh = CandidateIndex()
+    for row in rows:
+        fresh.insert(row.id, row.interest_bits, row.personality, row.primary_goal)
+
+    with index._lock:
+        index._cells, index._partial = fresh._cells, fresh._partial
+        index._bands, index._entries = fresh._bands, fresh._entries
+        index.built = True
+
+    return index
+
+
+def refresh_indexed_users(db: Session, user_ids: Iterable[int], index: Optional[CandidateIndex] = None) -> None:
+    """
+    Re-index specific users after their profile or eligibility changed.
+
+    Args:
+        db: Database session
+        user_ids: Users to re-index
+        index: Index to update (the shared candidate_index if None)
+    """
+    index = index or candidate_index
+    user_ids = list(user_ids)
+    if not index.built or not user_ids:
+        return
+
+    rows = _indexable_users_query(db).filter(User.id.in_(user_ids)).all()
+    for user_id in user_ids:
+        index.remove(user_id)
+    for row in rows:
+        index.insert(row.id, row.interest_bits, row.personality, row.primary_goal)
+
+
+candidate_index = CandidateIndex()
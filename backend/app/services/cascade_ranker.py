@@ -0,0 +1,130 @@
+"""
+Staged top-K ranking with bound-based pruning.
+
+Only the top few candidates of a pool are ever shown, and most of the pool
+can be ruled out from cheap upper bounds before it is fully scored:
+
+1. Bounds: goal points are exact and cheap (a code lookup). Interest
+   points are at most 30 x min(|A|, |B|) / max(|A|, |B|) from the two
+   interest-set sizes alone, and personality at most 40.
+2. Branch and bound: candidates are visited in blocks, best bound first,
+   against a running threshold (the K-th best exact score so far). A
+   block whose best bound is below the threshold ends the search. Inside
+   a block, exact interest points (bitset popcounts) tighten the bound
+   and prune again.
+3. Survivors get the exact score: the same interest + personality + goal
+   sum and rounding as scoring_engine.compatibility_scores.
+
+Every bound is computed with the same float operations as the exact score
+on larger-or-equal inputs, so it never under-estimates. Candidates are
+pruned only when their bound is strictly below the threshold, so ties are
+still broken by pool order and the result is identical to exhaustive
+scoring.
+
+Counters (match_cascade.candidates / bound_pruned / interest_pruned /
+scored) are reported through app.core.metrics.
+"""
+from typing import Any, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.services.scoring_engine import (
+    CandidatePool,
+    goal_scores,
+    interest_scores,
+    pack_interest_words,
+    personality_scores,
+    popcount,
+    rank_candidates,
+)
+
+# Candidates in the first branch-and-bound step, as a multiple of K (and at
+# least _MIN_BLOCK); each later step doubles, so few steps cover any pool
+_BLOCK_FACTOR = 4
+_MIN_BLOCK = 256
+
+
+def interest_bounds(user_interest_bits: Any, pool: CandidatePool) -> np.ndarray:
+    """Upper bound on interest points from interest-set sizes alone."""
+    bounds = np.zeros(pool.size, dtype=np.float64)
+    user_count = int(popcount(pack_interest_words([user_interest_bits]))[0]) if user_interest_bits else 0
+    if not user_count:
+        return bounds
+
+    counts = pool.interest_counts
+    has_interests = counts > 0
+    smaller = np.minimum(counts[has_interests], user_count).astype(np.float64)
+    larger = np.maximum(counts[has_interests], user_count).astype(np.float64)
+    bounds[has_interests] = smaller / larger * 30.0
+    return bounds
+
+
+def _kth_best(scores: np.ndarray, k: int) -> int:
+    """Score a candidate must reach to stay in the top k (-1 while fewer than k are scored)."""
+    if len(scores) < k:
+        return -1
+    return int(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+
+def rank_top_k(user: Any, pool: CandidatePool, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top ``limit`` candidates of a pool, identical to exhaustive ranking.
+
+    Equivalent to rank_candidates(compatibility_scores(user, pool), limit)
+    with the matching scores.
+
+    Args:
+        user: Object with interest_bits, personality and primary_goal
+        pool: Candidates to rank
+        limit: Number of candidates to return
+
+    Returns:
+        (rows, scores) of the top candidates, highest score first and ties
+        in pool order
+    """
+    metrics.incr("match_cascade.candidates", pool.size)
+    if limit <= 0 or pool.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Stage 1: cheap bound for every candidate
+    goal = goal_scores(user.primary_goal, pool)
+    bounds = np.rint(interest_bounds(user.interest_bits, pool) + 40.0 + goal).astype(np.int16)
+    # Bounds fit in int16, which NumPy sorts with a linear-time radix sort
+    order = np.argsort(-bounds, kind='stable')
+
+    block_size = max(_BLOCK_FACTOR * limit, _MIN_BLOCK)
+    scored_rows = np.zeros(0, dtype=np.int64)
+    scored = np.zeros(0, dtype=np.int64)
+    threshold = -1
+    visited = 0
+    interest_pruned = 0
+
+    while visited < pool.size and bounds[order[visited]] >= threshold:
+        block = order[visited:visited + block_size]
+        visited += len(block)
+        block_size *= 2
+        block = block[bounds[block] >= threshold]
+
+        # Stage 2: exact interest points tighten the bound
+        interest = interest_scores(user.interest_bits, pool.take(block))
+        keep = np.rint(interest + 40.0 + goal[block]).astype(np.int64) >= threshold
+        interest_pruned += int(len(block) - keep.sum())
+        block, interest = block[keep], interest[keep]
+
+        # Stage 3: exact scores for the survivors, summed as compatibility_scores does
+        personality = personality_scores(user.personality, pool.take(block))
+        exact = np.rint(interest + personality + goal[block]).astype(np.int64)
+        scored_rows = np.concatenate([scored_rows, block])
+        scored = np.concatenate([scored, exact])
+        threshold = _kth_best(scored, limit)
+
+    metrics.incr("match_cascade.bound_pruned", pool.size - len(scored) - interest_pruned)
+    metrics.incr("match_cascade.interest_pruned", interest_pruned)
+    metrics.incr("match_cascade.scored", len(scored))
+
+    # Pool order among ties, as the stable exhaustive sort
+    by_row = np.argsort(scored_rows, kind='stable')
+    scored_rows, scored = scored_rows[by_row], scored[by_row]
+    top = rank_candidates(scored, limit)
+    return scored_rows[top], scored[top]
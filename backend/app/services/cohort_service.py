@@ -0,0 +1,75 @@
+"""
+Cohort shards of the matching pool.
+
+Users are partitioned by cohort key: country x goal family (goals that
+score each other in calculate_goal_score share a family). Most strong
+matches share a cohort, so with MATCH_SHARDING_ENABLED each user is ranked
+against their own shard only, which bounds the per-request working set and
+lets batch work be split by shard.
+
+A user whose shard holds fewer than MATCH_SHARD_MIN_MATCHES eligible
+candidates falls back to the whole pool, so small shards can still fill
+the top 3. The key is stored on the user (User.cohort, indexed) and kept
+in sync wherever country or primary_goal change.
+"""
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+from app.services.scoring_engine import goal_family
+
+# Country part of the key for users who haven't set one
+UNKNOWN_COUNTRY = "*"
+
+
+def cohort_key(country: Optional[str], primary_goal: Optional[str]) -> str:
+    """
+    Cohort key for a country and goal.
+
+    Args:
+        country: Country name, if set
+        primary_goal: Primary goal, if set
+
+    Returns:
+        "country:goal family", e.g. "united kingdom:friendship"
+    """
+    country = " ".join((country or "").lower().split()) or UNKNOWN_COUNTRY
+    return f"{country}:{goal_family(primary_goal)}"
+
+
+def sharding_enabled() -> bool:
+    """Whether matching is restricted to cohort shards."""
+    return settings.MATCH_SHARDING_ENABLED
+
+
+def sync_cohort(user: User) -> None:
+    """
+    Store the user's cohort key.
+
+    Does not commit; callers commit with the rest of their changes.
+
+    Args:
+        user: User whose country or primary goal changed
+    """
+    user.cohort = cohort_key(user.country, user.primary_goal)
+
+
+def backfill_cohorts(db: Session) -> int:
+    """
+    Set cohort keys for users that don't have one.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of users updated
+    """
+    users = db.query(User).filter(or_(User.cohort == None, User.cohort == "")).all()
+    for user in users:
+        sync_cohort(user)
+    db.commit()
+
+    return len(users)
@@ -0,0 +1,230 @@
+"""
+In-memory eligibility bitmap.
+
+A user can be matched when they are verified and not in an active group
+(which also locks their profile). Instead of re-deriving that with SQL on
+every ranking, each process keeps one bit per user, indexed by a dense
+ordinal: users sorted by ID, new users appended. A ranking ANDs the bits
+with the hard-filter and distance masks before anything is scored.
+
+The bitmap is built from the database at startup and kept current by
+match_events: verifying an email, joining a group (accepting a request,
+admin add-member), leaving one and an admin account reset each refresh
+the bits of the users involved. Events handled by other processes aren't
+seen here, so the match worker reconciles the whole bitmap against the
+database every MATCH_ELIGIBILITY_RECONCILE_SECONDS and counts the bits it
+had wrong (eligibility.drift).
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.group import GroupMember
+from app.models.user import User
+
+
+def load_eligibility(db: Session, user_ids: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Whether users are eligible, straight from the database.
+
+    Args:
+        db: Database session
+        user_ids: Only these users (every user if None)
+
+    Returns:
+        (user IDs ascending, eligible flags)
+    """
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    query = db.query(User.id, User.email_verified, in_active_group.label("in_group"))
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+    rows = query.order_by(User.id).all()
+    return (
+        np.array([row.id for row in rows], dtype=np.int64),
+        np.array([bool(row.email_verified) and not row.in_group for row in rows], dtype=np.bool_),
+    )
+
+
+def _lookup(known_ids: np.ndarray, bits: np.ndarray, user_ids: np.ndarray) -> np.ndarray:
+    """Bits of user_ids in a sorted (IDs, bits) pair; False for unknown IDs."""
+    if not len(known_ids):
+        return np.zeros(len(user_ids), dtype=np.bool_)
+    positions = np.minimum(np.searchsorted(known_ids, user_ids), len(known_ids) - 1)
+    return (known_ids[positions] == user_ids) & bits[positions]
+
+
+class EligibilityBitmap:
+    """One eligibility bit per user, by dense ordinal."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.user_ids = np.zeros(0, dtype=np.int64)  # Ordinal -> user ID, ascending
+        self.bits = np.zeros(0, dtype=np.bool_)
+        self.built = False
+        # Bumped whenever users are added or ordinals move, so cached ordinal lookups can be dropped
+        self.generation = 0
+        self._reconciled_at = 0.0
+        self._last_drift = 0
+        self._snapshot_ordinals: Dict[Any, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _replace(self, user_ids: np.ndarray, bits: np.ndarray) -> None:
+        self.user_ids, self.bits = user_ids, bits
+        self.built = True
+        self.generation += 1
+        self._snapshot_ordinals.clear()
+
+    def rebuild(self, db: Session) -> int:
+        """
+        Rebuild every bit from the database.
+
+        Returns:
+            Number of eligible users
+        """
+        user_ids, bits = load_eligibility(db)
+        with self._lock:
+            self._replace(user_ids, bits)
+            self._reconciled_at = time.monotonic()
+        metrics.incr("eligibility.rebuilds")
+        return int(bits.sum())
+
+    def refresh(self, db: Session, user_ids: Iterable[int]) -> None:
+        """
+        Re-read some users' bits after an event changed them.
+
+        Args:
+            db: Database session
+            user_ids: Users the event touched
+        """
+        if not self.built:
+            return
+        requested = np.array(list(user_ids), dtype=np.int64)
+        found, bits = load_eligibility(db, requested.tolist())
+        with self._lock:
+            positions = np.searchsorted(self.user_ids, found)
+            known = positions < len(self.user_ids)
+            known[known] = self.user_ids[positions[known]] == found[known]
+            self.bits[positions[known]] = bits[known]
+
+            new_ids, new_bits = found[~known], bits[~known]
+            if len(new_ids):
+                # New users usually have the highest IDs and are simply appended
+                all_ids = np.concatenate([self.user_ids, new_ids])
+                all_bits = np.concatenate([self.bits, new_bits])
+                if len(self.user_ids) and new_ids[0] < self.user_ids[-1]:
+                    order = np.argsort(all_ids, kind='stable')
+                    all_ids, all_bits = all_ids[order], all_bits[order]
+                self._replace(all_ids, all_bits)
+
+            # Requested users deleted since: their bits go false
+            gone = np.setdiff1d(requested, found)
+            positions = np.searchsorted(self.user_ids, gone)
+            inside = positions < len(self.user_ids)
+            positions = positions[inside][self.user_ids[positions[inside]] == gone[inside]]
+            self.bits[positions] = False
+        metrics.incr("eligibility.updates", len(requested))
+
+    def mask(self, user_ids: np.ndarray) -> np.ndarray:
+        """
+        Which of these users are eligible (unknown users are not).
+
+        Args:
+            user_ids: User IDs
+
+        Returns:
+            Boolean mask over user_ids
+        """
+        with self._lock:
+            known_ids, bits = self.user_ids, self.bits
+        return _lookup(known_ids, bits, np.asarray(user_ids, dtype=np.int64))
+
+    def is_eligible(self, user_id: int) -> bool:
+        return bool(self.mask(np.array([user_id]))[0])
+
+    def snapshot_mask(self, snapshot: Any) -> np.ndarray:
+        """
+        Eligibility of every row of a feature snapshot.
+
+        The row-to-ordinal lookup is computed once per snapshot version and
+        bitmap generation; after that each call is a single gather.
+
+        Args:
+            snapshot: FeatureSnapshot
+
+        Returns:
+            Boolean mask over the snapshot's rows
+        """
+        with self._lock:
+            key = (snapshot.version, self.generation)
+            cached = self._snapshot_ordinals.get(key)
+            if cached is None:
+                user_ids = snapshot.columns["user_ids"]
+                if len(self.user_ids):
+                    ordinals = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+                    cached = (ordinals, self.user_ids[ordinals] == user_ids)
+                else:
+                    cached = (np.zeros(len(user_ids), dtype=np.int64), np.zeros(len(user_ids), dtype=np.bool_))
+                self._snapshot_ordinals = {key: cached}
+            bits = self.bits
+        ordinals, known = cached
+        return bits[ordinals] & known if len(bits) else known.copy()
+
+    def reconcile(self, db: Session) -> int:
+        """
+        Compare every bit with the database and fix the ones that drifted.
+
+        Returns:
+            Number of users whose bit was wrong, counting users missing
+            from the bitmap and deleted users still marked eligible
+        """
+        user_ids, bits = load_eligibility(db)
+        with self._lock:
+            drift = int((_lookup(self.user_ids, self.bits, user_ids) != bits).sum())
+            drift += len(np.setdiff1d(self.user_ids[self.bits], user_ids))
+            if np.array_equal(user_ids, self.user_ids):
+                self.bits = bits
+            else:
+                self._replace(user_ids, bits)
+            self._reconciled_at = time.monotonic()
+            self._last_drift = drift
+        metrics.incr("eligibility.reconciles")
+        metrics.incr("eligibility.drift", drift)
+        return drift
+
+    def reconcile_if_due(self, db: Session) -> Optional[int]:
+        """Reconcile if built and MATCH_ELIGIBILITY_RECONCILE_SECONDS have passed; returns the drift."""
+        if not self.built or time.monotonic() - self._reconciled_at < settings.MATCH_ELIGIBILITY_RECONCILE_SECONDS:
+            return None
+        return self.reconcile(db)
+
+    def clear(self) -> None:
+        """Forget every bit; rankings fall back to the database until the next rebuild."""
+        with self._lock:
+            self.user_ids = np.zeros(0, dtype=np.int64)
+            self.bits = np.zeros(0, dtype=np.bool_)
+            self.built = False
+            self.generation += 1
+            self._snapshot_ordinals.clear()
+            self._last_drift = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and freshness of this process's bitmap."""
+        with self._lock:
+            return {
+                "built": self.built,
+                "users": len(self.user_ids),
+                "eligible": int(self.bits.sum()),
+                "seconds_since_reconcile": time.monotonic() - self._reconciled_at if self.built else None,
+                "last_drift": self._last_drift,
+            }
+
+
+eligibility = EligibilityBitmap()
@@ -0,0 +1,277 @@
+"""
+Per-user exclusion sets: candidates a user is never shown again.
+
+A pair is excluded once either side turns the other down: a rejected
+match request (the receiver declined, the sender was rejected) or a lobby
+proposal one of them passed on after it was shown to both. Exclusion is
+symmetric, so each user's set alone answers "can these two match", and
+is checked against whole candidate pools with one vectorized test.
+
+Each set is stored in one match_exclusions row:
+
+- A Bloom filter over the partners known at its last rebuild, sized for
+  MATCH_EXCLUSION_FALSE_POSITIVE_RATE (a false positive hides a candidate
+  who could have been shown)
+- An exact overflow list of partners added since, so the filter never
+  fills past the size it was built for
+
+Sets are loaded once per ranking (one primary-key read) and rebuilt from
+match request and lobby history when the overflow passes
+MATCH_EXCLUSION_OVERFLOW_MAX, and periodically by the match worker.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.match import LobbyProposal, MatchExclusion, MatchRequest
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, elementwise on uint64."""
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+class ExclusionSet:
+    """A user's excluded partner IDs: Bloom filter plus exact overflow."""
+
+    def __init__(self, words: np.ndarray, hash_count: int, overflow: Iterable[int]):
+        self.words = words
+        self.size_bits = len(words) * 64
+        self.hash_count = hash_count
+        self.overflow = np.array(sorted(set(overflow)), dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> "ExclusionSet":
+        return cls(np.zeros(0, dtype=np.uint64), 0, [])
+
+    @classmethod
+    def build(cls, user_ids: Iterable[int], false_positive_rate: Optional[float] = None) -> "ExclusionSet":
+        """
+        Bloom filter over a set of user IDs, with an empty overflow.
+
+        Args:
+            user_ids: Partners to exclude
+            false_positive_rate: Target rate (MATCH_EXCLUSION_FALSE_POSITIVE_RATE if None)
+
+        Returns:
+            ExclusionSet containing the IDs
+        """
+        ids = np.unique(np.fromiter(user_ids, dtype=np.int64))
+        if not len(ids):
+            return cls.empty()
+
+        rate = false_positive_rate or settings.MATCH_EXCLUSION_FALSE_POSITIVE_RATE
+        bits = math.ceil(-len(ids) * math.log(rate) / math.log(2) ** 2)
+        words = np.zeros(max(1, -(-bits // 64)), dtype=np.uint64)
+        hash_count = max(1, round(-math.log2(rate)))
+
+        exclusions = cls(words, hash_count, [])
+        for position in exclusions._positions(ids):
+            np.bitwise_or.at(words, (position >> np.uint64(6)).astype(np.int64), np.uint64(1) << (position & np.uint64(63)))
+        return exclusions
+
+    @classmethod
+    def from_row(cls, row: Any) -> "ExclusionSet":
+        """From a match_exclusions row (anything with bloom, hash_count and overflow)."""
+        return cls(np.frombuffer(row.bloom, dtype='<u8').astype(np.uint64), row.hash_count, row.overflow or [])
+
+    def _positions(self, ids: np.ndarray) -> List[np.ndarray]:
+        # Double hashing: position i = h1 + i * h2 (mod filter size)
+        with np.errstate(over='ignore'):
+            first = _mix(ids.astype(np.uint64) + _GOLDEN)
+            step = _mix(first) | np.uint64(1)
+            size = np.uint64(self.size_bits)
+            return [(first + np.uint64(i) * step) % size for i in range(self.hash_count)]
+
+    def contains(self, user_ids: np.ndarray) -> np.ndarray:
+        """
+        Which of these user IDs are excluded (Bloom hits may be false positives).
+
+        Args:
+            user_ids: Candidate IDs
+
+        Returns:
+            Boolean mask over user_ids
+        """
+        ids = np.asarray(user_ids, dtype=np.int64)
+        found = np.isin(ids, self.overflow) if len(self.overflow) else np.zeros(len(ids), dtype=np.bool_)
+        if self.size_bits and len(ids):
+            hit = np.ones(len(ids), dtype=np.bool_)
+            for position in self._positions(ids):
+                words = self.words[(position >> np.uint64(6)).astype(np.int64)]
+                hit &= ((words >> (position & np.uint64(63))) & np.uint64(1)) == 1
+            found |= hit
+        return found
+
+    def __contains__(self, user_id: int) -> bool:
+        return bool(self.contains(np.array([user_id]))[0])
+
+    def __bool__(self) -> bool:
+        return bool(self.size_bits or len(self.overflow))
+
+
+def exclusion_history(db: Session, user_id: int) -> List[int]:
+    """
+    Every partner a user is excluded from, from match request and lobby history.
+
+    Args:
+        db: Database session
+        user_id: User whose partners to read
+
+    Returns:
+        Partner user IDs
+    """
+    requests = db.query(MatchRequest.from_user_id, MatchRequest.to_user_id).filter(
+        MatchRequest.status == "rejected",
+        or_(MatchRequest.from_user_id == user_id, MatchRequest.to_user_id == user_id),
+    ).all()
+    proposals = db.query(LobbyProposal.user_low_id, LobbyProposal.user_high_id).filter(
+        LobbyProposal.status == "passed",
+        or_(LobbyProposal.user_low_id == user_id, LobbyProposal.user_high_id == user_id),
+    ).all()
+    return sorted({b if a == user_id else a for a, b in [*requests, *proposals]})
+
+
+def rebuild_exclusions(db: Session, user_id: int) -> ExclusionSet:
+    """
+    Rebuild a user's stored set from history, folding the overflow into the filter.
+
+    Args:
+        db: Database session
+        user_id: User whose set to rebuild
+
+    Returns:
+        The rebuilt set
+    """
+    partners = exclusion_history(db, user_id)
+    exclusions = ExclusionSet.build(partners)
+    row = db.get(MatchExclusion, user_id)
+    if row is None:
+        row = MatchExclusion(user_id=user_id)
+        db.add(row)
+    row.bloom = exclusions.words.astype('<u8').tobytes()
+    row.hash_count = exclusions.hash_count
+    row.overflow = []
+    row.item_count = len(partners)
+    row.rebuilt_at = datetime.now(timezone.utc)
+    db.commit()
+    metrics.incr("exclusions.rebuilds")
+    return exclusions
+
+
+def _query_sets(db: Session):
+    # Plain rows, not ORM objects, so the read is never served from the identity map
+    return db.query(MatchExclusion.user_id, MatchExclusion.bloom, MatchExclusion.hash_count, MatchExclusion.overflow)
+
+
+def load_exclusions(db: Session, user_id: int) -> ExclusionSet:
+    """A user's exclusion set in one read (empty if they have none)."""
+    row = _query_sets(db).filter(MatchExclusion.user_id == user_id).first()
+    return ExclusionSet.from_row(row) if row is not None else ExclusionSet.empty()
+
+
+def load_exclusion_sets(db: Session, user_ids: Iterable[int]) -> Dict[int, ExclusionSet]:
+    """Exclusion sets of many users in one query; users without one are left out."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    rows = _query_sets(db).filter(MatchExclusion.user_id.in_(user_ids)).all()
+    return {row.user_id: ExclusionSet.from_row(row) for row in rows}
+
+
+def exclude_pair(db: Session, user_id: int, other_id: int) -> None:
+    """
+    Record that two users turned each other down, in both of their sets.
+
+    Call after committing the rejection or pass, so a rebuild sees it.
+
+    Args:
+        db: Database session
+        user_id: One user
+        other_id: The other
+    """
+    for owner_id, partner_id in ((user_id, other_id), (other_id, user_id)):
+        row = db.get(MatchExclusion, owner_id)
+        if row is None:
+            rebuild_exclusions(db, owner_id)
+            continue
+        if partner_id in ExclusionSet.from_row(row):
+            continue
+        if len(row.overflow or []) >= settings.MATCH_EXCLUSION_OVERFLOW_MAX:
+            rebuild_exclusions(db, owner_id)
+            continue
+        row.overflow = [*(row.overflow or []), partner_id]
+        db.commit()
+
+
+def drop_excluded(exclusions: ExclusionSet, user_ids: np.ndarray) -> np.ndarray:
+    """
+    Rows of user_ids that aren't excluded.
+
+    Args:
+        exclusions: The ranking user's set
+        user_ids: Candidate IDs
+
+    Returns:
+        Row indices, ascending
+    """
+    if not exclusions:
+        return np.arange(len(user_ids))
+    excluded = exclusions.contains(user_ids)
+    metrics.incr("exclusions.hits", int(excluded.sum()))
+    return np.flatnonzero(~excluded)
+
+
+def rebuild_stale_exclusions(db: Session, limit: Optional[int] = None) -> int:
+    """
+    Rebuild the sets not rebuilt for MATCH_EXCLUSION_REBUILD_SECONDS, oldest first.
+
+    Args:
+        db: Database session
+        limit: Most sets to rebuild (MATCH_EXCLUSION_REBUILD_BATCH if None)
+
+    Returns:
+        Number of sets rebuilt
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.MATCH_EXCLUSION_REBUILD_SECONDS)
+    user_ids = [row.user_id for row in db.query(MatchExclusion.user_id).filter(
+        MatchExclusion.rebuilt_at < cutoff
+    ).order_by(MatchExclusion.rebuilt_at).limit(limit or settings.MATCH_EXCLUSION_REBUILD_BATCH).all()]
+    for user_id in user_ids:
+        rebuild_exclusions(db, user_id)
+    return len(user_ids)
+
+
+def backfill_exclusions(db: Session) -> int:
+    """
+    Build sets for users with rejections or passes but no stored set.
+
+    Returns:
+        Number of sets built
+    """
+    partners = set()
+    for a, b in db.query(MatchRequest.from_user_id, MatchRequest.to_user_id).filter(
+        MatchRequest.status == "rejected"
+    ).all():
+        partners.update((a, b))
+    for a, b in db.query(LobbyProposal.user_low_id, LobbyProposal.user_high_id).filter(
+        LobbyProposal.status == "passed"
+    ).all():
+        partners.update((a, b))
+
+    stored = {row.user_id for row in db.query(MatchExclusion.user_id).all()}
+    missing = sorted(partners - stored)
+    for user_id in missing:
+        rebuild_exclusions(db, user_id)
+    return len(missing)
@@ -0,0 +1,479 @@
+"""
+Immutable, versioned feature snapshot shared by every worker process.
+
+Each uvicorn worker would otherwise hold its own copy of the candidate
+feature arrays. Instead one process publishes every user's scoring and
+eligibility features as a flat binary file, and every worker maps it
+read-only: the arrays are NumPy views straight into the page cache, so
+there is one physical copy in RAM however many workers read it.
+
+File layout (features-<version>.bin in MATCH_FEATURES_DIR):
+
+- 8 bytes magic, 8 bytes little-endian header length
+- JSON header: version, build time, goal and cohort vocabularies, and
+  each column's dtype, shape and offset
+- Column data, every column 64-byte aligned: user IDs (sorted), flags
+  (verified / in an active group), interest bitset words and counts,
+  personality traits as int8 (-1 where missing), goal codes, the
+  HardFilters columns with their prebuilt age/gender index, coordinates,
+  radii and cohort codes
+
+A file is never modified once written. Publishing writes a new version to
+a temporary file, fsyncs it and renames it into place, then swaps the
+CURRENT pointer file the same way; an flock keeps publishers in different
+processes from racing. Readers re-check CURRENT at most every
+MATCH_FEATURES_CHECK_SECONDS and switch to the new mapping; requests
+already holding the old one finish on it. The last two versions are kept.
+
+Matching events mark the snapshot dirty and the match worker republishes
+once MATCH_FEATURES_MIN_INTERVAL_SECONDS have passed since the last
+version, and at least every MATCH_FEATURES_MAX_AGE_SECONDS. Between
+versions, other users' profile edits and new signups lag behind like the
+candidate index; group joins and un-verifications are re-checked against
+the database before results are returned (see matching_service).
+
+Counters (feature_snapshots.published / swaps / requests) are reported
+through app.core.metrics.
+"""
+import fcntl
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.group import GroupMember
+from app.models.user import User
+from app.services.geo_service import distances_km
+from app.services.hard_filters import HardFilters
+from app.services.interest_service import backfill_interest_bits
+from app.services.scoring_engine import PERSONALITY_TRAITS, CandidatePool, pack_interest_words, popcount
+
+MAGIC = b"BRFEAT01"
+CURRENT = "CURRENT"
+_ALIGN = 64
+_KEEP_VERSIONS = 2
+
+# Bits of the flags column
+VERIFIED = 1
+IN_GROUP = 2
+
+
+def _personality_column(users: Sequence[Any]) -> np.ndarray:
+    """Traits as int8 (-1 where missing), or float64 (NaN) if any value isn't a small integer."""
+    values = np.full((len(users), len(PERSONALITY_TRAITS)), np.nan, dtype=np.float64)
+    for row, user in enumerate(users):
+        personality = user.personality or {}
+        for col, trait in enumerate(PERSONALITY_TRAITS):
+            if trait in personality:
+                values[row, col] = personality[trait]
+
+    present = ~np.isnan(values)
+    known = values[present]
+    if np.all((known == np.round(known)) & (known >= 0) & (known <= 127)):
+        return np.where(present, values, -1).astype(np.int8)
+    return values
+
+
+def load_feature_columns(db: Session) -> Dict[str, Any]:
+    """
+    Every user's features as column arrays, ordered by user ID.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Dictionary with "columns" (arrays by name), "goal_vocab" and
+        "cohorts"
+    """
+    backfill_interest_bits(db)
+
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    users = db.query(
+        User.id,
+        User.email_verified,
+        in_active_group.label("in_group"),
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+        User.cohort,
+    ).order_by(User.id).all()
+
+    interest_words = pack_interest_words([u.interest_bits for u in users])
+    goal_vocab: Dict[Optional[str], int] = {}
+    goal_codes = np.array([goal_vocab.setdefault(u.primary_goal, len(goal_vocab)) for u in users], dtype=np.int16)
+    cohorts = sorted({u.cohort for u in users if u.cohort})
+    cohort_of = {cohort: code for code, cohort in enumerate(cohorts)}
+    filters = HardFilters(users)
+
+    columns = {
+        "user_ids": np.array([u.id for u in users], dtype=np.int64),
+        "flags": np.array([
+            (VERIFIED if u.email_verified else 0) | (IN_GROUP if u.in_group else 0) for u in users
+        ], dtype=np.uint8),
+        "interest_words": interest_words,
+        "interest_counts": popcount(interest_words).astype(np.int16),
+        "personality": _personality_column(users),
+        "goal_codes": goal_codes,
+        **filters.arrays(),
+        **filters.index_arrays(),
+        # Unresolved locations are NaN and skip the distance rule
+        "latitudes": np.array([u.latitude if u.latitude is not None else np.nan for u in users], dtype=np.float64),
+        "longitudes": np.array([u.longitude if u.longitude is not None else np.nan for u in users], dtype=np.float64),
+        "radii": np.array([u.max_distance or 0 for u in users], dtype=np.float64),
+        "cohort_codes": np.array([cohort_of.get(u.cohort, -1) for u in users], dtype=np.int32),
+    }
+    return {"columns": columns, "goal_vocab": goal_vocab, "cohorts": cohorts}
+
+
+def write_snapshot_file(path: str, version: int, features: Dict[str, Any]) -> int:
+    """
+    Write a snapshot file; the file appears at ``path`` complete or not at all.
+
+    Args:
+        path: Destination file
+        version: Version number recorded in the header
+        features: Output of load_feature_columns
+
+    Returns:
+        Size of the file in bytes
+    """
+    layout = {}
+    offset = 0
+    for name, array in features["columns"].items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+
+    header = json.dumps({
+        "version": version,
+        "built_at": time.time(),
+        "goal_vocab": [goal for goal, _ in sorted(features["goal_vocab"].items(), key=lambda item: item[1])],
+        "cohorts": features["cohorts"],
+        "columns": layout,
+    }).encode()
+    data_start = -(-(16 + len(header)) // _ALIGN) * _ALIGN
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".features-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+            for name, array in features["columns"].items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return data_start + offset
+
+
+def _replace_pointer(directory: str, file_name: str) -> None:
+    """Point CURRENT at a snapshot file, atomically."""
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".current-")
+    with os.fdopen(fd, "w") as f:
+        f.write(file_name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, os.path.join(directory, CURRENT))
+
+
+def _read_pointer(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class FeatureSnapshot:
+    """One published snapshot, memory-mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:8] != MAGIC:
+            raise ValueError(f"Not a feature snapshot: {path}")
+        header_length = int.from_bytes(self._map[8:16], "little")
+        header = json.loads(self._map[16:16 + header_length])
+        data_start = -(-(16 + header_length) // _ALIGN) * _ALIGN
+
+        self.version: int = header["version"]
+        self.built_at: float = header["built_at"]
+        self.size_bytes = len(self._map)
+        self.goal_vocab: Dict[Optional[str], int] = {goal: code for code, goal in enumerate(header["goal_vocab"])}
+        self.cohort_of: Dict[str, int] = {cohort: code for code, cohort in enumerate(header["cohorts"])}
+
+        # Zero-copy, read-only views into the mapping
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, spec in header["columns"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            self.columns[name] = np.frombuffer(
+                self._map, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+
+        self.user_ids = self.columns["user_ids"]
+        self.filters = HardFilters.from_arrays(**{name: self.columns[name] for name in HardFilters.COLUMNS})
+        self.filters.set_index(self.columns["by_age"], self.columns["gender_rows"], self.columns["gender_offsets"])
+
+    @property
+    def size(self) -> int:
+        return len(self.user_ids)
+
+    def rows_of(self, user_ids: Sequence[int]) -> np.ndarray:
+        """Rows of the given users that are in the snapshot, ascending."""
+        ids = np.unique(np.asarray(user_ids, dtype=np.int64))
+        rows = np.minimum(np.searchsorted(self.user_ids, ids), max(self.size - 1, 0))
+        return rows[self.user_ids[rows] == ids] if self.size else rows[:0]
+
+    def pool(self, rows: np.ndarray) -> CandidatePool:
+        """Scoring columns of the given rows (a copy of those rows only)."""
+        personality = self.columns["personality"][rows].astype(np.float64)
+        if self.columns["personality"].dtype == np.int8:
+            mask = personality >= 0
+        else:
+            mask = ~np.isnan(personality)
+        return CandidatePool.from_arrays(
+            self.user_ids[rows],
+            self.columns["interest_words"][rows],
+            self.columns["interest_counts"][rows].astype(np.int64),
+            np.where(mask, personality, 0.0),
+            mask,
+            self.columns["goal_codes"][rows].astype(np.int64),
+            self.goal_vocab,
+        )
+
+    def eligible_rows(self, user: Any, excluded_ids: Sequence[int] = (),
+                      candidate_ids: Optional[Sequence[int]] = None, cohort: Optional[str] = None,
+                      eligible: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Rows a user can be matched with, by the same rules as load_eligible_candidates.
+
+        Args:
+            user: User to find candidates for (their live profile, not their row)
+            excluded_ids: Users to leave out (the user, pending requests)
+            candidate_ids: Only consider these users (all users if None)
+            cohort: Only consider users in this cohort (every cohort if None)
+            eligible: Live eligibility of every row (eligibility bitmap), in
+                place of the flags recorded at publish time
+
+        Returns:
+            Row indices, ascending
+        """
+        # Hard filters both ways, by bisecting the age range per gender bucket
+        rows = self.filters.candidates(HardFilters([user]))
+        metrics.filtered("matches.hard_filters", self.size, len(rows))
+        before = len(rows)
+        if eligible is not None:
+            rows = rows[eligible[rows]]
+        else:
+            rows = rows[self.columns["flags"][rows] == VERIFIED]
+        metrics.filtered("matches.eligibility", before, len(rows))
+
+        if candidate_ids is not None:
+            before = len(rows)
+            rows = np.intersect1d(rows, self.rows_of(candidate_ids), assume_unique=True)
+            metrics.filtered("matches.retrieve", before, len(rows))
+        if cohort is not None:
+            before = len(rows)
+            rows = rows[self.columns["cohort_codes"][rows] == self.cohort_of.get(cohort, -2)]
+            metrics.filtered("matches.shard", before, len(rows))
+        if len(excluded_ids):
+            before = len(rows)
+            rows = np.setdiff1d(rows, self.rows_of(excluded_ids), assume_unique=True)
+            metrics.filtered("matches.pending", before, len(rows))
+
+        if user.latitude is not None and user.longitude is not None and len(rows):
+            before = len(rows)
+            latitudes, longitudes = self.columns["latitudes"][rows], self.columns["longitudes"][rows]
+            distance = distances_km(user.latitude, user.longitude, latitudes, longitudes)
+            radii = np.minimum(self.columns["radii"][rows], user.max_distance or 0)
+            rows = rows[np.isnan(distance) | (distance <= radii)]
+            metrics.filtered("matches.distance", before, len(rows))
+        return rows
+
+
+class FeatureSnapshots:
+    """Publishes snapshots and keeps this process's mapping of the current one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[FeatureSnapshot] = None
+        self._checked_at = 0.0
+        self._dirty_since: Optional[float] = None
+
+    @property
+    def directory(self) -> Optional[str]:
+        return settings.MATCH_FEATURES_DIR
+
+    def current(self) -> Optional[FeatureSnapshot]:
+        """
+        The latest published snapshot, or None if snapshots are off or none exists yet.
+
+        Re-reads CURRENT at most every MATCH_FEATURES_CHECK_SECONDS.
+        """
+        directory = self.directory
+        if not directory:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < settings.MATCH_FEATURES_CHECK_SECONDS and self._current:
+                return self._current
+            self._checked_at = now
+            current = self._current
+
+        file_name = _read_pointer(directory)
+        if file_name is None:
+            return current
+        path = os.path.join(directory, file_name)
+        if current is not None and current.path == path:
+            return current
+
+        try:
+            snapshot = FeatureSnapshot(path)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Failed to map feature snapshot {path}: {e}")
+            return current
+        with self._lock:
+            if self._current is None or self._current.version < snapshot.version:
+                # The old mapping is released once requests holding it are done
+                self._current = snapshot
+                metrics.incr("feature_snapshots.swaps")
+            return self._current
+
+    def mark_dirty(self) -> None:
+        """Profiles changed: publish a new version when the debounce allows."""
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = time.time()
+
+    def publish(self, db: Session) -> Dict[str, Any]:
+        """
+        Build and publish a new version, then map it in this process.
+
+        Args:
+            db: Database session
+
+        Returns:
+            Dictionary with version, users, bytes and seconds
+        """
+        directory = self.directory
+        if not directory:
+            raise ValueError("MATCH_FEATURES_DIR is not set")
+        os.makedirs(directory, exist_ok=True)
+        started = time.perf_counter()
+        with self._lock:
+            dirty_since = self._dirty_since
+
+        features = load_feature_columns(db)
+        with open(os.path.join(directory, ".lock"), "w") as lock:
+            # One publisher at a time across processes
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                file_name = _read_pointer(directory)
+                version = int(file_name.split("-")[1].split(".")[0]) + 1 if file_name else 1
+                file_name = f"features-{version:08d}.bin"
+                size = write_snapshot_file(os.path.join(directory, file_name), version, features)
+                _replace_pointer(directory, file_name)
+
+                published = sorted(name for name in os.listdir(directory) if name.startswith("features-"))
+                for old in published[:-_KEEP_VERSIONS]:
+                    # Processes still mapping it keep their pages until they let go
+                    os.unlink(os.path.join(directory, old))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        with self._lock:
+            if self._dirty_since == dirty_since:
+                self._dirty_since = None
+            self._checked_at = 0.0
+        self.current()
+        metrics.incr("feature_snapshots.published")
+
+        return {
+            "version": version,
+            "users": len(features["columns"]["user_ids"]),
+            "bytes": size,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def publish_if_due(self, db: Session) -> Optional[Dict[str, Any]]:
+        """
+        Publish if there is no snapshot yet, profiles changed since the
+        current one was built and it is older than
+        MATCH_FEATURES_MIN_INTERVAL_SECONDS, or it is older than
+        MATCH_FEATURES_MAX_AGE_SECONDS.
+
+        Returns:
+            publish() stats, or None if nothing was due
+        """
+        if not self.directory:
+            return None
+        current = self.current()
+        with self._lock:
+            if current is not None and self._dirty_since is not None and current.built_at >= self._dirty_since:
+                # Another process already published the changes
+                self._dirty_since = None
+            dirty = self._dirty_since is not None
+
+        age = time.time() - current.built_at if current else None
+        if age is not None and age < settings.MATCH_FEATURES_MAX_AGE_SECONDS and not (
+            dirty and age >= settings.MATCH_FEATURES_MIN_INTERVAL_SECONDS
+        ):
+            return None
+        return self.publish(db)
+
+    def clear(self) -> None:
+        """Forget the mapped snapshot and any pending change (files are left alone)."""
+        with self._lock:
+            self._current = None
+            self._checked_at = 0.0
+            self._dirty_since = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Mapped version, its size and age."""
+        with self._lock:
+            current = self._current
+            dirty = self._dirty_since is not None
+        if current is None:
+            return {"enabled": bool(self.directory), "version": None, "dirty": dirty}
+        return {
+            "enabled": bool(self.directory),
+            "version": current.version,
+            "users": current.size,
+            "bytes": current.size_bytes,
+            "built_at": datetime.fromtimestamp(current.built_at, timezone.utc).isoformat(),
+            "dirty": dirty,
+        }
+
+
+feature_snapshots = FeatureSnapshots()
@@ -0,0 +1,229 @@
+"""
+Offline location resolution and distance filtering.
+
+User.location is free text picked from the app's city list. It is resolved
+against a bundled gazetteer (app/data/gazetteer.csv, no network calls) to
+coordinates stored on the user, along with a geohash used to fetch nearby
+candidates with indexed range scans.
+
+Two users can match only when each is inside the other's max_distance
+(kilometres), i.e. their distance is at most the smaller of the two radii.
+Users whose location can't be resolved have no coordinates, and no
+distance rule applies to them until they pick a known city.
+"""
+import csv
+import os
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer.csv")
+
+# Stored geohash precision (~1.2 x 0.6 km cells); queries use shorter prefixes
+GEOHASH_PRECISION = 6
+EARTH_RADIUS_KM = 6371.0
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# normalized "city" and "city, country" -> (latitude, longitude)
+_gazetteer: Optional[Dict[str, Tuple[float, float]]] = None
+_gazetteer_lock = threading.Lock()
+
+
+def _normalize(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(name.lower().replace(".", " ").split())
+
+
+def _load_gazetteer() -> Dict[str, Tuple[float, float]]:
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            entries: Dict[str, Tuple[float, float]] = {}
+            with open(GAZETTEER_PATH, encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    point = (float(row["latitude"]), float(row["longitude"]))
+                    names = [row["city"], *filter(None, row["aliases"].split(";"))]
+                    for name in names:
+                        entries[f"{_normalize(name)}, {_normalize(row['country'])}"] = point
+                        entries.setdefault(_normalize(name), point)
+            _gazetteer = entries
+        return _gazetteer
+
+
+def resolve_location(location: Optional[str], country: Optional[str] = None) -> Optional[Tuple[float, float]]:
+    """
+    Resolve a free-text location to coordinates.
+
+    Accepts "City", "City, Country" or an alias ("NYC"); the country, when
+    given, disambiguates cities that share a name.
+
+    Args:
+        location: Location text
+        country: Country name, if known
+
+    Returns:
+        (latitude, longitude), or None if the place isn't in the gazetteer
+    """
+    if not location:
+        return None
+
+    gazetteer = _load_gazetteer()
+    city = _normalize(location.split(",")[0])
+    keys = [_normalize(location)]
+    if country:
+        keys.append(f"{city}, {_normalize(country)}")
+    keys.append(city)
+
+    for key in keys:
+        if key in gazetteer:
+            return gazetteer[key]
+    return None
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Standard base32 geohash of a point."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def _cell_size_degrees(length: int) -> Tuple[float, float]:
+    """(latitude, longitude) span of a geohash cell of this length."""
+    lon_bits = (5 * length + 1) // 2
+    lat_bits = 5 * length // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_cover(latitude: float, longitude: float, radius_km: float, max_cells: int = 16) -> List[str]:
+    """
+    Geohash prefixes whose cells together cover a circle.
+
+    Uses the longest prefix length that needs at most max_cells cells.
+
+    Args:
+        latitude: Circle centre latitude
+        longitude: Circle centre longitude
+        radius_km: Circle radius
+        max_cells: Upper bound on returned prefixes
+
+    Returns:
+        Geohash prefixes (an empty string means "everywhere")
+    """
+    lat_delta = radius_km / 111.0
+    cos_lat = max(np.cos(np.radians(latitude)), 1e-6)
+    lon_delta = min(180.0, radius_km / (111.0 * cos_lat))
+    south, north = max(-90.0, latitude - lat_delta), min(90.0, latitude + lat_delta)
+
+    for length in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = _cell_size_degrees(length)
+        if (north - south) / lat_step + 2 > max_cells or (2 * lon_delta) / lon_step + 2 > max_cells:
+            continue
+        lats = np.append(np.arange(south, north, lat_step), north)
+        lons = np.append(np.arange(longitude - lon_delta, longitude + lon_delta, lon_step), longitude + lon_delta)
+        cells = {
+            encode_geohash(float(lat), (float(lon) + 180.0) % 360.0 - 180.0, length)
+            for lat in lats for lon in lons
+        }
+        if len(cells) <= max_cells:
+            return sorted(cells)
+    return [""]
+
+
+def geohash_range(prefix: str) -> Tuple[str, str]:
+    """Inclusive bounds of the stored geohashes that start with prefix."""
+    padding = GEOHASH_PRECISION - len(prefix)
+    return prefix + "0" * padding, prefix + "z" * padding
+
+
+def distances_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle (haversine) distance from a point to each of many points."""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def within_mutual_distance(user: Any, candidates: Sequence[Any]) -> np.ndarray:
+    """
+    Which candidates are inside the user's radius and have the user inside theirs.
+
+    Args:
+        user: Object with latitude, longitude and max_distance
+        candidates: Objects with latitude, longitude and max_distance
+
+    Returns:
+        Boolean mask; True wherever either side has no coordinates
+    """
+    mask = np.ones(len(candidates), dtype=np.bool_)
+    if user.latitude is None or user.longitude is None or not len(candidates):
+        return mask
+
+    located = np.array([c.latitude is not None and c.longitude is not None for c in candidates], dtype=np.bool_)
+    if not located.any():
+        return mask
+
+    rows = np.flatnonzero(located)
+    latitudes = np.array([candidates[row].latitude for row in rows], dtype=np.float64)
+    longitudes = np.array([candidates[row].longitude for row in rows], dtype=np.float64)
+    radii = np.array([candidates[row].max_distance or 0 for row in rows], dtype=np.float64)
+
+    distance = distances_km(user.latitude, user.longitude, latitudes, longitudes)
+    mask[rows] = distance <= np.minimum(radii, user.max_distance or 0)
+    return mask
+
+
+def sync_coordinates(user: User) -> None:
+    """
+    Resolve the user's location and store coordinates and geohash.
+
+    Does not commit; callers commit with the rest of their changes.
+
+    Args:
+        user: User whose location or country changed
+    """
+    point = resolve_location(user.location, user.country)
+    if point is None:
+        user.latitude = user.longitude = user.geohash = None
+    else:
+        user.latitude, user.longitude = point
+        user.geohash = encode_geohash(*point)
+
+
+def backfill_coordinates(db: Session) -> int:
+    """
+    Resolve locations for users that have never been geocoded.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of users resolved
+    """
+    users = db.query(User).filter(User.latitude == None, User.location != None, User.location != "").all()
+    resolved = 0
+    for user in users:
+        sync_coordinates(user)
+        resolved += user.latitude is not None
+    db.commit()
+
+    return resolved
@@ -0,0 +1,460 @@
+"""
+Group-aware matching: score people against the group they would join.
+
+Accepting a request from someone who is already in a group puts the
+receiver in that whole group, so fit with the group matters more than fit
+with the sender. Each group keeps a centroid of its active members
+(GroupCentroid): personality trait sums and counts, how many members have
+each interest, and how many members have each goal. Joining or leaving
+adds or subtracts one member's features. Profiles are locked while their
+owner is in a group, so membership changes are the only updates.
+
+A candidate is scored against a centroid with the pairwise formula
+generalised to a group, so a group of one scores exactly like its member:
+
+- Interests (0-30): weighted Jaccard of the candidate's interest set and
+  the group's interest frequencies (members with the interest / members)
+- Personality (0-40): the usual trait formula against the mean trait
+  values of the members who gave them
+- Goal (0-30): the goal score averaged over the members' goals
+
+Candidates x open groups are scored as matrices in one NumPy pass, with no
+per-member scoring loops. Hard constraints stay pairwise: a candidate is
+only offered a group if they pass every member's preferences, deal
+breakers and mutual distance both ways. Groups with fewer active members
+than GROUP_MAX_MEMBERS are open.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.group import GroupCentroid, GroupMember
+from app.models.user import User
+from app.services.geo_service import within_mutual_distance
+from app.services.hard_filters import HardFilters
+from app.services.interest_service import sync_interest_bits
+from app.services.scoring_engine import PERSONALITY_TRAITS, CandidatePool, goal_scores
+
+# Candidates scored per block when filling every open group
+_CHUNK = 4096
+
+
+def interest_ids(interest_bits: Optional[bytes]) -> List[int]:
+    """Interest IDs (bit positions) set in a packed bitset."""
+    if not interest_bits:
+        return []
+    bits = np.unpackbits(np.frombuffer(interest_bits, dtype=np.uint8), bitorder='little')
+    return np.flatnonzero(bits).tolist()
+
+
+def _apply_member(centroid: GroupCentroid, user: User, sign: int) -> None:
+    """Add (sign=1) or subtract (sign=-1) one member's features."""
+    personality_sums = dict(centroid.personality_sums or {})
+    personality_counts = dict(centroid.personality_counts or {})
+    for trait, value in (user.personality or {}).items():
+        if trait in PERSONALITY_TRAITS:
+            personality_sums[trait] = personality_sums.get(trait, 0) + sign * value
+            personality_counts[trait] = personality_counts.get(trait, 0) + sign
+
+    interest_counts = dict(centroid.interest_counts or {})
+    for interest_id in interest_ids(user.interest_bits):
+        key = str(interest_id)
+        interest_counts[key] = interest_counts.get(key, 0) + sign
+
+    goal_counts = {goal: count for goal, count in centroid.goal_counts or []}
+    goal_counts[user.primary_goal] = goal_counts.get(user.primary_goal, 0) + sign
+
+    # Reassigned (not mutated in place) so the JSON columns are saved
+    centroid.member_count = (centroid.member_count or 0) + sign
+    centroid.personality_sums = {t: v for t, v in personality_sums.items() if personality_counts[t]}
+    centroid.personality_counts = {t: c for t, c in personality_counts.items() if c}
+    centroid.interest_counts = {i: c for i, c in interest_counts.items() if c}
+    centroid.goal_counts = [[goal, count] for goal, count in goal_counts.items() if count]
+
+
+def add_group_member(db: Session, group_id: int, user: User) -> None:
+    """
+    Add a member's features to their group's centroid.
+
+    Does not commit; call before the commit that adds the membership.
+
+    Args:
+        db: Database session
+        group_id: Group joined
+        user: New member
+    """
+    if user.interest_bits is None:
+        sync_interest_bits(db, user)
+    centroid = db.query(GroupCentroid).filter(GroupCentroid.group_id == group_id).first()
+    if centroid is None:
+        centroid = GroupCentroid(group_id=group_id, member_count=0)
+        _apply_member(centroid, user, 1)
+        db.add(centroid)
+        # Sessions don't autoflush: flush so a second founding member finds it
+        db.flush()
+        return
+    _apply_member(centroid, user, 1)
+
+
+def remove_group_member(db: Session, group_id: int, user: User) -> None:
+    """
+    Subtract a leaving member's features from their group's centroid.
+
+    Does not commit; call before the commit that ends the membership.
+
+    Args:
+        db: Database session
+        group_id: Group left
+        user: Leaving member, with the profile they have in the group
+    """
+    centroid = db.query(GroupCentroid).filter(GroupCentroid.group_id == group_id).first()
+    if centroid is None:
+        return
+    if user.interest_bits is None:
+        sync_interest_bits(db, user)
+    _apply_member(centroid, user, -1)
+    if centroid.member_count <= 0:
+        db.delete(centroid)
+
+
+def rebuild_group_centroid(db: Session, group_id: int) -> Optional[GroupCentroid]:
+    """
+    Recompute a group's centroid from its active members.
+
+    Used for groups formed before centroids were stored. Does not commit.
+
+    Args:
+        db: Database session
+        group_id: Group to rebuild
+
+    Returns:
+        The centroid, or None if the group has no active members
+    """
+    members = db.query(User).join(GroupMember, GroupMember.user_id == User.id).filter(
+        GroupMember.group_id == group_id,
+        GroupMember.status == "active"
+    ).all()
+    centroid = db.query(GroupCentroid).filter(GroupCentroid.group_id == group_id).first()
+    if not members:
+        if centroid is not None:
+            db.delete(centroid)
+        return None
+
+    if centroid is None:
+        centroid = GroupCentroid(group_id=group_id)
+        db.add(centroid)
+    centroid.member_count = 0
+    centroid.personality_sums, centroid.personality_counts = {}, {}
+    centroid.interest_counts, centroid.goal_counts = {}, []
+    for member in members:
+        if member.interest_bits is None:
+            sync_interest_bits(db, member)
+        _apply_member(centroid, member, 1)
+    return centroid
+
+
+def backfill_group_centroids(db: Session) -> int:
+    """
+    Build centroids for groups with active members but none stored yet.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of centroids built
+    """
+    has_centroid = exists().where(GroupCentroid.group_id == GroupMember.group_id)
+    group_ids = [row.group_id for row in db.query(GroupMember.group_id).filter(
+        GroupMember.status == "active",
+        ~has_centroid,
+    ).distinct()]
+    for group_id in group_ids:
+        rebuild_group_centroid(db, group_id)
+    db.commit()
+
+    return len(group_ids)
+
+
+class GroupFeatures:
+    """Centroids of a set of groups as arrays, one row per group."""
+
+    def __init__(self, centroids: Sequence[GroupCentroid]):
+        self.size = len(centroids)
+        self.group_ids = np.array([c.group_id for c in centroids], dtype=np.int64)
+        self.member_counts = np.array([c.member_count for c in centroids], dtype=np.float64)
+
+        # Interest frequencies (members with the interest / members), by interest ID
+        width = 1 + max([int(i) for c in centroids for i in c.interest_counts or {}], default=-1)
+        self.interest_freq = np.zeros((self.size, width), dtype=np.float64)
+        for row, centroid in enumerate(centroids):
+            for interest_id, count in (centroid.interest_counts or {}).items():
+                self.interest_freq[row, int(interest_id)] = count / centroid.member_count
+        self.interest_totals = self.interest_freq.sum(axis=1)
+
+        # Mean trait values over the members who gave them
+        self.personality = np.zeros((self.size, len(PERSONALITY_TRAITS)), dtype=np.float64)
+        self.personality_mask = np.zeros((self.size, len(PERSONALITY_TRAITS)), dtype=np.bool_)
+        for row, centroid in enumerate(centroids):
+            counts = centroid.personality_counts or {}
+            for col, trait in enumerate(PERSONALITY_TRAITS):
+                if counts.get(trait):
+                    self.personality[row, col] = centroid.personality_sums[trait] / counts[trait]
+                    self.personality_mask[row, col] = True
+
+        # Share of members with each goal
+        self.goals: List[Optional[str]] = sorted(
+            {goal for c in centroids for goal, _ in c.goal_counts or []}, key=lambda g: (g is None, g or "")
+        )
+        column = {goal: col for col, goal in enumerate(self.goals)}
+        self.goal_shares = np.zeros((self.size, len(self.goals)), dtype=np.float64)
+        for row, centroid in enumerate(centroids):
+            for goal, count in centroid.goal_counts or []:
+                self.goal_shares[row, column[goal]] = count / centroid.member_count
+
+
+def centroid_components(groups: GroupFeatures, pool: CandidatePool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score components of every candidate against every group.
+
+    Returns:
+        (interest, personality, goal) float64 arrays of shape (groups, candidates)
+    """
+    shape = (groups.size, pool.size)
+    if not groups.size or not pool.size:
+        return np.zeros(shape), np.zeros(shape), np.zeros(shape)
+
+    # Interests: overlap = sum of the group's frequencies over the candidate's interests
+    bits = np.unpackbits(np.ascontiguousarray(pool.interest_words).view(np.uint8), axis=1, bitorder='little')
+    width = min(bits.shape[1], groups.interest_freq.shape[1])
+    overlap = groups.interest_freq[:, :width] @ bits[:, :width].T.astype(np.float64)
+    union = groups.interest_totals[:, None] + pool.interest_counts[None, :] - overlap
+    interest = np.zeros(shape, dtype=np.float64)
+    scored = (groups.interest_totals[:, None] > 0) & (pool.interest_counts[None, :] > 0)
+    interest[scored] = overlap[scored] / union[scored] * 30.0
+
+    # Personality: trait by trait, in the scalar order
+    total_difference = np.zeros(shape, dtype=np.float64)
+    trait_count = np.zeros(shape, dtype=np.int64)
+    for col in range(len(PERSONALITY_TRAITS)):
+        present = groups.personality_mask[:, col, None] & pool.personality_mask[None, :, col]
+        normalized_diff = np.abs(pool.personality[None, :, col] - groups.personality[:, col, None]) / 9.0
+        total_difference = np.where(present, total_difference + normalized_diff, total_difference)
+        trait_count += present
+    personality = np.zeros(shape, dtype=np.float64)
+    scored = trait_count > 0
+    personality[scored] = (1.0 - total_difference[scored] / trait_count[scored].astype(np.float64)) * 40.0
+
+    # Goal: the pairwise goal score averaged over the members' goals
+    per_goal = np.array([goal_scores(goal, pool) for goal in groups.goals]).reshape(len(groups.goals), pool.size)
+    goal = groups.goal_shares @ per_goal
+
+    return interest, personality, goal
+
+
+def centroid_scores(groups: GroupFeatures, pool: CandidatePool) -> np.ndarray:
+    """Compatibility (0-100) of every candidate with every group, shape (groups, candidates)."""
+    interest, personality, goal = centroid_components(groups, pool)
+    return np.rint(interest + personality + goal).astype(np.int64)
+
+
+def load_open_groups(db: Session, group_ids: Optional[Sequence[int]] = None) -> Tuple[GroupFeatures, List[Any]]:
+    """
+    Centroids and members of the open groups.
+
+    Args:
+        db: Database session
+        group_ids: Only these groups (every open group if None)
+
+    Returns:
+        (group features, member rows with group_id and the hard-filter and
+        location columns, ordered by group)
+    """
+    query = db.query(GroupCentroid).filter(
+        GroupCentroid.member_count > 0,
+        GroupCentroid.member_count < settings.GROUP_MAX_MEMBERS,
+    )
+    if group_ids is not None:
+        query = query.filter(GroupCentroid.group_id.in_(group_ids))
+    centroids = query.order_by(GroupCentroid.group_id).all()
+
+    members = db.query(
+        GroupMember.group_id,
+        User.id,
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+    ).join(User, User.id == GroupMember.user_id).filter(
+        GroupMember.status == "active",
+        GroupMember.group_id.in_([c.group_id for c in centroids]),
+    ).order_by(GroupMember.group_id, User.id).all() if centroids else []
+
+    return GroupFeatures(centroids), members
+
+
+def _member_rows(groups: GroupFeatures, members: Sequence[Any]) -> np.ndarray:
+    """Group row of each member."""
+    row_of = {group_id: row for row, group_id in enumerate(groups.group_ids.tolist())}
+    return np.array([row_of[m.group_id] for m in members], dtype=np.int64)
+
+
+def rank_open_groups(db: Session, user: User, limit: int = 3) -> List[Dict[str, Any]]:
+    """
+    The open groups a user fits best.
+
+    Args:
+        db: Database session
+        user: User looking for a group
+        limit: Maximum number of groups
+
+    Returns:
+        Dictionaries with group_id, member_count, compatibility_score and
+        score_breakdown, highest score first (then lowest group ID)
+    """
+    if user.interest_bits is None:
+        sync_interest_bits(db, user)
+        db.commit()
+
+    groups, members = load_open_groups(db)
+    if not groups.size:
+        return []
+
+    # Every member and the user must pass each other's hard constraints
+    allowed = HardFilters(members).mask(HardFilters([user])) & within_mutual_distance(user, members)
+    blocked = np.bincount(_member_rows(groups, members)[~allowed], minlength=groups.size)
+
+    interest, personality, goal = (c[:, 0] for c in centroid_components(groups, CandidatePool([user])))
+    scores = np.rint(interest + personality + goal).astype(np.int64)
+    rows = np.flatnonzero(blocked == 0)
+    rows = rows[np.lexsort((groups.group_ids[rows], -scores[rows]))][:limit]
+
+    return [
+        {
+            "group_id": int(groups.group_ids[row]),
+            "member_count": int(groups.member_counts[row]),
+            "compatibility_score": int(scores[row]),
+            "score_breakdown": {
+                "interests": float(interest[row]),
+                "personality": float(personality[row]),
+                "goal": float(goal[row]),
+            },
+        }
+        for row in rows.tolist()
+    ]
+
+
+def group_fit_scores(db: Session, user: User, group_ids: Sequence[int]) -> Dict[int, int]:
+    """
+    Compatibility of a user with each of several groups, open or not.
+
+    Args:
+        db: Database session
+        user: User who would join
+        group_ids: Groups to score against
+
+    Returns:
+        Dictionary of group ID to score (groups without a centroid are left out)
+    """
+    if not group_ids:
+        return {}
+    if user.interest_bits is None:
+        sync_interest_bits(db, user)
+    centroids = db.query(GroupCentroid).filter(
+        GroupCentroid.group_id.in_(group_ids),
+        GroupCentroid.member_count > 0,
+    ).order_by(GroupCentroid.group_id).all()
+    groups = GroupFeatures(centroids)
+    scores = centroid_scores(groups, CandidatePool([user]))[:, 0]
+    return dict(zip(groups.group_ids.tolist(), scores.tolist()))
+
+
+def suggest_group_members(db: Session, per_group: int = 3,
+                          group_ids: Optional[Sequence[int]] = None) -> Dict[int, List[Tuple[int, int]]]:
+    """
+    Best-fitting newcomers for every open group, scored in batch.
+
+    Candidates are verified users outside any active group who pass every
+    member's hard constraints and mutual distance both ways. They are
+    scored against all open groups at once, a block of candidates at a
+    time.
+
+    Args:
+        db: Database session
+        per_group: Candidates to keep per group
+        group_ids: Only these groups (every open group if None)
+
+    Returns:
+        Dictionary of group ID to (user ID, score) pairs, highest score
+        first (then lowest user ID)
+    """
+    groups, members = load_open_groups(db, group_ids)
+    if not groups.size:
+        return {}
+
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    candidates = db.query(
+        User.id,
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+    ).filter(
+        User.email_verified == True,
+        ~in_active_group,
+    ).order_by(User.id).all()
+
+    member_rows = _member_rows(groups, members)
+    member_filters = HardFilters(members)
+    best_ids = np.full((groups.size, per_group), -1, dtype=np.int64)
+    best_scores = np.full((groups.size, per_group), -1, dtype=np.int64)
+
+    for start in range(0, len(candidates), _CHUNK):
+        block = candidates[start:start + _CHUNK]
+        pool = CandidatePool(block)
+        filters = HardFilters(block)
+
+        # A group is allowed for a candidate only if every member is
+        allowed = np.ones((groups.size, len(block)), dtype=np.bool_)
+        for position, member in enumerate(members):
+            ok = filters.mask(member_filters, position) & within_mutual_distance(member, block)
+            allowed[member_rows[position]] &= ok
+
+        scores = np.where(allowed, centroid_scores(groups, pool), -1)
+
+        # Merge with the best so far: score desc, then user ID asc
+        ids = np.concatenate([best_ids, np.broadcast_to(pool.user_ids, scores.shape)], axis=1)
+        merged = np.concatenate([best_scores, scores], axis=1)
+        keys = np.where(merged >= 0, (100 - merged) * (ids.max() + 2) + ids, np.iinfo(np.int64).max)
+        order = np.argsort(keys, axis=1, kind='stable')[:, :per_group]
+        best_ids = np.take_along_axis(ids, order, axis=1)
+        best_scores = np.take_along_axis(merged, order, axis=1)
+
+    return {
+        int(group_id): [
+            (int(user_id), int(score)) for user_id, score in zip(ids, scores) if score >= 0
+        ]
+        for group_id, ids, scores in zip(groups.group_ids.tolist(), best_ids.tolist(), best_scores.tolist())
+    }
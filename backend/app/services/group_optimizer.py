@@ -0,0 +1,372 @@
+"""
+Batch group-formation optimizer.
+
+Groups normally form one accepted request at a time, from each user's own
+greedy top 3. This optimizer looks at the whole eligible pool instead and
+proposes groups of a target size that maximize total compatibility: the
+sum, over every group, of the compatibility scores of all member pairs.
+
+To stay bounded on large pools it works cluster by cluster. Users are
+ordered by coarse location, goal family, goal and coarse personality,
+then cut into
+clusters of GROUP_OPTIMIZER_CLUSTER_SIZE. Within a cluster:
+
+1. Greedy agglomeration: users with the best available partner seed a
+   group, which grows by the user adding the most score to it.
+2. Local search: the best member swap between two groups is applied
+   while it improves the objective, within the cluster's share of the
+   time budget.
+
+Hard constraints hold for every pair in a group, both ways: each member
+passes the other's preferences (matches_preferences) and deal breakers
+(violates_deal_breakers), see hard_filters, and located members are
+within each other's max_distance (within_mutual_distance).
+
+Proposals are written to group_proposals; nothing joins a group until a
+proposal is acted on.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import exists, insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+from app.models.group import GroupMember, GroupProposal, GroupProposalMember
+from app.services.geo_service import distances_km
+from app.services.hard_filters import HardFilters
+from app.services.interest_service import backfill_interest_bits
+from app.services.pair_scores import pair_score_matrix
+from app.services.scoring_engine import PERSONALITY_TRAITS, goal_family
+
+# Smallest group worth proposing when a cluster can't fill the target size
+MIN_GROUP_SIZE = 2
+
+# Personality traits (1-10) are bucketed this coarsely when ordering users into clusters
+_PERSONALITY_BUCKET = 4
+
+# Geohash prefix length (~40 km cells) used to keep nearby users in the same clusters
+_CLUSTER_GEOHASH_LENGTH = 4
+
+
+def cluster_rows(users: Sequence[Any], cluster_size: int) -> List[np.ndarray]:
+    """
+    Split users into clusters of similar users.
+
+    Args:
+        users: Objects with id, primary_goal, personality and (optionally) geohash
+        cluster_size: Maximum users per cluster
+
+    Returns:
+        Arrays of row indices into users, one per cluster
+    """
+    def sort_key(row: int) -> Tuple:
+        user = users[row]
+        personality = user.personality or {}
+        buckets = tuple(int(personality.get(t, 0)) // _PERSONALITY_BUCKET for t in PERSONALITY_TRAITS)
+        cell = (getattr(user, 'geohash', None) or "")[:_CLUSTER_GEOHASH_LENGTH]
+        return (cell, goal_family(user.primary_goal), user.primary_goal or "", buckets, user.id)
+
+    order = np.array(sorted(range(len(users)), key=sort_key), dtype=np.int64)
+    return [order[start:start + cluster_size] for start in range(0, len(order), cluster_size)]
+
+
+def pair_matrices(users: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairwise scores and hard constraints for a set of users.
+
+    Args:
+        users: Objects with id, the hard_filters.HardFilters attributes and
+            the scoring attributes; latitude, longitude and max_distance are
+            optional
+
+    Returns:
+        (scores, allowed): symmetric (n, n) float and bool matrices with a
+        zero / False diagonal
+    """
+    size = len(users)
+    # Scores and constraints are symmetric: each pair is checked once, then mirrored
+    scores = pair_score_matrix(users).astype(np.float64)
+
+    # Preferences, collab-only flags and deal breakers, in both directions
+    filters = HardFilters(users)
+    allowed = np.zeros((size, size), dtype=np.bool_)
+    for row in range(size - 1):
+        allowed[row, row + 1:] = filters.take(np.arange(row + 1, size)).mask(filters, row)
+
+    # Mutual distance between located users, same rule as within_mutual_distance
+    latitudes = np.array([getattr(u, 'latitude', None) for u in users], dtype=np.float64)
+    longitudes = np.array([getattr(u, 'longitude', None) for u in users], dtype=np.float64)
+    located = np.flatnonzero(~np.isnan(latitudes))
+    if len(located):
+        radii = np.array([getattr(users[row], 'max_distance', None) or 0 for row in located], dtype=np.float64)
+        for position, row in enumerate(located[:-1]):
+            later = located[position + 1:]
+            distance = distances_km(latitudes[row], longitudes[row], latitudes[later], longitudes[later])
+            allowed[row, later] &= distance <= np.minimum(radii[position + 1:], radii[position])
+
+    allowed |= allowed.T
+    return scores, allowed
+
+
+def greedy_groups(scores: np.ndarray, allowed: np.ndarray, target_size: int) -> np.ndarray:
+    """
+    Form groups greedily.
+
+    Users whose best allowed partner scores highest seed first; a group
+    grows by the unassigned user adding the most score who is allowed
+    with every member.
+
+    Args:
+        scores: Pairwise score matrix
+        allowed: Pairwise constraint matrix
+        target_size: Members per group
+
+    Returns:
+        Group index per row, -1 for users left unassigned
+    """
+    size = len(scores)
+    group_of = np.full(size, -1, dtype=np.int64)
+    best_partner = np.where(allowed, scores, -np.inf).max(axis=1, initial=-np.inf)
+    group = 0
+
+    for seed in np.argsort(-best_partner, kind='stable'):
+        if group_of[seed] >= 0 or best_partner[seed] == -np.inf:
+            continue
+        members = [seed]
+        open_rows = allowed[seed] & (group_of < 0)
+        gain = scores[seed].copy()
+
+        while len(members) < target_size:
+            candidates = np.flatnonzero(open_rows)
+            if not candidates.size:
+                break
+            best = candidates[np.argmax(gain[candidates])]
+            members.append(best)
+            open_rows &= allowed[best]
+            gain += scores[best]
+
+        if len(members) >= MIN_GROUP_SIZE:
+            group_of[members] = group
+            group += 1
+
+    return group_of
+
+
+def improve_groups(scores: np.ndarray, allowed: np.ndarray, group_of: np.ndarray,
+                   deadline: float, max_swaps: Optional[int] = None) -> int:
+    """
+    Local search: apply the best objective-improving member swap until none is left.
+
+    Args:
+        scores: Pairwise score matrix
+        allowed: Pairwise constraint matrix
+        group_of: Group index per row (-1 unassigned), updated in place
+        deadline: time.monotonic() value to stop at
+        max_swaps: Upper bound on swaps (rows in the cluster if None)
+
+    Returns:
+        Number of swaps applied
+    """
+    assigned = group_of >= 0
+    if not assigned.any():
+        return 0
+
+    group_count = int(group_of.max()) + 1
+    membership = np.zeros((len(scores), group_count), dtype=np.float64)
+    membership[np.flatnonzero(assigned), group_of[assigned]] = 1.0
+    allowed_int = allowed.astype(np.float64)
+
+    # affinity[x, g]: x's total score with group g; fits[x, g]: members of g allowed with x
+    affinity = scores @ membership
+    fits = allowed_int @ membership
+    group_sizes = membership.sum(axis=0)
+    rows = np.arange(len(scores))
+    candidates = assigned[:, None] & assigned[None, :]
+    max_swaps = len(scores) if max_swaps is None else max_swaps
+
+    swaps = 0
+    while swaps < max_swaps and time.monotonic() < deadline:
+        column = np.where(assigned, group_of, 0)
+        to_group = affinity[:, column]  # to_group[x, y] = affinity of x with y's group
+        own = affinity[rows, column]
+
+        # Objective change of swapping a (group g) with b (group h)
+        delta = to_group + to_group.T - 2.0 * scores - own[:, None] - own[None, :]
+
+        # x can take y's place if allowed with everyone else in y's group
+        replaceable = (fits[:, column] - allowed_int - (group_sizes[column] - 1.0)[None, :]) == 0
+        valid = candidates & replaceable & replaceable.T & (group_of[:, None] != group_of[None, :])
+        delta[~valid] = 0.0
+
+        a, b = np.unravel_index(int(np.argmax(delta)), delta.shape)
+        if delta[a, b] <= 0:
+            break
+
+        g, h = group_of[a], group_of[b]
+        affinity[:, g] += scores[:, b] - scores[:, a]
+        affinity[:, h] += scores[:, a] - scores[:, b]
+        fits[:, g] += allowed_int[:, b] - allowed_int[:, a]
+        fits[:, h] += allowed_int[:, a] - allowed_int[:, b]
+        group_of[a], group_of[b] = h, g
+        swaps += 1
+
+    return swaps
+
+
+def _objective(scores: np.ndarray, group_of: np.ndarray) -> float:
+    same_group = (group_of[:, None] == group_of[None, :]) & (group_of[:, None] >= 0)
+    return float(scores[same_group].sum() / 2.0)
+
+
+def optimize_groups(users: Sequence[Any], target_size: Optional[int] = None,
+                    time_budget: Optional[float] = None,
+                    cluster_size: Optional[int] = None) -> Tuple[List[Tuple[List[int], int]], Dict[str, Any]]:
+    """
+    Propose groups for a whole pool.
+
+    Args:
+        users: Objects with id, age, age_preference, deal_breakers,
+            commitment_level and the scoring attributes
+        target_size: Members per group (GROUP_PROPOSAL_TARGET_SIZE if None)
+        time_budget: Seconds for the local-search phase across all clusters
+            (GROUP_OPTIMIZER_TIME_BUDGET_SECONDS if None)
+        cluster_size: Users per cluster (GROUP_OPTIMIZER_CLUSTER_SIZE if None)
+
+    Returns:
+        ([(member user IDs, group score)], stats) where stats has users,
+        clusters, groups, grouped_users, greedy_objective, objective, swaps
+        and seconds
+    """
+    target_size = target_size or settings.GROUP_PROPOSAL_TARGET_SIZE
+    time_budget = settings.GROUP_OPTIMIZER_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    cluster_size = cluster_size or settings.GROUP_OPTIMIZER_CLUSTER_SIZE
+
+    started = time.monotonic()
+    deadline = started + time_budget
+    clusters = cluster_rows(users, cluster_size)
+    groups: List[Tuple[List[int], int]] = []
+    greedy_objective = objective = 0.0
+    swaps = 0
+
+    for position, rows in enumerate(clusters):
+        members = [users[row] for row in rows]
+        scores, allowed = pair_matrices(members)
+        group_of = greedy_groups(scores, allowed, target_size)
+        greedy_objective += _objective(scores, group_of)
+
+        # Each remaining cluster gets an equal share of the remaining budget
+        share = max(0.0, deadline - time.monotonic()) / (len(clusters) - position)
+        swaps += improve_groups(scores, allowed, group_of, time.monotonic() + share)
+        objective += _objective(scores, group_of)
+
+        for group in range(int(group_of.max()) + 1 if len(group_of) else 0):
+            group_rows = np.flatnonzero(group_of == group)
+            group_score = int(scores[np.ix_(group_rows, group_rows)].sum() / 2)
+            groups.append(([members[row].id for row in group_rows], group_score))
+
+    stats = {
+        "users": len(users),
+        "clusters": len(clusters),
+        "groups": len(groups),
+        "grouped_users": sum(len(member_ids) for member_ids, _ in groups),
+        "greedy_objective": greedy_objective,
+        "objective": objective,
+        "swaps": swaps,
+        "seconds": time.monotonic() - started,
+    }
+    return groups, stats
+
+
+def load_optimizer_users(db: Session) -> List[Any]:
+    """
+    Load every verified user not in an active group, with the optimizer's columns.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Rows ordered by user ID
+    """
+    backfill_interest_bits(db)
+
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    return db.query(
+        User.id,
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.deal_breakers,
+        User.commitment_level,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.geohash,
+        User.max_distance,
+    ).filter(
+        User.email_verified == True,
+        ~in_active_group,
+    ).order_by(User.id).all()
+
+
+def write_group_proposals(db: Session, groups: List[Tuple[List[int], int]]) -> str:
+    """
+    Store proposals as a new batch, superseding older pending ones.
+
+    Args:
+        db: Database session
+        groups: (member user IDs, group score) from optimize_groups
+
+    Returns:
+        The new batch ID
+    """
+    batch_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+
+    db.query(GroupProposal).filter(
+        GroupProposal.status == "pending"
+    ).update({GroupProposal.status: "superseded"}, synchronize_session=False)
+
+    proposals = [GroupProposal(batch_id=batch_id, score=score, status="pending") for _, score in groups]
+    db.add_all(proposals)
+    db.flush()
+
+    members = [
+        {"proposal_id": proposal.id, "user_id": user_id}
+        for proposal, (member_ids, _) in zip(proposals, groups)
+        for user_id in member_ids
+    ]
+    if members:
+        db.execute(insert(GroupProposalMember), members)
+    db.commit()
+
+    return batch_id
+
+
+def form_group_proposals(db: Session, target_size: Optional[int] = None,
+                         time_budget: Optional[float] = None, write: bool = True) -> Dict[str, Any]:
+    """
+    Run the optimizer over the eligible pool and store its proposals.
+
+    Args:
+        db: Database session
+        target_size: Members per group (GROUP_PROPOSAL_TARGET_SIZE if None)
+        time_budget: Local-search seconds (GROUP_OPTIMIZER_TIME_BUDGET_SECONDS if None)
+        write: Store the proposals
+
+    Returns:
+        optimize_groups stats, plus batch_id when written
+    """
+    groups, stats = optimize_groups(load_optimizer_users(db), target_size, time_budget)
+    stats["batch_id"] = write_group_proposals(db, groups) if write else None
+    return stats
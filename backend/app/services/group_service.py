@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.models.user import User
 from app.models.group import Group, GroupMember
 from app.models.message import Message
+from app.services.group_matching import remove_group_member
 
 
 def get_user_active_group(db: Session, user_id: int) -> Optional[Group]:
@@ -110,6 +111,8 @@ def leave_group(db: Session, user_id: int, group_id: int) -> bool:
     if not membership:
         return False
 
+    user = db.query(User).filter(User.id == user_id).first()
+    remove_group_member(db, group_id, user)
     membership.status = "left"
     db.commit()
 
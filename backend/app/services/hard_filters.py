@@ -0,0 +1,245 @@
+"""
+Hard-filter index over the preferences users give at onboarding.
+
+Two users can match only if each passes the other's hard constraints
+(matching_service.matches_preferences and violates_deal_breakers, both
+ways):
+
+- Age: each is inside the other's age_preference range
+- Gender: each one's gender (from their pronoun) is in the other's
+  gender_preference, unless that preference is "Any"
+- age_collab_only: if either has it set, both are in the same age group
+- gender_collab_only: if either has it set, both use the same pronoun
+- Deal breakers: neither has a commitment level the other's deal breakers
+  rule out (DEAL_BREAKER_CONFLICTS)
+
+HardFilters turns a set of users into constraint columns: ages with an
+age-sorted order for bisect range lookups, gender buckets, and bitmasks
+for accepted genders and rejected commitment levels. A user's reciprocal
+candidates are found by bisecting their age range, keeping the accepted
+gender buckets and intersecting the remaining bitmasks, before anything
+is scored.
+"""
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Deal breakers another profile can visibly conflict with, mapped to the
+# commitment levels that break them. The rest ("No negativity", ...) are
+# about behaviour and can't be checked from a profile.
+DEAL_BREAKER_CONFLICTS = {
+    'No flakiness': {'Just exploring'},
+    'No ghosting': {'Just exploring'},
+}
+
+# Gender preference options, and the pronouns that place a user in them
+GENDERS = ['male', 'female', 'non-binary', 'other']
+GENDER_OF_PRONOUN = {
+    'he/him': 'male',
+    'she/her': 'female',
+    'they/them': 'non-binary',
+    'other': 'other',
+}
+# Users without a known gender only match people open to "Any"
+UNKNOWN_GENDER = len(GENDERS)
+_ANY_GENDER = (1 << (len(GENDERS) + 1)) - 1
+
+# First age of each age group after 18-24, for age_collab_only
+AGE_GROUP_STARTS = [25, 35, 45, 55, 65]
+
+_CONFLICT_LEVELS = sorted(set().union(*DEAL_BREAKER_CONFLICTS.values()))
+_NO_BOUND = np.iinfo(np.int64)
+
+
+def gender_code(gender: Optional[str]) -> int:
+    """Index into GENDERS for a pronoun, or the unknown code."""
+    gender = GENDER_OF_PRONOUN.get((gender or "").strip().lower())
+    return GENDERS.index(gender) if gender else UNKNOWN_GENDER
+
+
+def accepted_genders(gender_preference: Optional[Sequence[str]]) -> int:
+    """Bitmask of the gender codes a preference accepts."""
+    preference = {g.strip().lower() for g in gender_preference or []}
+    if not preference or 'any' in preference:
+        return _ANY_GENDER
+    return sum(1 << GENDERS.index(g) for g in preference if g in GENDERS)
+
+
+def age_group(age: Optional[int]) -> int:
+    """Age group index (0 = 18-24, 1 = 25-34, ...)."""
+    return bisect_right(AGE_GROUP_STARTS, age or 0)
+
+
+def age_bounds(age_preference: Optional[Dict[str, int]]) -> Tuple[int, int]:
+    """(min, max) ages a preference admits; same defaults as matches_preferences."""
+    if not age_preference:
+        return _NO_BOUND.min, _NO_BOUND.max
+    return age_preference.get('min', 18), age_preference.get('max', 100)
+
+
+def commitment_bit(commitment_level: Optional[str]) -> int:
+    """Bit of a commitment level some deal breaker rules out (0 if none does)."""
+    if commitment_level in _CONFLICT_LEVELS:
+        return 1 << _CONFLICT_LEVELS.index(commitment_level)
+    return 0
+
+
+def rejected_commitments(deal_breakers: Optional[Sequence[str]]) -> int:
+    """Bitmask of the commitment levels a user's deal breakers rule out."""
+    return sum({
+        commitment_bit(level)
+        for deal_breaker in deal_breakers or []
+        for level in DEAL_BREAKER_CONFLICTS.get(deal_breaker, ())
+    })
+
+
+class HardFilters:
+    """
+    Hard-constraint columns for a set of users.
+
+    Built from anything exposing age, age_preference, gender,
+    gender_preference, commitment_level, deal_breakers, age_collab_only
+    and gender_collab_only (ORM users or query rows).
+    """
+
+    COLUMNS = (
+        'ages', 'age_min', 'age_max', 'age_groups', 'genders', 'accepts',
+        'commitments', 'rejects', 'age_collab', 'gender_collab',
+    )
+
+    def __init__(self, users: Sequence[Any]):
+        bounds = [age_bounds(u.age_preference) for u in users]
+        self._set_columns(
+            ages=np.array([u.age or 0 for u in users], dtype=np.int64),
+            age_min=np.array([low for low, _ in bounds], dtype=np.int64),
+            age_max=np.array([high for _, high in bounds], dtype=np.int64),
+            age_groups=np.array([age_group(u.age) for u in users], dtype=np.int64),
+            genders=np.array([gender_code(u.gender) for u in users], dtype=np.int64),
+            accepts=np.array([accepted_genders(u.gender_preference) for u in users], dtype=np.int64),
+            commitments=np.array([commitment_bit(u.commitment_level) for u in users], dtype=np.int64),
+            rejects=np.array([rejected_commitments(u.deal_breakers) for u in users], dtype=np.int64),
+            age_collab=np.array([bool(u.age_collab_only) for u in users], dtype=np.bool_),
+            gender_collab=np.array([bool(u.gender_collab_only) for u in users], dtype=np.bool_),
+        )
+
+    @classmethod
+    def from_arrays(cls, **columns: np.ndarray) -> "HardFilters":
+        """Wrap existing column arrays (e.g. views of shared memory) without copying."""
+        filters = cls.__new__(cls)
+        filters._set_columns(**columns)
+        return filters
+
+    def _set_columns(self, **columns: np.ndarray) -> None:
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.size = len(self.ages)
+        self._by_age: Optional[np.ndarray] = None
+        self._gender_buckets: Optional[List[np.ndarray]] = None
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Columns by name, for sharing across processes."""
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def _build_index(self) -> None:
+        self._by_age = np.argsort(self.ages, kind='stable')
+        genders = self.genders[self._by_age]
+        # Rows of each gender, in age order
+        self._gender_buckets = [self._by_age[genders == code] for code in range(UNKNOWN_GENDER + 1)]
+
+    def index_arrays(self) -> Dict[str, np.ndarray]:
+        """The age order and gender buckets candidates() bisects, for sharing across processes."""
+        if self._by_age is None:
+            self._build_index()
+        lengths = [len(bucket) for bucket in self._gender_buckets]
+        return {
+            "by_age": self._by_age,
+            "gender_rows": np.concatenate(self._gender_buckets),
+            "gender_offsets": np.cumsum([0, *lengths]).astype(np.int64),
+        }
+
+    def set_index(self, by_age: np.ndarray, gender_rows: np.ndarray, gender_offsets: np.ndarray) -> None:
+        """Use a prebuilt index from index_arrays() instead of building one."""
+        self._by_age = by_age
+        self._gender_buckets = [
+            gender_rows[gender_offsets[code]:gender_offsets[code + 1]] for code in range(len(gender_offsets) - 1)
+        ]
+
+    def mask(self, user: "HardFilters", row: int = 0) -> np.ndarray:
+        """
+        Which of these users and the user at ``row`` of ``user`` pass each
+        other's hard constraints.
+
+        Args:
+            user: Filters holding the user
+            row: The user's row in ``user``
+
+        Returns:
+            Boolean mask over these users
+        """
+        age, gender = user.ages[row], user.genders[row]
+        keep = (self.ages >= user.age_min[row]) & (self.ages <= user.age_max[row])
+        keep &= (self.age_min <= age) & (self.age_max >= age)
+        keep &= ((user.accepts[row] >> self.genders) & 1) == 1
+        keep &= ((self.accepts >> gender) & 1) == 1
+        keep &= (self.commitments & user.rejects[row]) == 0
+        keep &= (self.rejects & user.commitments[row]) == 0
+
+        # Collab-only flags bind the pair if either user set them
+        same_group = self.age_groups == user.age_groups[row]
+        keep &= same_group | ~(self.age_collab | user.age_collab[row])
+        same_gender = (self.genders == gender) & (gender != UNKNOWN_GENDER)
+        keep &= same_gender | ~(self.gender_collab | user.gender_collab[row])
+        return keep
+
+    def candidates(self, user: "HardFilters", row: int = 0) -> np.ndarray:
+        """
+        Rows of these users that pass the user's constraints both ways.
+
+        Bisects the user's age range in each accepted gender bucket, then
+        checks the remaining constraints on that subset only.
+
+        Args:
+            user: Filters holding the user
+            row: The user's row in ``user``
+
+        Returns:
+            Row indices, ascending
+        """
+        if self._by_age is None:
+            self._build_index()
+
+        low, high = user.age_min[row], user.age_max[row]
+        accepts = int(user.accepts[row])
+        parts = []
+        for code, bucket in enumerate(self._gender_buckets):
+            if accepts >> code & 1 and len(bucket):
+                ages = self.ages[bucket]
+                start = np.searchsorted(ages, low, side='left')
+                stop = np.searchsorted(ages, high, side='right')
+                parts.append(bucket[start:stop])
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+
+        rows = np.sort(np.concatenate(parts))
+        return rows[self.take(rows).mask(user, row)]
+
+    def take(self, rows: np.ndarray) -> "HardFilters":
+        """Copy of the given rows as filters of their own."""
+        return HardFilters.from_arrays(**{name: getattr(self, name)[rows] for name in self.COLUMNS})
+
+
+def hard_filter_mask(user: Any, candidates: Sequence[Any]) -> np.ndarray:
+    """
+    Which candidates and the user pass each other's hard constraints.
+
+    Args:
+        user: Object with the HardFilters attributes
+        candidates: Objects with the HardFilters attributes
+
+    Returns:
+        Boolean mask over candidates
+    """
+    if not len(candidates):
+        return np.zeros(0, dtype=np.bool_)
+    return HardFilters(candidates).mask(HardFilters([user]))
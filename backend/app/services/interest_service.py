@@ -0,0 +1,126 @@
+"""
+Interned interest vocabulary and packed interest bitsets.
+
+Every interest string gets a small integer ID from the interest_vocabulary
+table. A user's interests are stored alongside the profile as a packed
+little-endian bitset (User.interest_bits), padded to whole 64-bit words, so
+interest overlap is a popcount over AND/OR instead of building Python sets.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.interest import Interest
+from app.models.user import User
+
+# In-process copy of the vocabulary; IDs never change once assigned
+_vocabulary: Dict[str, int] = {}
+_vocabulary_lock = threading.Lock()
+
+
+def _load_vocabulary(db: Session) -> None:
+    for interest in db.query(Interest).all():
+        _vocabulary[interest.name] = interest.id
+
+
+def clear_vocabulary_cache() -> None:
+    """Forget the in-process vocabulary (after the table is recreated)."""
+    with _vocabulary_lock:
+        _vocabulary.clear()
+
+
+def get_interest_ids(db: Session, names: Iterable[str]) -> List[int]:
+    """
+    Look up interest IDs, adding unknown interests to the vocabulary.
+
+    New names are inserted in their own session so the caller's pending
+    changes are not committed or rolled back with them.
+
+    Args:
+        db: Database session
+        names: Interest strings
+
+    Returns:
+        Sorted distinct interest IDs
+    """
+    names = set(names or [])
+
+    with _vocabulary_lock:
+        missing = names - _vocabulary.keys()
+        if missing:
+            _load_vocabulary(db)
+            missing = names - _vocabulary.keys()
+
+        if missing:
+            vocab_db = Session(bind=db.get_bind())
+            try:
+                vocab_db.add_all([Interest(name=name) for name in sorted(missing)])
+                vocab_db.commit()
+            except IntegrityError:
+                # Another process added some of them first
+                vocab_db.rollback()
+                for name in sorted(missing):
+                    vocab_db.add(Interest(name=name))
+                    try:
+                        vocab_db.commit()
+                    except IntegrityError:
+                        vocab_db.rollback()
+            finally:
+                _load_vocabulary(vocab_db)
+                vocab_db.close()
+
+        return sorted(_vocabulary[name] for name in names)
+
+
+def encode_interest_bits(interest_ids: Iterable[int]) -> bytes:
+    """
+    Pack interest IDs into a little-endian bitset padded to 64-bit words.
+
+    Args:
+        interest_ids: Interest IDs (bit positions)
+
+    Returns:
+        Packed bitset; empty bytes for no interests
+    """
+    value = 0
+    for interest_id in interest_ids:
+        value |= 1 << interest_id
+
+    word_count = (value.bit_length() + 63) // 64
+    return value.to_bytes(word_count * 8, 'little')
+
+
+def sync_interest_bits(db: Session, user: User) -> None:
+    """
+    Recompute user.interest_bits from user.interests.
+
+    Does not commit; call before the commit that saves the interests.
+
+    Args:
+        db: Database session
+        user: User whose bitset to update
+    """
+    user.interest_bits = encode_interest_bits(get_interest_ids(db, user.interests))
+
+
+def backfill_interest_bits(db: Session, user_ids: Optional[List[int]] = None) -> int:
+    """
+    Fill in interest_bits for users that don't have one yet.
+
+    Args:
+        db: Database session
+        user_ids: Restrict to these users (all users if None)
+
+    Returns:
+        Number of users updated
+    """
+    query = db.query(User).filter(User.interest_bits == None)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+
+    users = query.all()
+    for user in users:
+        sync_interest_bits(db, user)
+    db.commit()
+
+    return len(users)
@@ -0,0 +1,495 @@
+"""
+Real-time matchmaking for users waiting in the lobby.
+
+Users on the matching screen enter the lobby and poll it. Each entry is
+placed in a priority bucket by cohort (cohort_service) and score band
+(the user's best achievable score, in bands of LOBBY_SCORE_BAND_WIDTH),
+so people with similar prospects in the same market are paired first.
+
+A scheduler pairs waiting users every LOBBY_TICK_SECONDS. Each pass:
+
+1. Drops entries not polled for LOBBY_IDLE_SECONDS and users who are no
+   longer eligible, and returns users with proposals unanswered for
+   LOBBY_PROPOSAL_SECONDS to the queue.
+2. Pairs within each bucket, then lets users who have waited longer than
+   LOBBY_WIDEN_SECONDS pair across score bands in their cohort, and
+   users who have waited twice as long pair across cohorts. Within a
+   scope, the longest-waiting user is paired first, with their best
+   partner still free.
+3. A pair must score at least LOBBY_MIN_SCORE and pass each other's hard
+   filters and mutual distance. Pairs with a pending request or a recent
+   proposal, or in each other's exclusion sets, are skipped.
+
+The queue lives in the database, so every worker process serves the same
+lobby. Each process runs the scheduler; a proposal claims both entries
+with a conditional UPDATE, so a user is never proposed twice.
+
+A proposal is shown to both users as a match card. Sending a match
+request to the partner closes it, and passing returns both to the queue
+with their original place (and excludes the pair, see exclusion_sets).
+
+Counters (lobby.entered / left / timeouts / proposals / passes /
+expired / ticks) are reported through app.core.metrics. stats() reports
+queue length per bucket and recent wait times.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import exists, or_, update
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.group import GroupMember
+from app.models.match import LobbyEntry, LobbyProposal, MatchRequest
+from app.models.user import User
+from app.services.exclusion_sets import ExclusionSet, load_exclusion_sets
+from app.services.geo_service import distances_km
+from app.services.hard_filters import HardFilters
+from app.services.pair_scores import pair_key
+from app.services.scoring_engine import CandidatePool, compatibility_scores
+
+WAITING = "waiting"
+PROPOSED = "proposed"
+
+# A pair that was proposed and not taken up isn't proposed again for this long
+REPROPOSE_AFTER = timedelta(hours=1)
+
+# Waits of recently paired users, for stats()
+_recent_waits: Deque[float] = deque(maxlen=1000)
+_recent_lock = threading.Lock()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(moment: datetime) -> datetime:
+    """SQLite hands back naive datetimes; they are stored in UTC."""
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def score_band(best_score: Optional[int]) -> int:
+    """Band of a user's best achievable score (-1 if they have no candidates)."""
+    if best_score is None:
+        return -1
+    return int(best_score) // settings.LOBBY_SCORE_BAND_WIDTH
+
+
+def enter_lobby(db: Session, user: User) -> LobbyEntry:
+    """
+    Put a user in the lobby, or keep them there if they already are.
+
+    Args:
+        db: Database session
+        user: User entering
+
+    Returns:
+        The user's entry
+    """
+    entry = db.query(LobbyEntry).filter(LobbyEntry.user_id == user.id).first()
+    now = _now()
+    if entry is None:
+        # Imported here: matching_service is heavy and only needed on entry
+        from app.services.match_candidates_service import get_stored_matches
+        from app.services.matching_service import rank_potential_matches
+
+        stored = get_stored_matches(db, user.id, 1)
+        if stored is not None:
+            best = stored[0]["compatibility_score"] if stored else None
+        else:
+            ranked = rank_potential_matches(db, user, 1)
+            best = ranked[0][1] if ranked else None
+
+        entry = LobbyEntry(
+            user_id=user.id,
+            cohort=user.cohort,
+            score_band=score_band(best),
+            status=WAITING,
+            entered_at=now,
+        )
+        db.add(entry)
+        metrics.incr("lobby.entered")
+    entry.last_seen_at = now
+    db.commit()
+    return entry
+
+
+def leave_lobby(db: Session, user_ids: List[int]) -> int:
+    """
+    Take users out of the lobby.
+
+    Args:
+        db: Database session
+        user_ids: Users leaving
+
+    Returns:
+        Number of entries removed
+    """
+    removed = db.query(LobbyEntry).filter(
+        LobbyEntry.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+    metrics.incr("lobby.left", removed)
+    return removed
+
+
+def lobby_status(db: Session, user: User) -> Dict[str, Any]:
+    """
+    A user's place in the lobby; counts as a poll.
+
+    Args:
+        db: Database session
+        user: Polling user
+
+    Returns:
+        Dictionary with status ('waiting', 'proposed' or 'none'),
+        waiting_seconds, queue_length and proposal (proposal_id,
+        partner_id, compatibility_score, created_at) if proposed
+    """
+    entry = db.query(LobbyEntry).filter(LobbyEntry.user_id == user.id).first()
+    if entry is None:
+        return {"status": "none", "waiting_seconds": None, "queue_length": None, "proposal": None}
+
+    now = _now()
+    entry.last_seen_at = now
+    db.commit()
+
+    proposal = None
+    if entry.status == PROPOSED and entry.proposal_id is not None:
+        row = db.query(LobbyProposal).filter(LobbyProposal.id == entry.proposal_id).first()
+        if row is not None:
+            proposal = {
+                "proposal_id": row.id,
+                "partner_id": row.user_high_id if row.user_low_id == user.id else row.user_low_id,
+                "compatibility_score": row.compatibility_score,
+                "created_at": row.created_at,
+            }
+
+    return {
+        "status": entry.status,
+        "waiting_seconds": (now - _aware(entry.entered_at)).total_seconds(),
+        "queue_length": db.query(LobbyEntry).filter(
+            LobbyEntry.status == WAITING,
+            LobbyEntry.cohort == entry.cohort,
+        ).count(),
+        "proposal": proposal,
+    }
+
+
+def _release(db: Session, proposal: LobbyProposal, status: str) -> None:
+    """Close a proposal and put its users back in the queue."""
+    proposal.status = status
+    db.execute(update(LobbyEntry).where(
+        LobbyEntry.proposal_id == proposal.id
+    ).values(status=WAITING, proposal_id=None))
+
+
+def pass_proposal(db: Session, user_id: int, proposal_id: int) -> Optional[LobbyProposal]:
+    """
+    Turn down a proposal; both users wait again, keeping their place.
+
+    Args:
+        db: Database session
+        user_id: User passing
+        proposal_id: Proposal shown to them
+
+    Returns:
+        The passed proposal, or None if the user has no such pending proposal
+    """
+    proposal = db.query(LobbyProposal).filter(
+        LobbyProposal.id == proposal_id,
+        LobbyProposal.status == "pending",
+        or_(LobbyProposal.user_low_id == user_id, LobbyProposal.user_high_id == user_id),
+    ).first()
+    if proposal is None:
+        return None
+
+    _release(db, proposal, "passed")
+    db.commit()
+    metrics.incr("lobby.passes")
+    return proposal
+
+
+def pair_requested(db: Session, from_user_id: int, to_user_id: int) -> None:
+    """
+    A match request was sent: close any proposal of the pair and take both
+    users out of the lobby.
+    """
+    low, high = pair_key(from_user_id, to_user_id)
+    db.query(LobbyProposal).filter(
+        LobbyProposal.user_low_id == low,
+        LobbyProposal.user_high_id == high,
+        LobbyProposal.status == "pending",
+    ).update({"status": "requested"}, synchronize_session=False)
+    db.commit()
+    leave_lobby(db, [from_user_id, to_user_id])
+
+
+def _expire(db: Session, now: datetime) -> None:
+    """Drop idle entries and release proposals nobody answered."""
+    timeouts = db.query(LobbyEntry).filter(
+        LobbyEntry.last_seen_at < now - timedelta(seconds=settings.LOBBY_IDLE_SECONDS)
+    ).delete(synchronize_session=False)
+    metrics.incr("lobby.timeouts", timeouts)
+
+    stale = db.query(LobbyProposal).filter(
+        LobbyProposal.status == "pending",
+        LobbyProposal.created_at < now - timedelta(seconds=settings.LOBBY_PROPOSAL_SECONDS),
+    ).all()
+    for proposal in stale:
+        _release(db, proposal, "expired")
+    metrics.incr("lobby.expired", len(stale))
+    db.commit()
+
+
+def _load_waiting(db: Session) -> List[Any]:
+    """Waiting entries with the features pairing needs, longest wait first."""
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    rows = db.query(
+        LobbyEntry.user_id.label("id"),
+        LobbyEntry.cohort,
+        LobbyEntry.score_band,
+        LobbyEntry.entered_at,
+        User.email_verified,
+        in_active_group.label("in_group"),
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+    ).join(User, User.id == LobbyEntry.user_id).filter(
+        LobbyEntry.status == WAITING
+    ).order_by(LobbyEntry.entered_at, LobbyEntry.user_id).all()
+
+    ineligible = [row.id for row in rows if not row.email_verified or row.in_group]
+    if ineligible:
+        leave_lobby(db, ineligible)
+    return [row for row in rows if row.email_verified and not row.in_group]
+
+
+def _blocked_pairs(db: Session, user_ids: List[int], now: datetime) -> Set[Tuple[int, int]]:
+    """Pairs with a pending request or a recent proposal, as (low, high)."""
+    if not user_ids:
+        return set()
+    requests = db.query(MatchRequest.from_user_id, MatchRequest.to_user_id).filter(
+        MatchRequest.status == "pending",
+        MatchRequest.from_user_id.in_(user_ids),
+        MatchRequest.to_user_id.in_(user_ids),
+    ).all()
+    proposals = db.query(LobbyProposal.user_low_id, LobbyProposal.user_high_id).filter(
+        LobbyProposal.created_at >= now - REPROPOSE_AFTER,
+        LobbyProposal.user_low_id.in_(user_ids),
+        LobbyProposal.user_high_id.in_(user_ids),
+    ).all()
+    return {pair_key(a, b) for a, b in requests} | {(low, high) for low, high in proposals}
+
+
+class _Pairing:
+    """One scheduler pass over the waiting users."""
+
+    def __init__(self, rows: List[Any], blocked: Set[Tuple[int, int]], exclusions: Dict[int, ExclusionSet],
+                 now: datetime):
+        self.rows = rows
+        self.user_ids = np.array([r.id for r in rows], dtype=np.int64)
+        # Exclusion is symmetric, so the seeker's own set is enough
+        self.exclusions = {row: exclusions[r.id] for row, r in enumerate(rows) if r.id in exclusions}
+        # Rows each row mustn't be paired with
+        row_of = {r.id: row for row, r in enumerate(rows)}
+        partners: Dict[int, List[int]] = defaultdict(list)
+        for low, high in blocked:
+            if low in row_of and high in row_of:
+                partners[row_of[low]].append(row_of[high])
+                partners[row_of[high]].append(row_of[low])
+        self.blocked = {row: np.array(others, dtype=np.int64) for row, others in partners.items()}
+        self.pool = CandidatePool(rows)
+        self.filters = HardFilters(rows)
+        self.latitudes = np.array([r.latitude if r.latitude is not None else np.nan for r in rows], dtype=np.float64)
+        self.longitudes = np.array([r.longitude if r.longitude is not None else np.nan for r in rows], dtype=np.float64)
+        self.radii = np.array([r.max_distance or 0 for r in rows], dtype=np.float64)
+        self.waited = np.array([(now - _aware(r.entered_at)).total_seconds() for r in rows], dtype=np.float64)
+        self.free = np.ones(len(rows), dtype=np.bool_)
+        self.pairs: List[Tuple[int, int, int]] = []
+
+    def pair_scope(self, members: np.ndarray, seekers: np.ndarray) -> None:
+        """
+        Pair seekers, longest wait first, with their best free partner in scope.
+
+        Args:
+            members: Rows in scope (ascending = longest wait first)
+            seekers: Rows allowed to start a pairing
+        """
+        for row in seekers.tolist():
+            if not self.free[row]:
+                continue
+            columns = members[self.free[members] & (members != row)]
+            if not len(columns):
+                continue
+
+            allowed = self.filters.take(columns).mask(self.filters, row)
+            if not np.isnan(self.latitudes[row]):
+                distance = distances_km(self.latitudes[row], self.longitudes[row],
+                                        self.latitudes[columns], self.longitudes[columns])
+                allowed &= np.isnan(distance) | (distance <= np.minimum(self.radii[columns], self.radii[row]))
+            if row in self.blocked:
+                allowed &= ~np.isin(columns, self.blocked[row])
+            if row in self.exclusions:
+                allowed &= ~self.exclusions[row].contains(self.user_ids[columns])
+            columns = columns[allowed]
+            if not len(columns):
+                continue
+
+            scores = compatibility_scores(self.rows[row], self.pool.take(columns))
+            # Best score first, then whoever has waited longest
+            best = int(np.argmax(scores))
+            if scores[best] < settings.LOBBY_MIN_SCORE:
+                continue
+            partner = int(columns[best])
+            self.free[row] = self.free[partner] = False
+            self.pairs.append((row, partner, int(scores[best])))
+
+
+def schedule_pairs(db: Session) -> Dict[str, Any]:
+    """
+    Run one scheduler pass: expire, pair and write proposals.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Dictionary with waiting, proposals and seconds
+    """
+    started = time.perf_counter()
+    now = _now()
+    _expire(db, now)
+    rows = _load_waiting(db)
+    user_ids = [r.id for r in rows]
+    pairing = _Pairing(rows, _blocked_pairs(db, user_ids, now), load_exclusion_sets(db, user_ids), now)
+
+    all_rows = np.arange(len(rows))
+    cohorts: Dict[Optional[str], List[int]] = defaultdict(list)
+    buckets: Dict[Tuple[Optional[str], int], List[int]] = defaultdict(list)
+    for row, entry in enumerate(rows):
+        cohorts[entry.cohort].append(row)
+        buckets[(entry.cohort, entry.score_band)].append(row)
+
+    # Buckets in order of their longest wait (rows are sorted by wait)
+    for members in buckets.values():
+        members = np.array(members, dtype=np.int64)
+        pairing.pair_scope(members, members)
+    widen = settings.LOBBY_WIDEN_SECONDS
+    for members in cohorts.values():
+        members = np.array(members, dtype=np.int64)
+        pairing.pair_scope(members, members[pairing.waited[members] >= widen])
+    pairing.pair_scope(all_rows, all_rows[pairing.waited >= 2 * widen])
+
+    proposals = 0
+    for row, partner, score in pairing.pairs:
+        low, high = pair_key(rows[row].id, rows[partner].id)
+        try:
+            with db.begin_nested() as savepoint:
+                proposal = LobbyProposal(user_low_id=low, user_high_id=high, compatibility_score=score,
+                                         status="pending", created_at=now)
+                db.add(proposal)
+                db.flush()
+                # Claim both entries; another process may have paired one of them
+                claimed = db.execute(update(LobbyEntry).where(
+                    LobbyEntry.user_id.in_([low, high]),
+                    LobbyEntry.status == WAITING,
+                ).values(status=PROPOSED, proposal_id=proposal.id)).rowcount
+                if claimed != 2:
+                    savepoint.rollback()
+                    continue
+        except Exception as e:
+            print(f"[WARN] Failed to propose lobby pair {low}-{high}: {e}")
+            continue
+        proposals += 1
+        with _recent_lock:
+            _recent_waits.extend([pairing.waited[row], pairing.waited[partner]])
+    db.commit()
+
+    metrics.incr("lobby.ticks")
+    metrics.incr("lobby.proposals", proposals)
+    return {"waiting": len(rows), "proposals": proposals, "seconds": time.perf_counter() - started}
+
+
+def stats(db: Session) -> Dict[str, Any]:
+    """
+    Queue length and wait times, for tuning.
+
+    Returns:
+        Dictionary with waiting, proposed, buckets (cohort:band -> waiting),
+        oldest_wait_seconds and wait percentiles of recently paired users
+    """
+    now = _now()
+    entries = db.query(LobbyEntry.cohort, LobbyEntry.score_band, LobbyEntry.status, LobbyEntry.entered_at).all()
+    waiting = [e for e in entries if e.status == WAITING]
+    buckets: Dict[str, int] = defaultdict(int)
+    for entry in waiting:
+        buckets[f"{entry.cohort}:{entry.score_band}"] += 1
+
+    with _recent_lock:
+        waits = np.array(_recent_waits, dtype=np.float64)
+    return {
+        "waiting": len(waiting),
+        "proposed": len(entries) - len(waiting),
+        "buckets": dict(buckets),
+        "oldest_wait_seconds": max([(now - _aware(e.entered_at)).total_seconds() for e in waiting], default=0.0),
+        "paired_wait_p50_seconds": float(np.percentile(waits, 50)) if len(waits) else None,
+        "paired_wait_p90_seconds": float(np.percentile(waits, 90)) if len(waits) else None,
+    }
+
+
+class LobbyScheduler:
+    """Background thread running schedule_pairs every LOBBY_TICK_SECONDS."""
+
+    def __init__(self, session_factory: Callable = SessionLocal):
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the scheduler thread (no-op if already running)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lobby-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the scheduler thread to finish and wait for it."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.LOBBY_TICK_SECONDS):
+            db = self.session_factory()
+            try:
+                schedule_pairs(db)
+            except Exception as e:
+                db.rollback()
+                print(f"[ERROR] Lobby scheduler pass failed: {e}")
+            finally:
+                db.close()
+
+
+lobby_scheduler = LobbyScheduler()
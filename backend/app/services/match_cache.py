@@ -0,0 +1,219 @@
+"""
+Per-user cache of ranked match results.
+
+Bounded LRU with a TTL, kept in process. When MATCH_CACHE_REDIS_URL is set
+(and the redis package is installed) entries live in Redis only, with no
+local copy, so every worker process sees the same results and an
+invalidation in one process is seen by all of them. If Redis can't be
+reached, reads miss until it is back.
+
+Invalidation is precise: each entry remembers which candidates it shows,
+so a change to one candidate only drops the entries that display them.
+
+Entries are partitioned by the owner's cohort shard, each with its own LRU
+bound (MATCH_CACHE_MAX_ENTRIES_PER_SHARD), so a busy shard can't evict
+every other shard's entries.
+
+Counters (match_cache.hits / misses / evictions / invalidations) are
+reported through app.core.metrics.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from app.core import metrics
+from app.core.config import settings
+
+
+class _RedisBackend:
+    """Shared cache backend; keys expire on their own via Redis TTLs."""
+
+    def __init__(self, url: str, ttl_seconds: int):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl_seconds
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(f"match_cache:user:{user_id}")
+        return json.loads(raw) if raw else None
+
+    def set(self, user_id: int, entry: Dict[str, Any], candidate_ids: Iterable[int]) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(f"match_cache:user:{user_id}", json.dumps(entry, default=str), ex=self.ttl)
+        for candidate_id in candidate_ids:
+            pipe.sadd(f"match_cache:owners:{candidate_id}", user_id)
+            pipe.expire(f"match_cache:owners:{candidate_id}", self.ttl)
+        pipe.execute()
+
+    def delete_users(self, user_ids: Iterable[int]) -> int:
+        keys = [f"match_cache:user:{user_id}" for user_id in user_ids]
+        return self.client.delete(*keys) if keys else 0
+
+    def owners_of(self, candidate_ids: Iterable[int]) -> Set[int]:
+        owners: Set[int] = set()
+        for candidate_id in candidate_ids:
+            owners.update(int(o) for o in self.client.smembers(f"match_cache:owners:{candidate_id}"))
+        return owners
+
+
+class MatchCache:
+    """LRU + TTL cache of each user's ranked matches."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, redis_url: Optional[str] = None,
+                 max_entries_per_shard: Optional[int] = None, shared_backend: Optional[Any] = None):
+        """
+        Args:
+            max_entries: Local entries kept, across shards
+            ttl_seconds: How long an entry is served
+            redis_url: Share entries through this Redis server
+            max_entries_per_shard: Local entries kept per cohort shard (max_entries if None)
+            shared_backend: Share entries through this backend instead of
+                Redis (same methods as _RedisBackend)
+        """
+        self.max_entries = max_entries
+        self.max_entries_per_shard = max_entries_per_shard or max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # user ID -> (expires at, limit, matches, shard)
+        self._entries: "OrderedDict[int, Tuple[float, int, List[Dict[str, Any]], Optional[str]]]" = OrderedDict()
+        # shard -> its users, least recently used first
+        self._shards: "Dict[Optional[str], OrderedDict[int, None]]" = {}
+        # candidate ID -> users whose cached matches show them
+        self._owners: Dict[int, Set[int]] = {}
+        self._shared = shared_backend
+
+        if redis_url and shared_backend is None:
+            try:
+                self._shared = _RedisBackend(redis_url, ttl_seconds)
+            except ImportError:
+                print("[WARN] MATCH_CACHE_REDIS_URL is set but redis is not installed - using in-process cache only")
+
+    def get(self, user_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Cached matches for a user, or None on a miss.
+
+        Args:
+            user_id: User the matches were ranked for
+            limit: Number of matches the caller wants
+
+        Returns:
+            Cached match dictionaries, or None
+        """
+        if self._shared:
+            # No local copy: another process may have invalidated the entry
+            shared = self._shared_call(self._shared.get, user_id)
+            if shared and shared["limit"] == limit:
+                metrics.incr("match_cache.hits")
+                return shared["matches"]
+            metrics.incr("match_cache.misses")
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] <= time.monotonic():
+                self._drop(user_id)
+            elif entry and entry[1] == limit:
+                self._entries.move_to_end(user_id)
+                self._shards[entry[3]].move_to_end(user_id)
+                metrics.incr("match_cache.hits")
+                return entry[2]
+
+        metrics.incr("match_cache.misses")
+        return None
+
+    def set(self, user_id: int, limit: int, matches: List[Dict[str, Any]], shard: Optional[str] = None) -> None:
+        """Cache a user's ranked matches, in the partition of their cohort shard."""
+        if self._shared:
+            entry = {"limit": limit, "matches": matches, "shard": shard}
+            self._shared_call(self._shared.set, user_id, entry, [m["user_id"] for m in matches])
+            return
+        self._store_local(user_id, limit, matches, shard)
+
+    def invalidate_users(self, user_ids: Iterable[int]) -> None:
+        """Drop the cached matches of these users."""
+        user_ids = set(user_ids)
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in self._entries:
+                    self._drop(user_id)
+                    metrics.incr("match_cache.invalidations")
+        if self._shared:
+            metrics.incr("match_cache.invalidations", self._shared_call(self._shared.delete_users, user_ids) or 0)
+
+    def invalidate_candidates(self, candidate_ids: Iterable[int]) -> None:
+        """Drop every cached result that shows one of these candidates."""
+        candidate_ids = set(candidate_ids)
+        with self._lock:
+            owners = set().union(*(self._owners.get(c, set()) for c in candidate_ids))
+        if self._shared:
+            owners |= self._shared_call(self._shared.owners_of, candidate_ids) or set()
+        self.invalidate_users(owners)
+
+    def clear(self) -> None:
+        """Drop every local entry."""
+        with self._lock:
+            self._entries.clear()
+            self._shards.clear()
+            self._owners.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Current size and configured bounds."""
+        with self._lock:
+            return {
+                "shared": self._shared is not None,
+                "size": len(self._entries),
+                "shards": len(self._shards),
+                "max_entries": self.max_entries,
+                "max_entries_per_shard": self.max_entries_per_shard,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+    @staticmethod
+    def _shared_call(method, *args):
+        # The shared backend is best effort; the local cache still works without it
+        try:
+            return method(*args)
+        except Exception as e:
+            print(f"[WARN] Shared match cache unavailable: {e}")
+            return None
+
+    def _store_local(self, user_id: int, limit: int, matches: List[Dict[str, Any]], shard: Optional[str]) -> None:
+        with self._lock:
+            if user_id in self._entries:
+                self._drop(user_id)
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, limit, matches, shard)
+            shard_entries = self._shards.setdefault(shard, OrderedDict())
+            shard_entries[user_id] = None
+            for match in matches:
+                self._owners.setdefault(match["user_id"], set()).add(user_id)
+
+            while len(shard_entries) > self.max_entries_per_shard:
+                self._drop(next(iter(shard_entries)))
+                metrics.incr("match_cache.evictions")
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                metrics.incr("match_cache.evictions")
+
+    def _drop(self, user_id: int) -> None:
+        # Caller holds the lock
+        _, _, matches, shard = self._entries.pop(user_id)
+        shard_entries = self._shards[shard]
+        del shard_entries[user_id]
+        if not shard_entries:
+            del self._shards[shard]
+        for match in matches:
+            owners = self._owners.get(match["user_id"])
+            if owners:
+                owners.discard(user_id)
+                if not owners:
+                    del self._owners[match["user_id"]]
+
+
+match_cache = MatchCache(
+    max_entries=settings.MATCH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.MATCH_CACHE_TTL_SECONDS,
+    redis_url=settings.MATCH_CACHE_REDIS_URL,
+    max_entries_per_shard=settings.MATCH_CACHE_MAX_ENTRIES_PER_SHARD,
+)
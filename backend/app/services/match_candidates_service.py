@@ -0,0 +1,211 @@
+"""
+Precomputed top-K match lists.
+
+Each eligible user's ranked candidates are stored in user_match_candidates
+by the match candidate worker. GET /api/matches reads them with a single
+indexed query and falls back to live scoring when the list is missing or
+older than MATCH_CANDIDATES_MAX_AGE_MINUTES.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Iterable
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.user import User
+from app.models.group import GroupMember
+from app.models.match import UserMatchCandidate
+from app.services.matching_service import (
+    rank_potential_matches,
+    is_user_in_active_group,
+    build_match_entry,
+    pending_request_partners,
+    still_eligible,
+)
+from app.services.exclusion_sets import load_exclusions
+
+
+def freshness_cutoff() -> datetime:
+    """Oldest computed_at that still counts as fresh."""
+    return datetime.now(timezone.utc) - timedelta(minutes=settings.MATCH_CANDIDATES_MAX_AGE_MINUTES)
+
+
+def rebuild_match_candidates(db: Session, user_id: int) -> int:
+    """
+    Recompute and store a user's top-K ranked candidates.
+
+    Users who can't match right now (unverified, in a group, or deleted)
+    simply have their list cleared.
+
+    Args:
+        db: Database session
+        user_id: User whose list to rebuild
+
+    Returns:
+        Number of candidates stored
+    """
+    db.query(UserMatchCandidate).filter(
+        UserMatchCandidate.user_id == user_id
+    ).delete(synchronize_session=False)
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user or not user.email_verified or is_user_in_active_group(db, user_id):
+        db.commit()
+        return 0
+
+    ranked = rank_potential_matches(db, user, settings.MATCH_CANDIDATES_TOP_K)
+    computed_at = datetime.now(timezone.utc)
+
+    db.add_all([
+        UserMatchCandidate(
+            user_id=user_id,
+            candidate_id=candidate_id,
+            rank=rank,
+            compatibility_score=compatibility,
+            computed_at=computed_at,
+        )
+        for rank, (candidate_id, compatibility) in enumerate(ranked)
+    ])
+    db.commit()
+
+    return len(ranked)
+
+
+def get_stored_matches(db: Session, user_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Read a user's stored ranking joined with the candidates' profiles.
+
+    Args:
+        db: Database session
+        user_id: User to read matches for
+        limit: Maximum number of matches to return
+
+    Returns:
+        List of match dictionaries, or None if the list is missing or stale
+    """
+    rows = db.query(UserMatchCandidate.compatibility_score, User).join(
+        User, User.id == UserMatchCandidate.candidate_id
+    ).filter(
+        UserMatchCandidate.user_id == user_id,
+        UserMatchCandidate.computed_at >= freshness_cutoff()
+    ).order_by(UserMatchCandidate.rank).limit(limit).all()
+
+    if not rows:
+        return None
+
+    return [build_match_entry(candidate, compatibility) for compatibility, candidate in rows]
+
+
+def get_provisional_matches(db: Session, user_id: int, limit: int) -> List[Dict[str, Any]]:
+    """
+    Read a user's stored ranking whatever its age, for a first answer.
+
+    A stale list is ranked against old profiles, but its candidates are
+    checked against who can match right now: anyone who has since joined a
+    group, been turned down or got a pending request with the user is
+    skipped. The streaming matches endpoint shows these while the live
+    ranking runs.
+
+    Args:
+        db: Database session
+        user_id: User to read matches for
+        limit: Maximum number of matches to return
+
+    Returns:
+        List of match dictionaries (empty if the user has no stored list)
+    """
+    rows = db.query(UserMatchCandidate.compatibility_score, User).join(
+        User, User.id == UserMatchCandidate.candidate_id
+    ).filter(
+        UserMatchCandidate.user_id == user_id
+    ).order_by(UserMatchCandidate.rank).limit(limit * settings.MATCH_STREAM_PROVISIONAL_SCAN_FACTOR).all()
+
+    if not rows:
+        return []
+
+    eligible = still_eligible(db, [candidate.id for _, candidate in rows])
+    eligible.difference_update(pending_request_partners(db, user_id))
+    exclusions = load_exclusions(db, user_id)
+
+    matches = []
+    for compatibility, candidate in rows:
+        if candidate.id in eligible and candidate.id not in exclusions:
+            matches.append(build_match_entry(candidate, compatibility))
+            if len(matches) == limit:
+                break
+    return matches
+
+
+def invalidate_match_candidates(db: Session, user_ids: Iterable[int]) -> None:
+    """
+    Drop the stored lists of the given users.
+
+    Reads fall back to live scoring until the worker rebuilds them.
+
+    Args:
+        db: Database session
+        user_ids: Owners of the lists to drop
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    db.query(UserMatchCandidate).filter(
+        UserMatchCandidate.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def get_list_owners(db: Session, candidate_ids: Iterable[int],
+                    owner_ids: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Find the users whose stored lists include any of the given candidates.
+
+    Args:
+        db: Database session
+        candidate_ids: Candidate user IDs
+        owner_ids: Only consider these owners (all owners if None)
+
+    Returns:
+        Distinct owner user IDs
+    """
+    candidate_ids = list(candidate_ids)
+    if not candidate_ids:
+        return []
+
+    query = db.query(UserMatchCandidate.user_id).filter(
+        UserMatchCandidate.candidate_id.in_(candidate_ids)
+    )
+    if owner_ids is not None:
+        query = query.filter(UserMatchCandidate.user_id.in_(list(owner_ids)))
+
+    rows = query.distinct().all()
+
+    return [row.user_id for row in rows]
+
+
+def get_users_needing_refresh(db: Session) -> List[int]:
+    """
+    Find eligible users whose stored list is missing or stale.
+
+    Args:
+        db: Database session
+
+    Returns:
+        User IDs to rebuild
+    """
+    in_active_group = db.query(GroupMember.user_id).filter(GroupMember.status == "active")
+
+    newest = db.query(
+        UserMatchCandidate.user_id,
+        func.max(UserMatchCandidate.computed_at).label("computed_at")
+    ).group_by(UserMatchCandidate.user_id).subquery()
+
+    rows = db.query(User.id).outerjoin(
+        newest, newest.c.user_id == User.id
+    ).filter(
+        User.email_verified == True,
+        ~User.id.in_(in_active_group),
+        (newest.c.computed_at == None) | (newest.c.computed_at < freshness_cutoff())
+    ).all()
+
+    return [row.id for row in rows]
@@ -0,0 +1,99 @@
+"""
+Matching events.
+
+Endpoints call these after committing a change that can affect who
+matches with whom. The changed users' own lists and paged ranking
+snapshots are dropped and the lists queued for a rebuild. Other users'
+lists are patched incrementally: users leaving the pool are popped from
+them right away, users (re-)entering it are pushed into them by the match
+worker (see topk_maintenance). Cached results, the candidate index and
+this process's eligibility bitmap are refreshed to match, and the shared
+feature snapshot is marked for republishing. Users who join a group or
+send a request leave the lobby, and pairs who turn each other down are
+added to their exclusion sets.
+"""
+from typing import Iterable, List, Tuple
+from sqlalchemy.orm import Session
+from app.services.candidate_index import refresh_indexed_users
+from app.services.eligibility import eligibility
+from app.services.exclusion_sets import exclude_pair
+from app.services.feature_snapshot import feature_snapshots
+from app.services.lobby_service import leave_lobby, pair_requested
+from app.services.match_cache import match_cache
+from app.services.match_candidates_service import invalidate_match_candidates
+from app.services.match_snapshots import match_snapshots
+from app.services.match_worker import match_worker
+from app.services.topk_maintenance import pop_candidates
+
+
+def _refresh(db: Session, user_ids: Iterable[int]) -> None:
+    user_ids = set(user_ids)
+    eligibility.refresh(db, user_ids)
+    invalidate_match_candidates(db, user_ids)
+    match_cache.invalidate_users(user_ids)
+    match_snapshots.invalidate_users(user_ids)
+    feature_snapshots.mark_dirty()
+    match_worker.enqueue(user_ids)
+
+
+def _patched(result: Tuple[List[int], List[int]]) -> None:
+    changed, refill = result
+    match_cache.invalidate_users(changed)
+    match_worker.enqueue(refill)
+
+
+def profile_updated(db: Session, user_id: int) -> None:
+    """A user's profile changed: their own list and their place in others'."""
+    refresh_indexed_users(db, [user_id])
+    match_cache.invalidate_candidates([user_id])
+    _refresh(db, [user_id])
+    match_worker.enqueue_push([user_id])
+
+
+def user_verified(db: Session, user_id: int) -> None:
+    """A user verified their email and entered the matching pool."""
+    refresh_indexed_users(db, [user_id])
+    _refresh(db, [user_id])
+    match_worker.enqueue_push([user_id])
+
+
+def group_joined(db: Session, user_ids: Iterable[int]) -> None:
+    """Users joined a group: they stop matching and leave other lists."""
+    user_ids = list(user_ids)
+    refresh_indexed_users(db, user_ids)
+    match_cache.invalidate_candidates(user_ids)
+    _refresh(db, user_ids)
+    _patched(pop_candidates(db, user_ids))
+    leave_lobby(db, user_ids)
+
+
+def group_left(db: Session, user_id: int) -> None:
+    """A user left their group and can match again."""
+    refresh_indexed_users(db, [user_id])
+    _refresh(db, [user_id])
+    match_worker.enqueue_push([user_id])
+
+
+def match_request_created(db: Session, from_user_id: int, to_user_id: int) -> None:
+    """A pending request hides the pair from each other's lists."""
+    _patched(pop_candidates(db, [to_user_id], [from_user_id]))
+    _patched(pop_candidates(db, [from_user_id], [to_user_id]))
+    match_cache.invalidate_users([from_user_id, to_user_id])
+    match_snapshots.invalidate_users([from_user_id, to_user_id])
+    pair_requested(db, from_user_id, to_user_id)
+
+
+def match_request_rejected(db: Session, from_user_id: int, to_user_id: int) -> None:
+    """A rejected request excludes the pair for good; their lists dropped each other when it was sent."""
+    exclude_pair(db, from_user_id, to_user_id)
+    match_cache.invalidate_users([from_user_id, to_user_id])
+    match_snapshots.invalidate_users([from_user_id, to_user_id])
+
+
+def lobby_proposal_passed(db: Session, user_id: int, other_id: int) -> None:
+    """A passed lobby proposal excludes the pair and takes them out of each other's lists."""
+    exclude_pair(db, user_id, other_id)
+    _patched(pop_candidates(db, [other_id], [user_id]))
+    _patched(pop_candidates(db, [user_id], [other_id]))
+    match_cache.invalidate_users([user_id, other_id])
+    match_snapshots.invalidate_users([user_id, other_id])
@@ -0,0 +1,142 @@
+"""
+Per-user snapshots of the ranked match list, paged with opaque cursors.
+
+The first page of GET /api/matches/ranked ranks the user's eligible pool
+once (up to MATCH_SNAPSHOT_MAX_CANDIDATES) and keeps the ranking for the
+session; later pages slice the snapshot, so each costs O(page) no matter
+how large the pool is.
+
+A cursor names the snapshot and the offset of the next page. Snapshots
+are dropped when the owner's own eligibility changes (profile edits,
+verification, joining or leaving a group, requests sent or received) and
+expire after MATCH_SNAPSHOT_TTL_SECONDS. A cursor whose snapshot is gone
+(dropped, expired, or held by another worker process) gets a fresh
+ranking, continued at the same offset.
+
+Counters (match_snapshots.created / hits / misses / invalidations) are
+reported through app.core.metrics.
+"""
+import base64
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import settings
+
+
+def encode_cursor(snapshot_id: str, offset: int) -> str:
+    """Opaque cursor for the page starting at offset."""
+    return base64.urlsafe_b64encode(f"{snapshot_id}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Snapshot ID and offset from a cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        snapshot_id, offset = raw.rsplit(":", 1)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not snapshot_id or not offset.isdigit():
+        raise ValueError("Invalid cursor")
+    return snapshot_id, int(offset)
+
+
+class MatchSnapshots:
+    """LRU + TTL store of one ranked snapshot per user."""
+
+    def __init__(self, max_users: int, ttl_seconds: int):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # user ID -> (snapshot ID, expires at, candidate IDs, scores)
+        self._entries: "OrderedDict[int, Tuple[str, float, np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def create(self, user_id: int, ranked: List[Tuple[int, int]]) -> str:
+        """
+        Store a user's ranking, replacing any earlier snapshot.
+
+        Args:
+            user_id: User the ranking is for
+            ranked: (candidate ID, score) pairs, highest first
+
+        Returns:
+            ID of the new snapshot
+        """
+        snapshot_id = secrets.token_hex(8)
+        candidate_ids = np.array([c for c, _ in ranked], dtype=np.int64)
+        scores = np.array([s for _, s in ranked], dtype=np.int64)
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (snapshot_id, time.monotonic() + self.ttl_seconds, candidate_ids, scores)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        metrics.incr("match_snapshots.created")
+        return snapshot_id
+
+    def page(self, user_id: int, snapshot_id: str, offset: int,
+             limit: int) -> Optional[Tuple[List[Tuple[int, int]], bool]]:
+        """
+        One page of a user's snapshot.
+
+        Args:
+            user_id: Owner of the snapshot
+            snapshot_id: Snapshot the cursor was issued for
+            offset: Rank of the first entry
+            limit: Page size
+
+        Returns:
+            ((candidate ID, score) pairs, whether more follow), or None if
+            the snapshot is gone
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if not entry or entry[0] != snapshot_id:
+                metrics.incr("match_snapshots.misses")
+                return None
+            self._entries.move_to_end(user_id)
+            _, _, candidate_ids, scores = entry
+
+        metrics.incr("match_snapshots.hits")
+        stop = offset + limit
+        page = list(zip(candidate_ids[offset:stop].tolist(), scores[offset:stop].tolist()))
+        return page, stop < len(candidate_ids)
+
+    def invalidate_users(self, user_ids: Iterable[int]) -> None:
+        """Drop the snapshots of these users."""
+        with self._lock:
+            for user_id in set(user_ids):
+                if self._entries.pop(user_id, None) is not None:
+                    metrics.incr("match_snapshots.invalidations")
+
+    def clear(self) -> None:
+        """Drop every snapshot."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Current size and configured bounds."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_users": self.max_users,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+match_snapshots = MatchSnapshots(
+    max_users=settings.MATCH_SNAPSHOT_MAX_USERS,
+    ttl_seconds=settings.MATCH_SNAPSHOT_TTL_SECONDS,
+)
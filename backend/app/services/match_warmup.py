@@ -0,0 +1,82 @@
+"""
+Match warm-up on login and verification.
+
+The first GET /api/matches after signing in used to score the user live.
+Logging in or verifying an email now queues a warm job on the match
+worker, which refreshes the user's stored list if needed and loads their
+top 3 into the match cache before MatchingScreen asks for it. Warm jobs
+are deduplicated by the worker queue, and a repeated login only re-reads
+a fresh list.
+
+To see whether that works, each sign-in is remembered until the user's
+first match fetch (for MATCH_WARMUP_TRACK_SECONDS at most), which counts
+as warm when it didn't need the live ranker: warmup.first_fetches and
+warmup.first_fetches_warm.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.match_worker import match_worker
+
+_lock = threading.Lock()
+# user ID -> when they signed in, oldest first
+_signed_in: "OrderedDict[int, float]" = OrderedDict()
+
+
+def warm_up(user_id: int) -> None:
+    """
+    Queue a user's matches to be cached after they log in or verify.
+
+    Args:
+        user_id: User who just signed in
+    """
+    if not settings.MATCH_WARMUP_ENABLED:
+        return
+    with _lock:
+        _signed_in.pop(user_id, None)
+        _signed_in[user_id] = time.monotonic()
+        while len(_signed_in) > settings.MATCH_WARMUP_MAX_TRACKED:
+            _signed_in.popitem(last=False)
+    match_worker.enqueue_warm([user_id])
+    metrics.incr("warmup.requests")
+
+
+def record_fetch(user_id: int, warm: bool) -> None:
+    """
+    Count a user's first match fetch since signing in.
+
+    Args:
+        user_id: User who fetched their matches
+        warm: Whether it was served without live ranking (cache or fresh list)
+    """
+    with _lock:
+        signed_in_at = _signed_in.pop(user_id, None)
+    if signed_in_at is None or time.monotonic() - signed_in_at > settings.MATCH_WARMUP_TRACK_SECONDS:
+        return
+    metrics.incr("warmup.first_fetches")
+    if warm:
+        metrics.incr("warmup.first_fetches_warm")
+
+
+def clear() -> None:
+    """Forget every tracked sign-in."""
+    with _lock:
+        _signed_in.clear()
+
+
+def stats() -> Dict[str, Any]:
+    """Share of first match fetches served warm in this process."""
+    first_fetches = metrics.get("warmup.first_fetches")
+    warm = metrics.get("warmup.first_fetches_warm")
+    with _lock:
+        awaiting = len(_signed_in)
+    return {
+        "first_fetches": first_fetches,
+        "first_fetches_warm": warm,
+        "warm_fraction": warm / first_fetches if first_fetches else None,
+        "awaiting_first_fetch": awaiting,
+    }
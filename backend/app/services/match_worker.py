@@ -0,0 +1,224 @@
+"""
+Background worker that keeps the precomputed match lists up to date.
+
+Jobs are queued by user ID and deduplicated, so a burst of events for the
+same user only costs one run. A "rebuild" job recomputes a user's own list;
+a "push" job patches the user into (or out of) everyone else's lists via
+topk_maintenance.push_candidate, and queues rebuilds for lists it emptied
+below their cut. A "warm" job, queued when a user logs in or verifies
+(see match_warmup), makes sure the user's list is fresh and loads their
+top 3 into the match cache; warm jobs run ahead of everything else, since
+someone is about to open MatchingScreen. When the queue is idle
+the worker periodically picks up lists that are missing or stale, and
+rebuilds the approximate candidate index every MATCH_ANN_REBUILD_SECONDS.
+With MATCH_FEATURES_DIR set it also republishes the shared feature
+snapshot when profiles have changed (see feature_snapshot). Idle passes
+also rebuild exclusion sets older than MATCH_EXCLUSION_REBUILD_SECONDS
+(see exclusion_sets) and reconcile the eligibility bitmap with the
+database every MATCH_ELIGIBILITY_RECONCILE_SECONDS (see eligibility).
+"""
+import itertools
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Set, Tuple
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.candidate_index import build_candidate_index
+from app.services.eligibility import eligibility
+from app.services.exclusion_sets import rebuild_stale_exclusions
+from app.services.feature_snapshot import feature_snapshots
+from app.services.match_cache import match_cache
+from app.services.match_candidates_service import (
+    get_stored_matches,
+    rebuild_match_candidates,
+    get_users_needing_refresh,
+)
+from app.models.user import User
+from app.services.topk_maintenance import push_candidate
+
+REBUILD = "rebuild"
+PUSH = "push"
+WARM = "warm"
+
+# Lower runs first; jobs of the same priority run in the order queued
+_PRIORITY = {WARM: 0, REBUILD: 1, PUSH: 1}
+
+
+class MatchCandidateWorker:
+    """Single background thread that maintains user_match_candidates."""
+
+    def __init__(self, session_factory: Callable = SessionLocal):
+        self.session_factory = session_factory
+        self._queue: "queue.PriorityQueue[Tuple[int, int, Tuple[str, int]]]" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending: Set[Tuple[str, int]] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._index_built_at = 0.0
+
+    def enqueue(self, user_ids: Iterable[int]) -> None:
+        """Queue users for a rebuild, skipping ones already queued."""
+        self._put(REBUILD, user_ids)
+
+    def enqueue_push(self, user_ids: Iterable[int]) -> None:
+        """Queue users to be pushed into other users' stored lists."""
+        self._put(PUSH, user_ids)
+
+    def enqueue_warm(self, user_ids: Iterable[int]) -> None:
+        """Queue users to have their top matches cached, ahead of other jobs."""
+        self._put(WARM, user_ids)
+
+    def _put(self, kind: str, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                if (kind, user_id) not in self._pending:
+                    self._pending.add((kind, user_id))
+                    self._queue.put((_PRIORITY[kind], next(self._sequence), (kind, user_id)))
+
+    def start(self) -> None:
+        """Start the worker thread (no-op if already running)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="match-candidate-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the worker thread to finish and wait for it."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def drain(self) -> int:
+        """
+        Process everything currently queued on the calling thread.
+
+        Returns:
+            Number of jobs run
+        """
+        processed = 0
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except queue.Empty:
+                return processed
+            self._process(job)
+            processed += 1
+
+    def enqueue_stale(self) -> None:
+        """Queue every eligible user whose list is missing or stale."""
+        db = self.session_factory()
+        try:
+            self.enqueue(get_users_needing_refresh(db))
+        except Exception as e:
+            print(f"[ERROR] Failed to find stale match candidate lists: {e}")
+        finally:
+            db.close()
+
+    def rebuild_index_if_due(self) -> None:
+        """Rebuild the candidate index if it is missing or old."""
+        if self._index_built_at and time.monotonic() - self._index_built_at < settings.MATCH_ANN_REBUILD_SECONDS:
+            return
+        db = self.session_factory()
+        try:
+            build_candidate_index(db)
+            self._index_built_at = time.monotonic()
+        except Exception as e:
+            print(f"[ERROR] Failed to build candidate index: {e}")
+        finally:
+            db.close()
+
+    def publish_features_if_due(self) -> None:
+        """Publish a new feature snapshot if profiles changed or the current one is old."""
+        if not settings.MATCH_FEATURES_DIR:
+            return
+        db = self.session_factory()
+        try:
+            feature_snapshots.publish_if_due(db)
+        except Exception as e:
+            print(f"[ERROR] Failed to publish feature snapshot: {e}")
+        finally:
+            db.close()
+
+    def rebuild_exclusions_if_due(self) -> None:
+        """Fold the overflow of old exclusion sets back into their Bloom filters."""
+        db = self.session_factory()
+        try:
+            rebuild_stale_exclusions(db)
+        except Exception as e:
+            db.rollback()
+            print(f"[ERROR] Failed to rebuild exclusion sets: {e}")
+        finally:
+            db.close()
+
+    def reconcile_eligibility_if_due(self) -> None:
+        """Fix eligibility bits changed by other processes' events."""
+        db = self.session_factory()
+        try:
+            drift = eligibility.reconcile_if_due(db)
+            if drift:
+                print(f"[WARN] Eligibility bitmap had {drift} stale bits")
+        except Exception as e:
+            print(f"[ERROR] Failed to reconcile eligibility bitmap: {e}")
+        finally:
+            db.close()
+
+    def _warm(self, db, user_id: int) -> None:
+        # A repeated login finds a fresh list and only re-reads it
+        matches = get_stored_matches(db, user_id, limit=3)
+        if matches is None:
+            rebuild_match_candidates(db, user_id)
+            matches = get_stored_matches(db, user_id, limit=3)
+            metrics.incr("warmup.rebuilds")
+        if matches is None:
+            # Not matchable (in a group) or nobody to match with
+            return
+        user = db.get(User, user_id)
+        match_cache.set(user_id, 3, matches, shard=user.cohort if user else None)
+        metrics.incr("warmup.warmed")
+
+    def _process(self, job: Tuple[str, int]) -> None:
+        with self._lock:
+            self._pending.discard(job)
+
+        kind, user_id = job
+        db = self.session_factory()
+        try:
+            if kind == PUSH:
+                changed, refill = push_candidate(db, user_id)
+                match_cache.invalidate_users(changed)
+                self.enqueue(refill)
+            elif kind == WARM:
+                self._warm(db, user_id)
+            else:
+                rebuild_match_candidates(db, user_id)
+        except Exception as e:
+            db.rollback()
+            print(f"[ERROR] Failed to {kind} match candidates for user {user_id}: {e}")
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        self.rebuild_index_if_due()
+        self.publish_features_if_due()
+        self.enqueue_stale()
+        while not self._stop.is_set():
+            try:
+                _, _, job = self._queue.get(timeout=settings.MATCH_WORKER_REFRESH_SECONDS)
+            except queue.Empty:
+                self.rebuild_index_if_due()
+                self.publish_features_if_due()
+                self.rebuild_exclusions_if_due()
+                self.reconcile_eligibility_if_due()
+                self.enqueue_stale()
+                continue
+            self._process(job)
+            if self._queue.empty():
+                self.publish_features_if_due()
+
+
+match_worker = MatchCandidateWorker()
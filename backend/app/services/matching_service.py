@@ -7,12 +7,48 @@ Scoring System (0-100 points):
 - Goal Alignment: 0-30 points
 
 Minimum threshold: 50/100 to show as a match
+
+Rankings are instrumented per stage (metrics.stage, metrics.filtered):
+matches.retrieve, matches.load, matches.score, matches.recheck,
+matches.profiles and matches.serialize, with the candidates each filter
+kept, rows loaded and profile JSON bytes materialized.
 """
-from typing import List, Dict, Any, Optional
+import json
+from typing import List, Dict, Any, Optional, Set, Tuple
+from sqlalchemy import JSON, and_, exists, or_
 from sqlalchemy.orm import Session
 from app.models.user import User
 from app.models.group import GroupMember
 from app.models.match import MatchRequest
+from app.core import metrics
+from app.core.config import settings
+from app.services.cohort_service import sharding_enabled
+from app.services.interest_service import sync_interest_bits, backfill_interest_bits
+from app.services.candidate_index import candidate_index
+from app.services.cascade_ranker import rank_top_k
+from app.services.eligibility import eligibility
+from app.services.exclusion_sets import ExclusionSet, drop_excluded, load_exclusions
+from app.services.feature_snapshot import FeatureSnapshot, feature_snapshots
+from app.services.hard_filters import (
+    DEAL_BREAKER_CONFLICTS,
+    UNKNOWN_GENDER,
+    accepted_genders,
+    age_group,
+    gender_code,
+    hard_filter_mask,
+)
+from app.services.pair_scores import get_pair_scores
+from app.services.geo_service import geohash_cover, geohash_range, within_mutual_distance
+from app.services.scoring_engine import (
+    PERSONALITY_TRAITS,
+    COMPATIBLE_GOALS,
+    CandidatePool,
+    compatibility_scores,
+    iter_ranked,
+)
+
+# Profile columns stored as JSON, counted by load_match_profiles
+_JSON_COLUMNS = [column.name for column in User.__table__.columns if isinstance(column.type, JSON)]
 
 
 def calculate_interest_score(user_interests: List[str], other_interests: List[str]) -> float:
@@ -43,6 +79,33 @@ def calculate_interest_score(user_interests: List[str], other_interests: List[st
     return similarity * 30.0
 
 
+def calculate_interest_bits_score(user_bits: Optional[bytes], other_bits: Optional[bytes]) -> float:
+    """
+    Calculate interest overlap score (0-30 points) from packed bitsets.
+
+    Same result as calculate_interest_score, using popcounts of the AND and
+    OR of the two users' interest_bits instead of Python sets.
+
+    Args:
+        user_bits: User's packed interest bitset
+        other_bits: Potential match's packed interest bitset
+
+    Returns:
+        Score from 0-30 based on shared interests
+    """
+    user_value = int.from_bytes(user_bits or b'', 'little')
+    other_value = int.from_bytes(other_bits or b'', 'little')
+
+    if not user_value or not other_value:
+        return 0.0
+
+    intersection = bin(user_value & other_value).count('1')
+    union = bin(user_value | other_value).count('1')
+
+    similarity = intersection / union
+    return similarity * 30.0
+
+
 def calculate_personality_score(user_personality: Dict[str, int], other_personality: Dict[str, int]) -> float:
     """
     Calculate personality compatibility score (0-40 points).
@@ -62,12 +125,10 @@ def calculate_personality_score(user_personality: Dict[str, int], other_personal
     Returns:
         Score from 0-40 based on personality similarity
     """
-    traits = ['extroversion', 'openness', 'agreeableness', 'conscientiousness']
-
     total_difference = 0.0
     trait_count = 0
 
-    for trait in traits:
+    for trait in PERSONALITY_TRAITS:
         if trait in user_personality and trait in other_personality:
             # Calculate absolute difference (0-9 scale difference)
             difference = abs(user_personality[trait] - other_personality[trait])
@@ -102,22 +163,40 @@ def calculate_goal_score(user_goal: str, other_goal: str) -> float:
     if user_goal == other_goal:
         return 30.0
 
-    # Define compatible goal pairs (partial credit)
-    compatible_goals = {
-        'networking': ['professional_development', 'mentorship'],
-        'professional_development': ['networking', 'mentorship'],
-        'mentorship': ['professional_development', 'networking'],
-        'friendship': ['socialising', 'hobbies'],
-        'socialising': ['friendship', 'hobbies'],
-        'hobbies': ['friendship', 'socialising'],
-    }
-
-    if user_goal in compatible_goals and other_goal in compatible_goals[user_goal]:
+    if user_goal in COMPATIBLE_GOALS and other_goal in COMPATIBLE_GOALS[user_goal]:
         return 15.0
 
     return 0.0
 
 
+def calculate_score_breakdown(user: User, other_user: User) -> Dict[str, float]:
+    """
+    Calculate the component scores between two users.
+
+    Args:
+        user: The current user
+        other_user: Potential match
+
+    Returns:
+        Dictionary with interests (0-30), personality (0-40) and goal (0-30) points
+    """
+    # Interest overlap (0-30 points), from bitsets when both users have one
+    user_bits = getattr(user, 'interest_bits', None)
+    other_bits = getattr(other_user, 'interest_bits', None)
+    if user_bits is not None and other_bits is not None:
+        interest_score = calculate_interest_bits_score(user_bits, other_bits)
+    else:
+        interest_score = calculate_interest_score(user.interests, other_user.interests)
+
+    return {
+        "interests": interest_score,
+        # Personality compatibility (0-40 points)
+        "personality": calculate_personality_score(user.personality, other_user.personality),
+        # Goal alignment (0-30 points)
+        "goal": calculate_goal_score(user.primary_goal, other_user.primary_goal),
+    }
+
+
 def calculate_compatibility_score(user: User, other_user: User) -> int:
     """
     Calculate overall compatibility score between two users.
@@ -129,18 +208,12 @@ def calculate_compatibility_score(user: User, other_user: User) -> int:
     Returns:
         Total compatibility score (0-100)
     """
-    # Interest overlap (0-30 points)
-    interest_score = calculate_interest_score(user.interests, other_user.interests)
-
-    # Personality compatibility (0-40 points)
-    personality_score = calculate_personality_score(user.personality, other_user.personality)
-
-    # Goal alignment (0-30 points)
-    goal_score = calculate_goal_score(user.primary_goal, other_user.primary_goal)
+    return total_score(calculate_score_breakdown(user, other_user))
 
-    total_score = interest_score + personality_score + goal_score
 
-    return int(round(total_score))
+def total_score(breakdown: Dict[str, float]) -> int:
+    """Total compatibility score (0-100) from its component scores."""
+    return int(round(breakdown["interests"] + breakdown["personality"] + breakdown["goal"]))
 
 
 def is_user_in_active_group(db: Session, user_id: int) -> bool:
@@ -189,13 +262,67 @@ def get_existing_match_request(db: Session, from_user_id: int, to_user_id: int)
     return request
 
 
+def score_match_request(db: Session, match_request: MatchRequest, sender: User, receiver: User) -> None:
+    """
+    Store the compatibility score and its breakdown on a match request.
+
+    The inbox reads the stored values instead of rescoring on every poll.
+    The pair is read through the pair score store, so it is only scored
+    once however many requests and views involve it.
+    Does not commit; callers commit with the rest of their changes.
+
+    Args:
+        db: Database session
+        match_request: Request to score
+        sender: User who sent the request
+        receiver: User who received it
+    """
+    score, breakdown = get_pair_scores(db, receiver, [sender])[sender.id]
+    match_request.compatibility_score = score
+    match_request.score_breakdown = breakdown
+
+
+def backfill_request_scores(db: Session) -> int:
+    """
+    Score pending match requests created before scores were stored.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of requests scored
+    """
+    requests = db.query(MatchRequest).filter(
+        MatchRequest.status == "pending",
+        MatchRequest.compatibility_score == None
+    ).all()
+    if not requests:
+        return 0
+
+    user_ids = {r.from_user_id for r in requests} | {r.to_user_id for r in requests}
+    users = load_match_profiles(db, list(user_ids))
+    scored = 0
+    for request in requests:
+        sender, receiver = users.get(request.from_user_id), users.get(request.to_user_id)
+        if sender and receiver:
+            score_match_request(db, request, sender, receiver)
+            scored += 1
+    db.commit()
+
+    return scored
+
+
 def matches_preferences(user: User, other_user: User) -> bool:
     """
     Check if other_user matches the user's preferences.
 
     Checks:
     - Age range preference
-    - Gender preference (if specified)
+    - Gender preference (if specified), by other_user's pronoun
+    - Same age group, if the user only bridges within their age group
+    - Same pronoun, if the user only bridges with the same pronoun
+
+    Matching applies this both ways (see hard_filters).
 
     Args:
         user: The user with preferences
@@ -213,17 +340,353 @@ def matches_preferences(user: User, other_user: User) -> bool:
         if not (min_age <= other_user.age <= max_age):
             return False
 
-    # Check gender preference (if user has specified one)
-    gender_pref = user.gender_preference
-    if gender_pref and 'any' not in gender_pref:
-        # Note: We don't have gender field in User model currently
-        # This is a placeholder for future implementation
-        # For now, we'll assume gender preference is always satisfied
-        pass
+    # Check gender preference ("Any", or nothing chosen, accepts everyone)
+    if not accepted_genders(user.gender_preference) >> gender_code(other_user.gender) & 1:
+        return False
+
+    if user.age_collab_only and age_group(user.age) != age_group(other_user.age):
+        return False
+
+    if user.gender_collab_only:
+        pronoun = gender_code(user.gender)
+        if pronoun == UNKNOWN_GENDER or pronoun != gender_code(other_user.gender):
+            return False
 
     return True
 
 
+def violates_deal_breakers(user: User, other_user: User) -> bool:
+    """
+    Check if other_user's profile conflicts with one of user's deal breakers.
+
+    Args:
+        user: The user with deal breakers
+        other_user: Potential match to check
+
+    Returns:
+        True if other_user breaks one of user's deal breakers
+    """
+    for deal_breaker in user.deal_breakers or []:
+        if other_user.commitment_level in DEAL_BREAKER_CONFLICTS.get(deal_breaker, ()):
+            return True
+    return False
+
+
+def load_candidate_rows(db: Session, user: User, candidate_ids: Optional[List[int]] = None,
+                        cohort: Optional[str] = None) -> List[Any]:
+    """
+    Load every eligible candidate for a user in a single query.
+
+    The eligibility rules run in SQL as anti-joins:
+    - Verified, and not the user themselves
+    - No active group membership
+    - No pending match request in either direction
+    - Age within the user's age preference
+    - Located in a geohash cell near the user (or not located at all)
+    - In the given cohort shard, if any
+
+    Only the columns the scorer, the exact distance check
+    (geo_service.within_mutual_distance) and the reciprocal hard filters
+    (hard_filters.hard_filter_mask) need are selected.
+
+    Args:
+        db: Database session
+        user: User to find candidates for
+        candidate_ids: Only consider these users (all users if None)
+        cohort: Only consider users in this cohort (every cohort if None)
+
+    Returns:
+        Rows with id, interest_bits, personality, primary_goal, latitude,
+        longitude, max_distance and the hard-filter columns
+    """
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+
+    has_pending_request = exists().where(
+        MatchRequest.status == "pending",
+        or_(
+            and_(MatchRequest.from_user_id == user.id, MatchRequest.to_user_id == User.id),
+            and_(MatchRequest.from_user_id == User.id, MatchRequest.to_user_id == user.id),
+        )
+    )
+
+    query = db.query(
+        User.id,
+        User.age,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+    ).filter(
+        User.id != user.id,
+        User.email_verified == True,
+        ~in_active_group,
+        ~has_pending_request,
+    )
+
+    # Same defaults as matches_preferences
+    age_pref = user.age_preference
+    if age_pref:
+        query = query.filter(User.age.between(age_pref.get('min', 18), age_pref.get('max', 100)))
+
+    # Nearby cells by indexed geohash ranges; the exact radius is checked after loading
+    if user.latitude is not None and user.longitude is not None:
+        cells = geohash_cover(user.latitude, user.longitude, user.max_distance or 0)
+        if cells != [""]:
+            query = query.filter(or_(
+                User.geohash == None,
+                *[User.geohash.between(*geohash_range(cell)) for cell in cells],
+            ))
+
+    if cohort is not None:
+        query = query.filter(User.cohort == cohort)
+
+    if candidate_ids is not None:
+        query = query.filter(User.id.in_(candidate_ids))
+
+    return query.order_by(User.id).all()
+
+
+def load_match_profiles(db: Session, user_ids: List[int]) -> Dict[int, User]:
+    """
+    Load the full profiles for a set of ranked candidates in one query.
+
+    Args:
+        db: Database session
+        user_ids: IDs of the users to load
+
+    Returns:
+        Dictionary of user ID to User
+    """
+    if not user_ids:
+        return {}
+
+    with metrics.stage("matches.profiles"):
+        users = db.query(User).filter(User.id.in_(user_ids)).all()
+        metrics.incr("stage.matches.profiles.rows", len(users))
+        metrics.incr("stage.matches.profiles.json_bytes", sum(
+            len(json.dumps(getattr(u, column))) for u in users for column in _JSON_COLUMNS
+        ))
+    return {u.id: u for u in users}
+
+
+def load_eligible_candidates(db: Session, user: User, candidate_ids: Optional[List[int]] = None,
+                             cohort: Optional[str] = None) -> List[Any]:
+    """
+    Every candidate a user can be matched with, ready for scoring.
+
+    Args:
+        db: Database session
+        user: User to find candidates for
+        candidate_ids: Only consider these users (all users if None)
+        cohort: Only consider users in this cohort (every cohort if None)
+
+    Returns:
+        Rows from load_candidate_rows that pass the distance rule and the
+        hard filters both ways
+    """
+    # One query for the whole eligible pool, scoring columns only
+    candidates = load_candidate_rows(db, user, candidate_ids, cohort)
+    metrics.incr("stage.matches.load.rows", len(candidates))
+
+    # Users created before interest bitsets existed get theirs on first sight
+    missing_bits = [c.id for c in candidates if c.interest_bits is None]
+    if missing_bits:
+        backfill_interest_bits(db, missing_bits)
+        candidates = load_candidate_rows(db, user, candidate_ids, cohort)
+
+    # Both users must be inside each other's max_distance and pass each
+    # other's preferences and deal breakers
+    nearby = within_mutual_distance(user, candidates)
+    allowed = nearby & hard_filter_mask(user, candidates)
+    metrics.filtered("matches.distance", len(candidates), nearby.sum())
+    metrics.filtered("matches.hard_filters", nearby.sum(), allowed.sum())
+    if not allowed.all():
+        candidates = [c for c, keep in zip(candidates, allowed) if keep]
+
+    return candidates
+
+
+def pending_request_partners(db: Session, user_id: int) -> List[int]:
+    """IDs of the users a user has a pending match request with, either way."""
+    rows = db.query(MatchRequest.from_user_id, MatchRequest.to_user_id).filter(
+        MatchRequest.status == "pending",
+        or_(MatchRequest.from_user_id == user_id, MatchRequest.to_user_id == user_id),
+    ).all()
+    return [to_id if from_id == user_id else from_id for from_id, to_id in rows]
+
+
+def still_eligible(db: Session, user_ids: List[int]) -> Set[int]:
+    """Which of these users are verified and outside active groups right now."""
+    if not user_ids:
+        return set()
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+    rows = db.query(User.id).filter(
+        User.id.in_(user_ids),
+        User.email_verified == True,
+        ~in_active_group,
+    ).all()
+    return {row.id for row in rows}
+
+
+def load_eligible_pool(db: Session, user: User, snapshot: Optional[FeatureSnapshot],
+                       candidate_ids: Optional[List[int]] = None, cohort: Optional[str] = None,
+                       excluded_ids: Optional[List[int]] = None,
+                       exclusions: Optional[ExclusionSet] = None) -> CandidatePool:
+    """
+    The eligible candidates of a user as a scoring pool.
+
+    Read from the mapped feature snapshot when one is published, otherwise
+    loaded with load_eligible_candidates. Candidates in the user's
+    exclusion set are left out.
+
+    Args:
+        db: Database session
+        user: User to find candidates for
+        snapshot: Current feature snapshot, or None to query the database
+        candidate_ids: Only consider these users (all users if None)
+        cohort: Only consider users in this cohort (every cohort if None)
+        excluded_ids: With a snapshot, the users to leave out (the user and
+            their pending request partners)
+        exclusions: The user's exclusion set (see exclusion_sets)
+
+    Returns:
+        CandidatePool ordered by user ID
+    """
+    with metrics.stage("matches.load"):
+        if snapshot is None:
+            pool = CandidatePool(load_eligible_candidates(db, user, candidate_ids, cohort))
+        else:
+            eligible = eligibility.snapshot_mask(snapshot) if eligibility.built else None
+            pool = snapshot.pool(snapshot.eligible_rows(user, excluded_ids or [], candidate_ids, cohort, eligible))
+        if exclusions:
+            before = pool.size
+            pool = pool.take(drop_excluded(exclusions, pool.user_ids))
+            metrics.filtered("matches.exclusions", before, pool.size)
+    return pool
+
+
+def rank_pool(user: User, pool: CandidatePool, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Rank a pool by compatibility score: score desc, then pool order.
+
+    Large pools are ranked by the cascade ranker, which skips candidates
+    whose score bound can't reach the top ``limit``.
+
+    Returns:
+        List of (candidate user ID, compatibility score), highest first
+    """
+    with metrics.stage("matches.score"):
+        metrics.incr("stage.matches.score.candidates", pool.size)
+        if limit is not None and limit < pool.size and pool.size >= settings.MATCH_CASCADE_MIN_POOL:
+            # Only the top few are needed: prune by score bounds before exact scoring
+            rows, scores = rank_top_k(user, pool, limit)
+            return [(int(pool.user_ids[row]), int(compatibility)) for row, compatibility in zip(rows.tolist(), scores)]
+
+        # Score every eligible candidate in one vectorized pass
+        scores = compatibility_scores(user, pool)
+
+        return [(int(pool.user_ids[row]), compatibility) for row, compatibility in iter_ranked(scores, limit)]
+
+
+def rank_potential_matches(db: Session, user: User, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Rank every eligible candidate for a user by compatibility score.
+
+    Large pools are narrowed by the approximate candidate index first; the
+    retrieved candidates are still eligibility-checked and scored exactly.
+    The index retrieves by profile alone, so when distance and the hard
+    filters leave fewer than ``limit`` of them, the full eligible pool is
+    ranked instead. Unlimited rankings always use the full pool.
+    With cohort sharding on, only the user's own shard is ranked unless it
+    has fewer than MATCH_SHARD_MIN_MATCHES eligible candidates. Large pools
+    are ranked by the cascade ranker, which skips candidates whose score
+    bound can't reach the top ``limit``.
+
+    When a feature snapshot is published (feature_snapshot), candidates
+    come from the shared mapping instead of a pool query. Pending requests
+    are still read live, and eligibility comes from the in-memory bitmap
+    (eligibility), ANDed with the hard-filter rows before scoring. Until
+    the bitmap is built, the ranked candidates are re-checked against the
+    database instead, so nobody who has since joined a group is returned.
+
+    The user's exclusion set is read once and drops everyone either side
+    has turned down, whichever way the pool was loaded.
+
+    Args:
+        db: Database session
+        user: User to rank candidates for
+        limit: Maximum number of candidates to return (all if None)
+
+    Returns:
+        List of (candidate user ID, compatibility score), highest first
+    """
+    if user.interest_bits is None:
+        sync_interest_bits(db, user)
+        db.commit()
+
+    candidate_ids = None
+    if limit is not None and candidate_index.built and candidate_index.size >= settings.MATCH_ANN_MIN_POOL:
+        with metrics.stage("matches.retrieve"):
+            candidate_ids = candidate_index.query(user, settings.MATCH_ANN_CANDIDATES)
+
+    snapshot = feature_snapshots.current()
+    excluded_ids = None
+    if snapshot is not None:
+        metrics.incr("feature_snapshots.requests")
+        excluded_ids = [user.id, *pending_request_partners(db, user.id)]
+    exclusions = load_exclusions(db, user.id)
+
+    def load_pool(candidate_ids: Optional[List[int]]) -> CandidatePool:
+        shard = user.cohort if sharding_enabled() and user.cohort else None
+        pool = load_eligible_pool(db, user, snapshot, candidate_ids, shard, excluded_ids, exclusions)
+        if shard is not None:
+            metrics.incr("match_shards.requests")
+            if pool.size < settings.MATCH_SHARD_MIN_MATCHES:
+                # Too few in the shard to fill the top 3: rank the whole pool
+                metrics.incr("match_shards.fallbacks")
+                pool = load_eligible_pool(db, user, snapshot, candidate_ids, excluded_ids=excluded_ids,
+                                          exclusions=exclusions)
+        return pool
+
+    pool = load_pool(candidate_ids)
+    if candidate_ids is not None and pool.size < limit:
+        # Retrieved candidates mostly live too far away or fail the hard filters
+        metrics.incr("candidate_index.fallbacks")
+        pool = load_pool(None)
+
+    if snapshot is None or eligibility.built:
+        return rank_pool(user, pool, limit)
+
+    # Without the bitmap the snapshot may predate group joins: drop anyone
+    # no longer eligible, ranking deeper until the limit is filled or the
+    # pool runs out
+    fetch = limit
+    while True:
+        ranked = rank_pool(user, pool, fetch)
+        with metrics.stage("matches.recheck"):
+            eligible = still_eligible(db, [candidate_id for candidate_id, _ in ranked])
+        kept = [(candidate_id, score) for candidate_id, score in ranked if candidate_id in eligible]
+        metrics.filtered("matches.recheck", len(ranked), len(kept))
+        if fetch is None or len(ranked) < fetch or len(kept) >= limit:
+            return kept[:limit]
+        fetch *= 2
+
+
 def find_potential_matches(db: Session, user: User, limit: int = 20) -> List[Dict[str, Any]]:
     """
     Find potential matches for a user based on compatibility score.
@@ -231,8 +694,10 @@ def find_potential_matches(db: Session, user: User, limit: int = 20) -> List[Dic
     Filters out:
     - The user themselves
     - Users already in groups
-    - Users who don't match preferences
-    - Users with compatibility score < 50
+    - Users with a pending match request either way
+    - Users either side turned down (the user's exclusion set)
+    - Users who don't match preferences or deal breakers, either way
+    - Users outside the mutual max_distance radius
 
     Args:
         db: Database session
@@ -242,49 +707,44 @@ def find_potential_matches(db: Session, user: User, limit: int = 20) -> List[Dic
     Returns:
         List of match dictionaries with user info and compatibility score
     """
-    # Get all verified users except the current user
-    all_users = db.query(User).filter(
-        User.id != user.id,
-        User.email_verified == True
-    ).all()
+    ranked = rank_potential_matches(db, user, limit)
+
+    # One more query for the profiles we actually return
+    profiles = load_match_profiles(db, [candidate_id for candidate_id, _ in ranked])
 
-    potential_matches = []
-
-    for other_user in all_users:
-        # Skip users already in groups
-        if is_user_in_active_group(db, other_user.id):
-            continue
-
-        # Skip if there's already a pending match request
-        if get_existing_match_request(db, user.id, other_user.id):
-            continue
-
-        # Check if user matches preferences
-        if not matches_preferences(user, other_user):
-            continue
-
-        # Calculate compatibility score
-        compatibility = calculate_compatibility_score(user, other_user)
-
-        potential_matches.append({
-            'user_id': other_user.id,
-            'first_name': other_user.first_name,
-            'surname': getattr(other_user, 'surname', None),
-            'age': other_user.age,
-            'perspective_answers': getattr(other_user, 'perspective_answers', None),
-            'profession': other_user.profession,
-            'statement': other_user.statement,
-            'interests': other_user.interests,
-            'compatibility_score': compatibility,
-            'location': other_user.location,
-            'primary_goal': other_user.primary_goal,
-            'focus': getattr(other_user, 'focus', None),
-            'headline': getattr(other_user, 'headline', None),
-            'profile_photo_url': getattr(other_user, 'profile_photo_url', None),
-        })
-
-    # Sort by compatibility score (highest first)
-    potential_matches.sort(key=lambda x: x['compatibility_score'], reverse=True)
-
-    # Return top matches (always return the closest ones regardless of score)
-    return potential_matches[:limit]
+    # Highest score first (always return the closest ones regardless of score)
+    with metrics.stage("matches.serialize"):
+        return [
+            build_match_entry(profiles[candidate_id], compatibility)
+            for candidate_id, compatibility in ranked
+            if candidate_id in profiles
+        ]
+
+
+def build_match_entry(other_user: User, compatibility: int) -> Dict[str, Any]:
+    """
+    Build the match card dictionary returned by the matches endpoints.
+
+    Args:
+        other_user: The matched user
+        compatibility: Compatibility score with the current user
+
+    Returns:
+        Match dictionary with user info and compatibility score
+    """
+    return {
+        'user_id': other_user.id,
+        'first_name': other_user.first_name,
+        'surname': getattr(other_user, 'surname', None),
+        'age': other_user.age,
+        'perspective_answers': getattr(other_user, 'perspective_answers', None),
+        'profession': other_user.profession,
+        'statement': other_user.statement,
+        'interests': other_user.interests,
+        'compatibility_score': compatibility,
+        'location': other_user.location,
+        'primary_goal': other_user.primary_goal,
+        'focus': getattr(other_user, 'focus', None),
+        'headline': getattr(other_user, 'headline', None),
+        'profile_photo_url': getattr(other_user, 'profile_photo_url', None),
+    }
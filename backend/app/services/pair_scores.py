@@ -0,0 +1,172 @@
+"""
+Symmetric pairwise compatibility, computed once per pair.
+
+The score formula is symmetric, so a pair only ever needs scoring once:
+
+- Stored pairs (PairScore) are keyed by (lower ID, higher ID), so a
+  request from A to B and B's inbox view of A read the same row. Each row
+  records both users' profile_version when it was computed; editing a
+  scored field (interests, personality, primary goal) bumps the version,
+  which retires every stored pair of that user without deleting anything.
+  Stale rows are overwritten when the pair is next needed.
+- Batch jobs that need every pair of a set (the group optimizer) compute
+  the upper triangle only and mirror it.
+
+Ranking a whole pool stays a single vectorized pass: reading one stored
+row per candidate would cost more than rescoring it.
+
+Counters (pair_scores.hits / computed) are reported through
+app.core.metrics.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.models.match import PairScore
+from app.models.user import User
+from app.services.interest_service import sync_interest_bits
+from app.services.scoring_engine import CandidatePool, score_components
+
+# Profile fields the compatibility score reads
+SCORED_FIELDS = {"interests", "personality", "primary_goal"}
+
+
+def pair_key(user_id: int, other_id: int) -> Tuple[int, int]:
+    """Store key of a pair: (lower ID, higher ID)."""
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def bump_profile_version(user: User) -> None:
+    """
+    Retire the user's stored pair scores.
+
+    Does not commit; callers commit with the rest of their changes.
+
+    Args:
+        user: User whose scored fields changed
+    """
+    user.profile_version = (user.profile_version or 0) + 1
+
+
+def upper_triangular_components(users: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score components of every pair in a set, each pair computed once.
+
+    Row i is scored against rows i+1.. only and the result mirrored; the
+    formula is symmetric, so this equals scoring every ordered pair.
+
+    Args:
+        users: Objects with id, interest_bits, personality and primary_goal
+
+    Returns:
+        (interest, personality, goal) symmetric (n, n) float matrices with
+        a zero diagonal
+    """
+    size = len(users)
+    pool = CandidatePool(users)
+    components = tuple(np.zeros((size, size), dtype=np.float64) for _ in range(3))
+    for row in range(size - 1):
+        rest = pool.slice(row + 1, size)
+        for matrix, scores in zip(components, score_components(users[row], rest)):
+            matrix[row, row + 1:] = scores
+
+    for matrix in components:
+        matrix += matrix.T
+    return components
+
+
+def pair_score_matrix(users: Sequence[Any]) -> np.ndarray:
+    """
+    Compatibility score (0-100) of every pair in a set, each pair computed once.
+
+    Same summation order and rounding as compatibility_scores.
+
+    Returns:
+        Symmetric (n, n) int matrix with a zero diagonal
+    """
+    interest, personality, goal = upper_triangular_components(users)
+    scores = np.rint(interest + personality + goal).astype(np.int64)
+    np.fill_diagonal(scores, 0)
+    return scores
+
+
+def _breakdown(row: PairScore) -> Dict[str, float]:
+    return {"interests": row.interest_score, "personality": row.personality_score, "goal": row.goal_score}
+
+
+def get_pair_scores(db: Session, user: User, others: Sequence[User]) -> Dict[int, Tuple[int, Dict[str, float]]]:
+    """
+    Compatibility of a user with each of several others, from the store.
+
+    Pairs missing from the store, or stored under an older profile version
+    of either user, are scored in one vectorized pass and written back.
+    Does not commit; callers commit with the rest of their changes.
+
+    Args:
+        db: Database session
+        user: One side of every pair
+        others: The other sides
+
+    Returns:
+        Dictionary of other user ID to (score, breakdown), where breakdown
+        has interests, personality and goal points
+    """
+    others = [o for o in others if o.id != user.id]
+    if not others:
+        return {}
+
+    lower = [o.id for o in others if o.id < user.id]
+    higher = [o.id for o in others if o.id > user.id]
+    rows = db.query(PairScore).filter(or_(
+        and_(PairScore.user_low_id == user.id, PairScore.user_high_id.in_(higher)),
+        and_(PairScore.user_high_id == user.id, PairScore.user_low_id.in_(lower)),
+    )).all()
+    stored = {pair_key(r.user_low_id, r.user_high_id): r for r in rows}
+
+    versions = {o.id: o.profile_version for o in others}
+    versions[user.id] = user.profile_version
+
+    results: Dict[int, Tuple[int, Dict[str, float]]] = {}
+    missing: List[User] = []
+    for other in others:
+        row = stored.get(pair_key(user.id, other.id))
+        if row and (row.low_version, row.high_version) == (versions[row.user_low_id], versions[row.user_high_id]):
+            results[other.id] = (row.compatibility_score, _breakdown(row))
+        else:
+            missing.append(other)
+    metrics.incr("pair_scores.hits", len(results))
+    if not missing:
+        return results
+
+    # Bitsets for users created before they existed, so scores match the scalar path
+    for profile in [user, *missing]:
+        if profile.interest_bits is None:
+            sync_interest_bits(db, profile)
+
+    interest, personality, goal = score_components(user, CandidatePool(missing))
+    totals = np.rint(interest + personality + goal).astype(np.int64)
+    now = datetime.now(timezone.utc)
+    for position, other in enumerate(missing):
+        low, high = pair_key(user.id, other.id)
+        row = stored.get((low, high)) or PairScore(user_low_id=low, user_high_id=high)
+        row.low_version, row.high_version = versions[low], versions[high]
+        row.compatibility_score = int(totals[position])
+        row.interest_score = float(interest[position])
+        row.personality_score = float(personality[position])
+        row.goal_score = float(goal[position])
+        row.computed_at = now
+        try:
+            with db.begin_nested():
+                db.add(row)
+        except IntegrityError:
+            # Another request stored the pair first; its score is the same
+            pass
+        results[other.id] = (row.compatibility_score, _breakdown(row))
+    metrics.incr("pair_scores.computed", len(missing))
+
+    return results
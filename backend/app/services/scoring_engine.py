@@ -0,0 +1,255 @@
+"""
+Vectorized compatibility scoring for a whole candidate pool.
+
+The scalar functions in matching_service score one pair at a time. This
+module turns the candidate pool into arrays once (personality matrix,
+interest bitset words, goal codes) and scores every candidate against a
+user in a single NumPy pass.
+
+Scores are bit-identical to calculate_interest_score,
+calculate_personality_score and calculate_goal_score: every float operation
+is performed in the same order and precision as the scalar code.
+"""
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+PERSONALITY_TRAITS = ['extroversion', 'openness', 'agreeableness', 'conscientiousness']
+
+# Compatible goal pairs (partial credit)
+COMPATIBLE_GOALS = {
+    'networking': ['professional_development', 'mentorship'],
+    'professional_development': ['networking', 'mentorship'],
+    'mentorship': ['professional_development', 'networking'],
+    'friendship': ['socialising', 'hobbies'],
+    'socialising': ['friendship', 'hobbies'],
+    'hobbies': ['friendship', 'socialising'],
+}
+
+
+def goal_family(goal: Optional[str]) -> str:
+    """Name of the family of mutually compatible goals a goal belongs to."""
+    return min([goal or "", *COMPATIBLE_GOALS.get(goal, [])])
+
+
+def pack_interest_words(bitsets: Sequence[Optional[bytes]], word_count: int = 0) -> np.ndarray:
+    """
+    Stack packed interest bitsets into a uint64 matrix, one row per bitset.
+
+    Args:
+        bitsets: Little-endian bitsets from interest_service.encode_interest_bits
+        word_count: Minimum number of 64-bit words per row
+
+    Returns:
+        Array of shape (len(bitsets), words)
+    """
+    padded = [(b or b'').ljust(-(-len(b or b'') // 8) * 8, b'\0') for b in bitsets]
+    word_count = max([word_count, *(len(b) // 8 for b in padded)])
+
+    words = np.zeros((len(padded), word_count), dtype='<u8')
+    for row, bits in enumerate(padded):
+        if bits:
+            words[row, :len(bits) // 8] = np.frombuffer(bits, dtype='<u8')
+    return words
+
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits in each row of a uint64 word matrix."""
+    if words.shape[-1] == 0:
+        return np.zeros(words.shape[:-1], dtype=np.int64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    as_bytes = words.view(np.uint8).reshape(*words.shape[:-1], -1)
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+class CandidatePool:
+    """
+    Column-oriented view of a set of candidates.
+
+    Built from anything exposing ``id``, ``interest_bits``, ``personality``
+    and ``primary_goal`` attributes (ORM users or query rows).
+    """
+
+    def __init__(self, candidates: Sequence[Any]):
+        self.size = len(candidates)
+        self.user_ids = np.fromiter((c.id for c in candidates), dtype=np.int64, count=self.size)
+
+        # Interest bitsets as a (candidates x 64-bit words) matrix
+        self.interest_words = pack_interest_words([c.interest_bits for c in candidates])
+        self.interest_counts = popcount(self.interest_words)
+
+        # Personality matrix with a presence mask for missing traits
+        self.personality = np.zeros((self.size, len(PERSONALITY_TRAITS)), dtype=np.float64)
+        self.personality_mask = np.zeros((self.size, len(PERSONALITY_TRAITS)), dtype=np.bool_)
+        for row, candidate in enumerate(candidates):
+            personality = candidate.personality or {}
+            for col, trait in enumerate(PERSONALITY_TRAITS):
+                if trait in personality:
+                    self.personality[row, col] = personality[trait]
+                    self.personality_mask[row, col] = True
+
+        # Goal codes (goals are compared by exact equality, so any string gets a code)
+        self.goal_vocab: Dict[Optional[str], int] = {}
+        self.goal_codes = np.fromiter(
+            (self.goal_vocab.setdefault(c.primary_goal, len(self.goal_vocab)) for c in candidates),
+            dtype=np.int64,
+            count=self.size,
+        )
+
+    @classmethod
+    def from_arrays(cls, user_ids: np.ndarray, interest_words: np.ndarray, interest_counts: np.ndarray,
+                    personality: np.ndarray, personality_mask: np.ndarray, goal_codes: np.ndarray,
+                    goal_vocab: Dict[Optional[str], int]) -> "CandidatePool":
+        """Wrap existing column arrays (e.g. views of shared memory) without copying."""
+        pool = cls.__new__(cls)
+        pool.size = len(user_ids)
+        pool.user_ids = user_ids
+        pool.interest_words = interest_words
+        pool.interest_counts = interest_counts
+        pool.personality = personality
+        pool.personality_mask = personality_mask
+        pool.goal_codes = goal_codes
+        pool.goal_vocab = goal_vocab
+        return pool
+
+    def slice(self, start: int, stop: int) -> "CandidatePool":
+        """View of rows start:stop as a pool of its own."""
+        return CandidatePool.from_arrays(
+            self.user_ids[start:stop],
+            self.interest_words[start:stop],
+            self.interest_counts[start:stop],
+            self.personality[start:stop],
+            self.personality_mask[start:stop],
+            self.goal_codes[start:stop],
+            self.goal_vocab,
+        )
+
+    def take(self, rows: np.ndarray) -> "CandidatePool":
+        """Copy of the given rows as a pool of its own."""
+        return CandidatePool.from_arrays(
+            self.user_ids[rows],
+            self.interest_words[rows],
+            self.interest_counts[rows],
+            self.personality[rows],
+            self.personality_mask[rows],
+            self.goal_codes[rows],
+            self.goal_vocab,
+        )
+
+
+def interest_scores(user_interest_bits: Optional[bytes], pool: CandidatePool) -> np.ndarray:
+    """
+    Interest overlap score (0-30) for every candidate in the pool.
+
+    Matches calculate_interest_score: Jaccard similarity of the two
+    interest sets, scaled to 30 points, and 0 when either list is empty.
+    Intersection and union sizes are popcounts of AND and OR of bitsets.
+    """
+    scores = np.zeros(pool.size, dtype=np.float64)
+    if not user_interest_bits or pool.size == 0:
+        return scores
+
+    user_words = pack_interest_words([user_interest_bits], pool.interest_words.shape[1])[0]
+    candidate_words = pool.interest_words
+    if candidate_words.shape[1] < user_words.shape[0]:
+        candidate_words = np.pad(candidate_words, ((0, 0), (0, user_words.shape[0] - candidate_words.shape[1])))
+
+    intersection = popcount(candidate_words & user_words)
+    union = popcount(candidate_words | user_words)
+
+    has_interests = pool.interest_counts > 0
+    similarity = intersection[has_interests].astype(np.float64) / union[has_interests].astype(np.float64)
+    scores[has_interests] = similarity * 30.0
+    return scores
+
+
+def personality_scores(user_personality: Optional[Dict[str, int]], pool: CandidatePool) -> np.ndarray:
+    """
+    Personality compatibility score (0-40) for every candidate in the pool.
+
+    Matches calculate_personality_score: mean normalized trait difference
+    over the traits both users have, inverted and scaled to 40 points.
+    """
+    user_personality = user_personality or {}
+    total_difference = np.zeros(pool.size, dtype=np.float64)
+    trait_count = np.zeros(pool.size, dtype=np.int64)
+
+    # Accumulate trait by trait so float addition happens in the scalar order
+    for col, trait in enumerate(PERSONALITY_TRAITS):
+        if trait not in user_personality:
+            continue
+        present = pool.personality_mask[:, col]
+        normalized_diff = np.abs(pool.personality[:, col] - user_personality[trait]) / 9.0
+        total_difference = np.where(present, total_difference + normalized_diff, total_difference)
+        trait_count += present
+
+    scores = np.zeros(pool.size, dtype=np.float64)
+    scored = trait_count > 0
+    avg_difference = total_difference[scored] / trait_count[scored].astype(np.float64)
+    scores[scored] = (1.0 - avg_difference) * 40.0
+    return scores
+
+
+def goal_scores(user_goal: Optional[str], pool: CandidatePool) -> np.ndarray:
+    """
+    Goal alignment score (0-30) for every candidate in the pool.
+
+    Matches calculate_goal_score: 30 for the same goal, 15 for a
+    compatible goal, 0 otherwise.
+    """
+    scores = np.zeros(pool.size, dtype=np.float64)
+
+    compatible_codes = [
+        pool.goal_vocab[goal] for goal in COMPATIBLE_GOALS.get(user_goal, []) if goal in pool.goal_vocab
+    ]
+    scores[np.isin(pool.goal_codes, compatible_codes)] = 15.0
+
+    if user_goal in pool.goal_vocab:
+        scores[pool.goal_codes == pool.goal_vocab[user_goal]] = 30.0
+    return scores
+
+
+def score_components(user: Any, pool: CandidatePool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the three score components for every candidate.
+
+    Returns:
+        (interest_scores, personality_scores, goal_scores) as float64 arrays
+    """
+    return (
+        interest_scores(user.interest_bits, pool),
+        personality_scores(user.personality, pool),
+        goal_scores(user.primary_goal, pool),
+    )
+
+
+def compatibility_scores(user: Any, pool: CandidatePool) -> np.ndarray:
+    """
+    Total compatibility score (0-100) for every candidate.
+
+    Same summation order and rounding (round half to even) as
+    calculate_compatibility_score.
+    """
+    interest, personality, goal = score_components(user, pool)
+    return np.rint(interest + personality + goal).astype(np.int64)
+
+
+def rank_candidates(scores: np.ndarray, limit: Optional[int] = None) -> np.ndarray:
+    """
+    Row indices ordered by score, highest first.
+
+    The sort is stable so ties keep pool order, as list.sort did.
+    """
+    order = np.argsort(-scores, kind='stable')
+    return order if limit is None else order[:limit]
+
+
+def iter_ranked(scores: np.ndarray, limit: Optional[int] = None) -> Iterable[Tuple[int, int]]:
+    """Yield (row, score) pairs in rank order."""
+    for row in rank_candidates(scores, limit):
+        yield int(row), int(scores[row])
@@ -0,0 +1,351 @@
+"""
+Incremental maintenance of the stored top-K match lists.
+
+A full rebuild ranks a user's whole pool. Most events only move one user
+in or out of other people's lists, so instead of rebuilding those lists we
+score the changed user once against every list owner and patch the lists:
+
+- push_candidate: the user became eligible or changed their profile. Since
+  compatibility scores are symmetric, one vectorized pass scores them
+  against every owner. Each owner's list is treated as a heap ordered by
+  (score desc, candidate ID asc), the same order a full rebuild uses, and
+  the user is pushed in where they beat the worst entry.
+- pop_candidates: users stopped being eligible (joined a group, or a
+  pending request or exclusion now hides a pair). Their rows are simply
+  removed.
+
+Lists containing a user are found through the candidate_id index on
+user_match_candidates (the reverse index); lists they may enter are found
+through each owner's list size and lowest stored score.
+
+A full list that loses an entry is still an exact top K-1, but the next
+best candidate is unknown, so it is queued for a rebuild to refill it.
+
+With cohort sharding on, a list ranks its owner's shard, or the whole pool
+when the shard is too small (a fallback list). Judged by the entries other
+than the pushed user, a list showing someone from another shard is a
+fallback list, and one showing at least MATCH_SHARD_MIN_MATCHES shard
+members is not. A user is pushed into same-shard lists and other shards'
+fallback lists. Same-shard fallback lists (the shard may now be big
+enough) and lists that can't be told apart are rebuilt instead, as are
+lists that drop below the minimum.
+"""
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import and_, case, exists, func, or_
+from sqlalchemy.orm import Session, aliased
+from app.core import metrics
+from app.core.config import settings
+from app.models.user import User
+from app.models.group import GroupMember
+from app.models.match import MatchRequest, UserMatchCandidate
+from app.services.cohort_service import sharding_enabled
+from app.services.exclusion_sets import load_exclusions
+from app.services.geo_service import within_mutual_distance
+from app.services.hard_filters import hard_filter_mask
+from app.services.interest_service import sync_interest_bits
+from app.services.match_candidates_service import freshness_cutoff, get_list_owners
+from app.services.scoring_engine import CandidatePool, compatibility_scores
+
+# (candidate ID, compatibility score)
+Entry = Tuple[int, int]
+
+
+# Heap key: best candidates compare lowest, ties broken by user ID like a rebuild
+def _entry_key(entry: Entry) -> Tuple[int, int]:
+    candidate_id, compatibility = entry
+    return -compatibility, candidate_id
+
+
+def _is_eligible(db: Session, user: Optional[User]) -> bool:
+    if not user or not user.email_verified:
+        return False
+    return not db.query(exists().where(
+        GroupMember.user_id == user.id,
+        GroupMember.status == "active"
+    )).scalar()
+
+
+def _is_fallback_list(row: Any) -> Optional[bool]:
+    # Whether a list ranks the whole pool instead of the owner's shard, from
+    # the entries other than the pushed candidate; None if they can't tell
+    if row.cohort is None:
+        return True
+    if row.other_entries and (row.lowest_cohort != row.cohort or row.highest_cohort != row.cohort):
+        return True
+    if row.other_entries >= settings.MATCH_SHARD_MIN_MATCHES:
+        return False
+    return None
+
+
+def load_owner_rows(db: Session, candidate: User, owner_ids: Optional[Iterable[int]] = None) -> List[Any]:
+    """
+    Load every user with a fresh stored list that could show the candidate.
+
+    The owner-side eligibility rules run in SQL (verified, not in a group, no
+    pending request with the candidate); the hard filters and distances are
+    checked by the caller.
+
+    Args:
+        db: Database session
+        candidate: User who may enter the owners' lists
+        owner_ids: Only consider these owners (all owners if None)
+
+    Returns:
+        Rows with id, the scoring, distance and hard-filter columns, cohort, and the
+        list's size, lowest score and computed_at, plus the number and
+        cohort range of the entries other than the candidate
+    """
+    listed = aliased(User)
+    other_cohort = case((UserMatchCandidate.candidate_id != candidate.id, listed.cohort))
+    lists = db.query(
+        UserMatchCandidate.user_id,
+        func.count(UserMatchCandidate.id).label("list_size"),
+        func.min(UserMatchCandidate.compatibility_score).label("lowest_score"),
+        func.min(UserMatchCandidate.computed_at).label("computed_at"),
+        func.count(case((UserMatchCandidate.candidate_id != candidate.id, 1))).label("other_entries"),
+        func.min(other_cohort).label("lowest_cohort"),
+        func.max(other_cohort).label("highest_cohort"),
+    ).join(
+        listed, listed.id == UserMatchCandidate.candidate_id
+    ).filter(
+        UserMatchCandidate.computed_at >= freshness_cutoff()
+    ).group_by(UserMatchCandidate.user_id).subquery()
+
+    in_active_group = exists().where(
+        GroupMember.user_id == User.id,
+        GroupMember.status == "active"
+    )
+
+    has_pending_request = exists().where(
+        MatchRequest.status == "pending",
+        or_(
+            and_(MatchRequest.from_user_id == candidate.id, MatchRequest.to_user_id == User.id),
+            and_(MatchRequest.from_user_id == User.id, MatchRequest.to_user_id == candidate.id),
+        )
+    )
+
+    query = db.query(
+        User.id,
+        User.age,
+        User.age_preference,
+        User.gender,
+        User.gender_preference,
+        User.commitment_level,
+        User.deal_breakers,
+        User.age_collab_only,
+        User.gender_collab_only,
+        User.interest_bits,
+        User.personality,
+        User.primary_goal,
+        User.latitude,
+        User.longitude,
+        User.max_distance,
+        User.cohort,
+        lists.c.list_size,
+        lists.c.lowest_score,
+        lists.c.computed_at,
+        lists.c.other_entries,
+        lists.c.lowest_cohort,
+        lists.c.highest_cohort,
+    ).join(
+        lists, lists.c.user_id == User.id
+    ).filter(
+        User.id != candidate.id,
+        User.email_verified == True,
+        ~in_active_group,
+        ~has_pending_request,
+    )
+
+    if owner_ids is not None:
+        query = query.filter(User.id.in_(list(owner_ids)))
+
+    return query.order_by(User.id).all()
+
+
+def _load_lists(db: Session, owner_ids: Iterable[int]) -> Dict[int, List[Entry]]:
+    rows = db.query(
+        UserMatchCandidate.user_id,
+        UserMatchCandidate.candidate_id,
+        UserMatchCandidate.compatibility_score,
+    ).filter(
+        UserMatchCandidate.user_id.in_(list(owner_ids))
+    ).all()
+
+    lists: Dict[int, List[Entry]] = {}
+    for row in rows:
+        lists.setdefault(row.user_id, []).append((row.candidate_id, row.compatibility_score))
+    return lists
+
+
+def _write_lists(db: Session, lists: Dict[int, Tuple[Any, List[Entry]]]) -> None:
+    """Replace owners' rows, keeping each list's original computed_at."""
+    if not lists:
+        return
+
+    db.query(UserMatchCandidate).filter(
+        UserMatchCandidate.user_id.in_(list(lists))
+    ).delete(synchronize_session=False)
+
+    db.add_all([
+        UserMatchCandidate(
+            user_id=owner_id,
+            candidate_id=candidate_id,
+            rank=rank,
+            compatibility_score=compatibility,
+            computed_at=computed_at,
+        )
+        for owner_id, (computed_at, entries) in lists.items()
+        for rank, (candidate_id, compatibility) in enumerate(entries)
+    ])
+
+
+def push_candidate(db: Session, candidate_id: int,
+                   owner_ids: Optional[Iterable[int]] = None) -> Tuple[List[int], List[int]]:
+    """
+    Insert or re-score a user in every stored list they now belong in.
+
+    Args:
+        db: Database session
+        candidate_id: User whose eligibility or profile changed
+        owner_ids: Only update these owners' lists (all owners if None)
+
+    Returns:
+        (owners whose list changed, owners whose list needs a full rebuild)
+    """
+    owner_ids = list(owner_ids) if owner_ids is not None else None
+    candidate = db.query(User).filter(User.id == candidate_id).first()
+    if not _is_eligible(db, candidate):
+        return pop_candidates(db, [candidate_id], owner_ids)
+
+    if candidate.interest_bits is None:
+        sync_interest_bits(db, candidate)
+        db.commit()
+
+    with metrics.stage("push.load"):
+        owners = load_owner_rows(db, candidate, owner_ids)
+        metrics.incr("stage.push.load.rows", len(owners))
+        nearby = within_mutual_distance(candidate, owners)
+        allowed = nearby & hard_filter_mask(candidate, owners)
+        metrics.filtered("push.distance", len(owners), nearby.sum())
+        metrics.filtered("push.hard_filters", nearby.sum(), allowed.sum())
+        # Exclusion is symmetric, so the candidate's set stands in for every owner's (up to Bloom false positives)
+        exclusions = load_exclusions(db, candidate_id)
+        if exclusions:
+            before = allowed.sum()
+            allowed &= ~exclusions.contains(np.array([row.id for row in owners], dtype=np.int64))
+            metrics.filtered("push.exclusions", before, allowed.sum())
+        owners = [row for row, keep in zip(owners, allowed) if keep]
+
+    rebuild: List[int] = []
+    if sharding_enabled():
+        fallback = {row.id: _is_fallback_list(row) for row in owners}
+        # Same-shard fallback lists may no longer need to fall back
+        rebuild = [
+            row.id for row in owners
+            if fallback[row.id] is None or fallback[row.id] and row.cohort == candidate.cohort
+        ]
+        owners = [
+            row for row in owners
+            if fallback[row.id] is (row.cohort != candidate.cohort)
+        ]
+
+    # Owners who can't see the candidate any more (e.g. changed preferences, location or shard)
+    showing = set(get_list_owners(db, [candidate_id], owner_ids))
+    hidden = showing - {row.id for row in owners} - set(rebuild)
+    changed, refill = pop_candidates(db, [candidate_id], hidden) if hidden else ([], [])
+    changed, refill = changed + rebuild, refill + rebuild
+
+    if not owners:
+        return changed, refill
+
+    # Scores are symmetric, so one pass scores the candidate for every owner
+    with metrics.stage("push.score"):
+        scores = compatibility_scores(candidate, CandidatePool(owners))
+    top_k = settings.MATCH_CANDIDATES_TOP_K
+
+    affected = {
+        row.id: (row, int(score))
+        for row, score in zip(owners, scores)
+        if row.id in showing or row.list_size < top_k or score >= row.lowest_score
+    }
+    if not affected:
+        return changed, refill
+
+    current = _load_lists(db, affected)
+    updated: Dict[int, Tuple[Any, List[Entry]]] = {}
+
+    for owner_id, (row, compatibility) in affected.items():
+        entries = current.get(owner_id, [])
+        others = [e for e in entries if e[0] != candidate_id]
+        was_full = len(entries) >= top_k
+        new_entry = (candidate_id, compatibility)
+
+        if was_full and others and len(others) == len(entries) - 1 and _entry_key(new_entry) > _entry_key(max(others, key=_entry_key)):
+            # The candidate dropped below every other stored entry; someone
+            # outside the list may now rank above them
+            updated[owner_id] = (row.computed_at, heapq.nsmallest(top_k, others, key=_entry_key))
+            refill.append(owner_id)
+            continue
+
+        merged = heapq.nsmallest(top_k, others + [new_entry], key=_entry_key)
+        if merged != sorted(entries, key=_entry_key):
+            updated[owner_id] = (row.computed_at, merged)
+
+    with metrics.stage("push.write"):
+        _write_lists(db, updated)
+        db.commit()
+
+    return sorted(set(changed) | set(updated)), sorted(set(refill))
+
+
+def pop_candidates(db: Session, candidate_ids: Iterable[int],
+                   owner_ids: Optional[Iterable[int]] = None) -> Tuple[List[int], List[int]]:
+    """
+    Remove users from the stored lists that show them.
+
+    Args:
+        db: Database session
+        candidate_ids: Users who are no longer eligible
+        owner_ids: Only update these owners' lists (all owners if None)
+
+    Returns:
+        (owners whose list changed, owners whose list needs a full rebuild)
+    """
+    candidate_ids = list(candidate_ids)
+    if not candidate_ids:
+        return [], []
+
+    changed: Set[int] = set(get_list_owners(db, candidate_ids, owner_ids))
+    if not changed:
+        return [], []
+
+    sizes = dict(db.query(
+        UserMatchCandidate.user_id,
+        func.count(UserMatchCandidate.id),
+    ).filter(
+        UserMatchCandidate.user_id.in_(changed)
+    ).group_by(UserMatchCandidate.user_id).all())
+
+    db.query(UserMatchCandidate).filter(
+        UserMatchCandidate.user_id.in_(changed),
+        UserMatchCandidate.candidate_id.in_(candidate_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    # Lists that were full may have had more candidates below the cut
+    refill = [owner_id for owner_id in changed if sizes.get(owner_id, 0) >= settings.MATCH_CANDIDATES_TOP_K]
+    if sharding_enabled():
+        # A shard that drops below the minimum falls back to the whole pool
+        remaining = dict(db.query(
+            UserMatchCandidate.user_id,
+            func.count(UserMatchCandidate.id),
+        ).filter(
+            UserMatchCandidate.user_id.in_(changed)
+        ).group_by(UserMatchCandidate.user_id).all())
+        refill += [
+            owner_id for owner_id in changed
+            if remaining.get(owner_id, 0) < settings.MATCH_SHARD_MIN_MATCHES and owner_id not in refill
+        ]
+    return sorted(changed), sorted(refill)
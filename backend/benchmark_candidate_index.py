@@ -0,0 +1,95 @@
+"""
+Recall benchmark for the approximate candidate index.
+
+Builds a synthetic in-memory population, then for a sample of users
+compares the top-k from brute-force scoring against the top-k after ANN
+retrieval + exact re-scoring. Recall counts a retrieved match as a hit
+when its score reaches the brute-force k-th best score, so ties don't
+count against the index.
+
+Usage: python benchmark_candidate_index.py --users 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.services.candidate_index import CandidateIndex
+from app.services.interest_service import encode_interest_bits
+from app.services.scoring_engine import PERSONALITY_TRAITS, COMPATIBLE_GOALS, CandidatePool, compatibility_scores
+
+GOALS = list(COMPATIBLE_GOALS)
+INTEREST_COUNT = 80
+
+
+def make_population(count: int, seed: int):
+    """Synthetic users with skewed interest popularity."""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(INTEREST_COUNT)]
+    users = []
+    for user_id in range(count):
+        interest_ids = set(rng.choices(range(INTEREST_COUNT), weights=weights, k=rng.randint(2, 7)))
+        users.append(SimpleNamespace(
+            id=user_id,
+            interest_bits=encode_interest_bits(interest_ids),
+            personality={trait: rng.randint(1, 10) for trait in PERSONALITY_TRAITS},
+            primary_goal=rng.choice(GOALS),
+        ))
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=300, help="ANN candidate budget")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    users = make_population(args.users, args.seed)
+    pool = CandidatePool(users)
+
+    started = time.perf_counter()
+    index = CandidateIndex()
+    for u in users:
+        index.insert(u.id, u.interest_bits, u.personality, u.primary_goal)
+    print(f"Indexed {args.users} users in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(args.seed + 1)
+    recall = {3: [], 20: []}
+    brute_time = ann_time = 0.0
+    retrieved = 0
+
+    for user in rng.sample(users, args.queries):
+        started = time.perf_counter()
+        scores = compatibility_scores(user, pool)
+        scores[user.id] = -1
+        brute_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        ids = [i for i in index.query(user, args.budget) if i != user.id]
+        ann_scores = compatibility_scores(user, CandidatePool([users[i] for i in ids]))
+        ann_time += time.perf_counter() - started
+        retrieved += len(ids)
+
+        exact = np.sort(scores)[::-1]
+        approx = np.sort(ann_scores)[::-1]
+        for k in recall:
+            threshold = exact[k - 1]
+            recall[k].append(float(np.mean(approx[:k] >= threshold)) if len(approx) >= k else len(approx) / k)
+
+    print(f"Queries: {args.queries}, average candidates retrieved: {retrieved / args.queries:.0f}")
+    for k, values in recall.items():
+        print(f"recall@{k}: {np.mean(values):.3f}")
+    print(f"Brute force: {1000 * brute_time / args.queries:.2f} ms/query")
+    print(f"ANN + exact re-score: {1000 * ann_time / args.queries:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Objective and runtime of the group-formation optimizer versus pool size.
+
+For each population size, builds a synthetic in-memory pool (same
+generator as benchmark_candidate_index, plus ages, genders, preferences
+and deal breakers) and reports the objective (total pairwise compatibility
+within groups) after the greedy phase and after local search, next to a
+random grouping that ignores compatibility and constraints.
+
+Usage: python benchmark_group_optimizer.py --sizes 1000,10000,100000
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmark_candidate_index import make_population
+from app.core.config import settings
+from app.services.group_optimizer import optimize_groups
+from app.services.scoring_engine import CandidatePool, compatibility_scores
+
+COMMITMENT_LEVELS = ['Just exploring', 'Semi serious', 'Fully committed', "Haven't decided"]
+PRONOUNS = ['She/her', 'He/him', 'They/them', 'Other', 'Prefer not to say']
+GENDER_PREFERENCES = [['Any'], ['Any'], ['Any'], ['Female'], ['Male'], ['Female', 'Non-binary']]
+DEAL_BREAKERS = ['No negativity', 'No flakiness', 'No ghosting', 'No political talk', 'No romantic intent']
+
+
+def add_constraints(users, seed: int) -> None:
+    """Give synthetic users ages, genders, preferences, commitment levels and deal breakers."""
+    rng = random.Random(seed)
+    for user in users:
+        user.age = rng.randint(18, 60)
+        low = rng.randint(18, max(18, user.age - 5))
+        user.age_preference = {"min": low, "max": low + rng.randint(10, 40)}
+        user.commitment_level = rng.choice(COMMITMENT_LEVELS)
+        user.deal_breakers = rng.sample(DEAL_BREAKERS, rng.randint(0, 2))
+        user.gender = rng.choice(PRONOUNS)
+        user.gender_preference = rng.choice(GENDER_PREFERENCES)
+        user.age_collab_only = rng.random() < 0.1
+        user.gender_collab_only = rng.random() < 0.1
+
+
+def random_objective(users, target_size: int, seed: int) -> float:
+    """Total pairwise score of random groups, for reference."""
+    order = list(users)
+    random.Random(seed).shuffle(order)
+    total = 0.0
+    for start in range(0, len(order) - target_size + 1, target_size):
+        group = order[start:start + target_size]
+        pool = CandidatePool(group)
+        for row, user in enumerate(group):
+            scores = compatibility_scores(user, pool)
+            total += (float(scores.sum()) - float(scores[row])) / 2.0
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated population sizes")
+    parser.add_argument("--target-size", type=int, default=settings.GROUP_PROPOSAL_TARGET_SIZE)
+    parser.add_argument("--time-budget", type=float, default=60.0, help="Local-search seconds per run")
+    parser.add_argument("--cluster-size", type=int, default=settings.GROUP_OPTIMIZER_CLUSTER_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'groups':>7} {'grouped':>8} {'random':>8} {'greedy':>8} {'final':>8} {'swaps':>7} {'seconds':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        users = make_population(size, args.seed)
+        add_constraints(users, args.seed)
+
+        groups, stats = optimize_groups(users, args.target_size, args.time_budget, args.cluster_size)
+        baseline = random_objective(users, args.target_size, args.seed)
+        group_count = max(1, stats['groups'])
+
+        print(
+            f"{size:>8} {stats['groups']:>7} {stats['grouped_users'] / size:>8.1%} "
+            f"{baseline / max(1, size // args.target_size):>8.1f} "
+            f"{stats['greedy_objective'] / group_count:>8.1f} "
+            f"{stats['objective'] / group_count:>8.1f} "
+            f"{stats['swaps']:>7} {stats['seconds']:>8.2f}"
+        )
+        print(f"{'':>8} objective: greedy {stats['greedy_objective']:.0f}, final {stats['objective']:.0f}")
+
+    print("random/greedy/final are the mean group score (sum of member-pair scores); 'grouped' is the share of users placed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Latency, throughput and memory of the matching engines at population scale.
+
+For each population size, inserts a seeded synthetic population
+(generate_population) into a scratch database, then runs the same sample
+of top-3 queries (for verified users outside groups) through each engine:
+
+- exhaustive: find_potential_matches scoring every eligible candidate
+- cascade: find_potential_matches with the bound-pruned cascade ranker
+- ann: find_potential_matches narrowed by the approximate candidate index
+- sharded: find_potential_matches restricted to the user's cohort shard
+- mapped: find_potential_matches reading the memory-mapped feature snapshot
+- stored: precomputed lists (recompute_all_matches, then get_stored_matches)
+
+and reports latency percentiles, queries per second, peak traced memory
+and, for engines that can differ from exhaustive scoring, how many top-3
+results they share with it. Results are written to a JSON file so runs
+can be compared over time.
+
+Without --database-url each size gets a fresh SQLite file; pass a scratch
+Postgres URL to benchmark against production-like storage. Never point it
+at a database with real users.
+
+Usage: python benchmark_matching.py --sizes 1000,10000,100000 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from generate_population import insert_population
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import Base
+from app.models.group import GroupMember
+from app.models.user import User
+from app.services.batch_matching import recompute_all_matches
+from app.services.candidate_index import build_candidate_index, candidate_index
+from app.services.feature_snapshot import feature_snapshots
+from app.services.interest_service import clear_vocabulary_cache
+from app.services.match_candidates_service import get_stored_matches
+from app.services.matching_service import find_potential_matches
+
+ENGINES = ["exhaustive", "cascade", "ann", "sharded", "mapped", "stored"]
+LIMIT = 3
+# Queries traced for peak memory (tracemalloc slows them down, so they are not timed)
+MEMORY_QUERIES = 10
+
+# Settings each engine runs with; everything else is disabled
+_ENGINE_SETTINGS = {
+    "exhaustive": {},
+    "cascade": {"MATCH_CASCADE_MIN_POOL": 0},
+    "ann": {"MATCH_ANN_MIN_POOL": 0},
+    "sharded": {"MATCH_SHARDING_ENABLED": True},
+    # MATCH_FEATURES_DIR is pointed at a scratch directory by benchmark_size
+    "mapped": {},
+    "stored": {},
+}
+_BASELINE_SETTINGS = {
+    "MATCH_CASCADE_MIN_POOL": sys.maxsize,
+    "MATCH_ANN_MIN_POOL": sys.maxsize,
+    "MATCH_SHARDING_ENABLED": False,
+    "MATCH_FEATURES_DIR": None,
+}
+
+
+@contextmanager
+def engine_settings(name: str):
+    """Apply an engine's settings for the duration of the block."""
+    overrides = {**_BASELINE_SETTINGS, **_ENGINE_SETTINGS[name]}
+    previous = {key: getattr(settings, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    values = np.array(latencies) * 1000.0
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def run_queries(query: Callable[[User], List[Dict[str, Any]]], users: List[User],
+                warmup: int) -> Dict[str, Any]:
+    """
+    Time a query function over a sample of users, then trace its peak memory.
+
+    Args:
+        query: Function returning a user's top matches
+        users: Users to query for, in order
+        warmup: Untimed queries run first
+
+    Returns:
+        Latency percentiles, throughput, peak memory and the results per user
+    """
+    for user in users[:warmup]:
+        query(user)
+
+    results = {}
+    latencies = []
+    started = time.perf_counter()
+    for user in users:
+        query_started = time.perf_counter()
+        results[user.id] = [m["user_id"] for m in query(user)]
+        latencies.append(time.perf_counter() - query_started)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for user in users[:MEMORY_QUERIES]:
+        query(user)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "queries": len(users),
+        **percentiles(latencies),
+        "queries_per_second": len(users) / elapsed,
+        "peak_traced_mb": peak / 2 ** 20,
+        "results": results,
+    }
+
+
+def agreement(results: Dict[int, List[int]], baseline: Dict[int, List[int]]) -> float:
+    """Mean share of the baseline top-3 an engine also returned."""
+    shares = [
+        len(set(results[user_id]) & set(expected)) / len(expected)
+        for user_id, expected in baseline.items() if expected
+    ]
+    return float(np.mean(shares)) if shares else 1.0
+
+
+def benchmark_size(database_url: str, size: int, engines: List[str], args) -> Dict[str, Any]:
+    """Insert a population of the given size and benchmark every engine on it."""
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    clear_vocabulary_cache()
+    db = sessionmaker(bind=engine)()
+
+    try:
+        population = insert_population(db, size, args.seed, grouped_fraction=args.grouped_fraction,
+                                       request_fraction=args.request_fraction)
+        print(f"{size:>8} users inserted in {population['seconds']:.2f}s "
+              f"({population['users'] / population['seconds']:,.0f} users/s)")
+
+        # GET /api/matches only serves verified users outside groups
+        grouped = select(GroupMember.user_id).where(GroupMember.status == "active")
+        askers = [row.id for row in db.query(User.id).filter(
+            User.email_verified == True, User.id.not_in(grouped)
+        ).order_by(User.id)]
+        sample_ids = random.Random(args.seed).sample(askers, min(args.queries, len(askers)))
+        users = db.query(User).filter(User.id.in_(sample_ids)).all()
+        users.sort(key=lambda u: sample_ids.index(u.id))
+
+        run: Dict[str, Any] = {
+            "users": size,
+            "groups": population["groups"],
+            "pending_requests": population["requests"],
+            "insert_seconds": population["seconds"],
+            "insert_users_per_second": population["users"] / population["seconds"],
+            "engines": {},
+        }
+        baseline = None
+        for name in engines:
+            if name == "stored" and size > args.max_batch_users:
+                run["engines"][name] = {"skipped": f"more than {args.max_batch_users} users"}
+                continue
+
+            metrics.reset()
+            with engine_settings(name):
+                extra: Dict[str, Any] = {}
+                if name == "ann":
+                    started = time.perf_counter()
+                    build_candidate_index(db)
+                    extra["index_build_seconds"] = time.perf_counter() - started
+                if name == "mapped":
+                    settings.MATCH_FEATURES_DIR = tempfile.mkdtemp(prefix="features-")
+                    published = feature_snapshots.publish(db)
+                    extra["publish_seconds"] = published["seconds"]
+                    extra["snapshot_mb"] = published["bytes"] / 2 ** 20
+                if name == "stored":
+                    stats = recompute_all_matches(db, workers=args.workers, top_k=settings.MATCH_CANDIDATES_TOP_K)
+                    extra["recompute_seconds"] = stats["load_seconds"] + stats["score_seconds"]
+                    extra["recompute_pairs_per_second"] = stats["pairs_per_second"]
+                    query = lambda user: get_stored_matches(db, user.id, LIMIT) or []
+                else:
+                    query = lambda user: find_potential_matches(db, user, limit=LIMIT)
+
+                try:
+                    result = run_queries(query, users, args.warmup)
+                finally:
+                    if name == "ann":
+                        candidate_index.clear()
+                    if name == "mapped":
+                        feature_snapshots.clear()
+                        shutil.rmtree(settings.MATCH_FEATURES_DIR, ignore_errors=True)
+
+            results = result.pop("results")
+            if name == "exhaustive":
+                baseline = results
+            elif baseline is not None:
+                result["top3_agreement"] = agreement(results, baseline)
+            result.update(extra)
+            result["counters"] = metrics.snapshot()
+            run["engines"][name] = result
+
+            print(f"{'':>8} {name:<11} p50 {result['p50_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  "
+                  f"{result['queries_per_second']:>8.1f} q/s  peak {result['peak_traced_mb']:>7.1f} MB"
+                  + (f"  agreement {result['top3_agreement']:.3f}" if "top3_agreement" in result else ""))
+        return run
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def git_commit() -> str:
+    """Current commit of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated population sizes (1k to 1M)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"Comma-separated subset of {ENGINES}")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per engine")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed queries per engine")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--grouped-fraction", type=float, default=0.2)
+    parser.add_argument("--request-fraction", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for the stored engine")
+    parser.add_argument("--max-batch-users", type=int, default=100000,
+                        help="Skip the stored engine (all-pairs recompute) above this size")
+    parser.add_argument("--database-url", help="Scratch database (a fresh SQLite file per size if omitted)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Results file (JSON)")
+    args = parser.parse_args()
+
+    engines = [e for e in args.engines.split(",") if e]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+
+    runs = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for size in (int(s) for s in args.sizes.split(",")):
+            database_url = args.database_url or f"sqlite:///{scratch}/population_{size}.db"
+            runs.append(benchmark_size(database_url, size, engines, args))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10),
+        "limit": LIMIT,
+        "seed": args.seed,
+        "database": "sqlite" if not args.database_url else create_engine(args.database_url).dialect.name,
+        "runs": runs,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Insert a seeded synthetic user population for load testing matching.
+
+Profiles follow the onboarding options (constants/profileOptions.js and
+the onboarding screens) with skewed, realistic distributions: a few
+popular interests and goals, personality traits around the middle of the
+scale, ages skewed towards the twenties, and cities weighted towards the
+big ones in the gazetteer. Users are written with bulk inserts in
+batches, already carrying the interest bitsets, coordinates and cohort
+keys signup would compute; a share of them is placed in groups or given
+pending match requests so the eligibility filters have work to do.
+
+The same seed always produces the same population. Synthetic users have
+@synthetic.bridge emails and can be removed with --clear.
+
+Usage: python generate_population.py --users 100000 --seed 1
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.security import hash_password
+from app.models.group import Group, GroupMember
+from app.models.match import MatchRequest
+from app.models.user import User
+from app.services.cohort_service import cohort_key
+from app.services.geo_service import GAZETTEER_PATH, encode_geohash
+from app.services.interest_service import encode_interest_bits, get_interest_ids
+from app.services.scoring_engine import PERSONALITY_TRAITS
+
+EMAIL_DOMAIN = "synthetic.bridge"
+PASSWORD = "Synthetic2024!"
+
+# Onboarding options, most popular first
+GOALS = [
+    'Meet people with similar interests', 'Build a professional skill set', 'Switch industries',
+    'Land my first graduate role', 'Launch a startup', 'Settling into a new city',
+    'Fitness & physical health', 'Build a side project/app', 'Get promoted/grow in my current role',
+    'Building better habits & self-improvement', 'Mental health & emotional wellbeing',
+    'Grow a brand/audience', 'Launch a social enterprise',
+]
+INTERESTS = [
+    'Technology', 'Music', 'Travel', 'Food & Drink', 'Sport', 'Film & Video', 'Business', 'Wellbeing',
+    'Reading', 'Gaming', 'Outdoor & Adventure', 'Art & Design', 'Photography', 'Psychology',
+    'Media & Pop Culture', 'Science', 'Writing', 'Nature & Animals', 'Social Impact', 'Environment',
+    'Languages', 'Politics', 'Humanities', 'Architecture', 'Law',
+]
+MAX_INTERESTS = 5
+COMMITMENT_LEVELS = ['Just exploring', 'Semi serious', 'Fully committed', "Haven't decided"]
+PRONOUNS = ['She/her', 'He/him', 'They/them', 'Other', 'Prefer not to say']
+PRONOUN_WEIGHTS = [45, 42, 7, 2, 4]
+GENDER_PREFERENCES = [['Any'], ['Female'], ['Male'], ['Female', 'Non-binary'], ['Male', 'Non-binary']]
+GENDER_PREFERENCE_WEIGHTS = [80, 9, 6, 3, 2]
+DEAL_BREAKERS = ['No negativity', 'No flakiness', 'No ghosting', 'No political talk', 'No romantic intent']
+MAX_DISTANCES = [5, 10, 25, 50, 100, 500]
+MAX_DISTANCE_WEIGHTS = [10, 20, 30, 20, 15, 5]
+PROFESSIONS = ['Software Engineer', 'Designer', 'Student', 'Teacher', 'Marketing Manager', 'Nurse',
+               'Consultant', 'Data Analyst', 'Founder', 'Accountant', 'Researcher', 'Writer']
+
+
+def _zipf_weights(count: int, exponent: float = 1.0) -> List[float]:
+    return [1.0 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def load_cities() -> List[Dict[str, Any]]:
+    """Gazetteer cities with their coordinates, geohashes and countries."""
+    with open(GAZETTEER_PATH, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    cities = []
+    for row in rows:
+        latitude, longitude = float(row["latitude"]), float(row["longitude"])
+        cities.append({
+            "location": row["city"],
+            "country": row["country"],
+            "latitude": latitude,
+            "longitude": longitude,
+            "geohash": encode_geohash(latitude, longitude),
+        })
+    return cities
+
+
+def generate_profiles(count: int, seed: int, interest_ids: Dict[str, int],
+                      first_id: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Yield synthetic user rows ready for a bulk insert.
+
+    Args:
+        count: Number of users
+        seed: Random seed; the same seed gives the same users
+        interest_ids: Interest vocabulary IDs for INTERESTS
+        first_id: Number of the first user (keeps emails unique across runs)
+
+    Yields:
+        Column dictionaries for the users table
+    """
+    rng = random.Random(seed)
+    cities = load_cities()
+    # A handful of big cities hold most users, as in real launches
+    city_weights = _zipf_weights(len(cities), 0.8)
+    rng.shuffle(city_weights)
+    interest_weights = _zipf_weights(len(INTERESTS), 0.7)
+    goal_weights = _zipf_weights(len(GOALS), 0.6)
+    password_hash = hash_password(PASSWORD)
+
+    for n in range(first_id, first_id + count):
+        interests = set()
+        for _ in range(rng.randint(2, MAX_INTERESTS)):
+            interests.add(rng.choices(INTERESTS, weights=interest_weights)[0])
+        interests = sorted(interests)
+
+        age = min(60, 18 + int(rng.lognormvariate(2.1, 0.6)))
+        low = max(18, age - rng.randint(2, 10))
+        goal = rng.choices(GOALS, weights=goal_weights)[0]
+        city = rng.choices(cities, weights=city_weights)[0]
+
+        yield {
+            "email": f"user{n}@{EMAIL_DOMAIN}",
+            "password_hash": password_hash,
+            "email_verified": rng.random() < 0.95,
+            "first_name": f"Synthetic{n}",
+            "surname": "User",
+            "age": age,
+            "profession": rng.choice(PROFESSIONS),
+            "primary_goal": goal,
+            "interests": interests,
+            "interest_bits": encode_interest_bits(interest_ids[i] for i in interests),
+            "personality": {
+                trait: min(10, max(1, round(rng.gauss(6, 2))))
+                for trait in PERSONALITY_TRAITS
+                if rng.random() > 0.02
+            },
+            "gender": rng.choices(PRONOUNS, weights=PRONOUN_WEIGHTS)[0],
+            "gender_preference": rng.choices(GENDER_PREFERENCES, weights=GENDER_PREFERENCE_WEIGHTS)[0],
+            "age_preference": {"min": low, "max": age + rng.randint(2, 15)},
+            "age_collab_only": rng.random() < 0.05,
+            "gender_collab_only": rng.random() < 0.05,
+            "commitment_level": rng.choice(COMMITMENT_LEVELS),
+            "deal_breakers": rng.sample(DEAL_BREAKERS, rng.choice([0, 0, 1, 1, 2])),
+            "location": city["location"],
+            "country": city["country"],
+            "latitude": city["latitude"],
+            "longitude": city["longitude"],
+            "geohash": city["geohash"],
+            "max_distance": rng.choices(MAX_DISTANCES, weights=MAX_DISTANCE_WEIGHTS)[0],
+            "cohort": cohort_key(city["country"], goal),
+        }
+
+
+def _batches(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_population(db: Session, count: int, seed: int = 1, batch_size: int = 10000,
+                      grouped_fraction: float = 0.2, request_fraction: float = 0.05) -> Dict[str, Any]:
+    """
+    Bulk insert a synthetic population.
+
+    Args:
+        db: Database session
+        count: Number of users
+        seed: Random seed
+        batch_size: Rows per INSERT batch
+        grouped_fraction: Share of users placed in groups of four
+        request_fraction: Pending match requests per user
+
+    Returns:
+        Dictionary with users, groups, requests, user_ids and seconds
+    """
+    started = time.perf_counter()
+    interest_ids = {name: get_interest_ids(db, [name])[0] for name in INTERESTS}
+    first_id = db.query(User).filter(User.email.like(f"%@{EMAIL_DOMAIN}")).count()
+
+    user_ids: List[int] = []
+    for batch in _batches(generate_profiles(count, seed, interest_ids, first_id), batch_size):
+        user_ids.extend(db.scalars(insert(User).returning(User.id), batch))
+        db.commit()
+
+    rng = random.Random(seed + 1)
+    grouped = rng.sample(user_ids, int(len(user_ids) * grouped_fraction) // 4 * 4)
+    group_ids = list(db.scalars(insert(Group).returning(Group.id), [{} for _ in range(len(grouped) // 4)]))
+    members = [
+        {"group_id": group_ids[i // 4], "user_id": user_id, "status": "active"}
+        for i, user_id in enumerate(grouped)
+    ]
+    for batch in _batches(iter(members), batch_size):
+        db.execute(insert(GroupMember), batch)
+
+    requests = []
+    for _ in range(int(len(user_ids) * request_fraction)):
+        sender, receiver = rng.sample(user_ids, 2)
+        requests.append({"from_user_id": sender, "to_user_id": receiver, "status": "pending"})
+    for batch in _batches(iter(requests), batch_size):
+        db.execute(insert(MatchRequest), batch)
+    db.commit()
+
+    return {
+        "users": len(user_ids),
+        "groups": len(group_ids),
+        "requests": len(requests),
+        "user_ids": user_ids,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def clear_population(db: Session) -> int:
+    """
+    Delete every synthetic user, their memberships and requests, and groups left empty.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of users deleted
+    """
+    synthetic = select(User.id).where(User.email.like(f"%@{EMAIL_DOMAIN}"))
+    group_ids = select(GroupMember.group_id).where(GroupMember.user_id.in_(synthetic))
+    emptied = [
+        group_id for group_id in db.scalars(group_ids.distinct())
+        if not db.query(GroupMember).filter(
+            GroupMember.group_id == group_id, GroupMember.user_id.not_in(synthetic)
+        ).count()
+    ]
+
+    db.execute(delete(GroupMember).where(GroupMember.user_id.in_(synthetic)))
+    db.execute(delete(Group).where(Group.id.in_(emptied)))
+    db.execute(delete(MatchRequest).where(
+        MatchRequest.from_user_id.in_(synthetic) | MatchRequest.to_user_id.in_(synthetic)
+    ))
+    deleted = db.execute(delete(User).where(User.email.like(f"%@{EMAIL_DOMAIN}"))).rowcount
+    db.commit()
+
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000, help="Users to insert (1k to 1M)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per INSERT batch")
+    parser.add_argument("--grouped-fraction", type=float, default=0.2, help="Share of users put in groups")
+    parser.add_argument("--request-fraction", type=float, default=0.05, help="Pending requests per user")
+    parser.add_argument("--clear", action="store_true", help="Delete synthetic users instead of adding them")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        if args.clear:
+            print(f"Deleted {clear_population(db)} synthetic users")
+            return
+        stats = insert_population(db, args.users, args.seed, args.batch_size,
+                                  args.grouped_fraction, args.request_fraction)
+    finally:
+        db.close()
+
+    print(f"Inserted {stats['users']} users, {stats['groups']} groups and {stats['requests']} pending requests "
+          f"in {stats['seconds']:.2f}s ({stats['users'] / stats['seconds']:,.0f} users/s)")
+    print(f"Synthetic users log in with password {PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Recompute every user's stored match list with a process pool.
+
+Meant for nightly runs and backfills: scores the whole eligible pool
+exhaustively, replaces user_match_candidates, and reports throughput.
+
+Usage: python recompute_matches.py --workers 8
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.services.batch_matching import recompute_all_matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--top-k", type=int, default=settings.MATCH_CANDIDATES_TOP_K, help="Candidates stored per user")
+    parser.add_argument("--dry-run", action="store_true", help="Score but don't write the results")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        stats = recompute_all_matches(db, workers=args.workers, top_k=args.top_k, write=not args.dry_run)
+    finally:
+        db.close()
+
+    print(f"Users: {stats['users']}, workers: {stats['workers']}")
+    if stats['shards']:
+        print(f"Cohort shards: {stats['shards']}, users falling back to the whole pool: {stats['fallback_users']}")
+    print(f"Loaded features in {stats['load_seconds']:.2f}s")
+    print(f"Scored {stats['pairs']} pairs in {stats['score_seconds']:.2f}s ({stats['pairs_per_second']:,.0f} pairs/s)")
+    if args.dry_run:
+        print("Dry run: stored lists left unchanged")
+    else:
+        print(f"Wrote {stats['rows_written']} rows in {stats['write_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
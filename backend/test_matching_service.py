@@ -0,0 +1,1302 @@
+"""
+Tests for the matching service.
+
+Run with: python -m pytest test_matching_service.py
+"""
+import json
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+# Point the app at a throwaway SQLite database before any app module loads
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bridge_test.db"
+
+from app.main import app  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.group import Group, GroupMember, GroupProposal  # noqa: E402
+from app.models.match import MatchRequest  # noqa: E402
+from app.services.matching_service import (  # noqa: E402
+    calculate_interest_score,
+    calculate_interest_bits_score,
+    calculate_personality_score,
+    calculate_goal_score,
+    calculate_compatibility_score,
+    backfill_request_scores,
+    calculate_score_breakdown,
+    find_potential_matches,
+    matches_preferences,
+    violates_deal_breakers,
+)
+from app.core import metrics  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.services.batch_matching import recompute_all_matches  # noqa: E402
+from app.services.group_optimizer import (  # noqa: E402
+    form_group_proposals,
+    load_optimizer_users,
+    optimize_groups,
+)
+from app.services.candidate_index import build_candidate_index, candidate_index  # noqa: E402
+from app.services.cohort_service import sync_cohort  # noqa: E402
+from app.services.geo_service import (  # noqa: E402
+    distances_km,
+    geohash_cover,
+    resolve_location,
+    sync_coordinates,
+)
+from app.services.interest_service import (  # noqa: E402
+    clear_vocabulary_cache,
+    encode_interest_bits,
+    sync_interest_bits,
+)
+from app.services.match_cache import MatchCache, match_cache  # noqa: E402
+from app.services.match_snapshots import match_snapshots  # noqa: E402
+from app.services.feature_snapshot import feature_snapshots  # noqa: E402
+from app.services.eligibility import eligibility  # noqa: E402
+from app.services import match_warmup  # noqa: E402
+from app.services.match_worker import match_worker  # noqa: E402
+from app.core.security import hash_password  # noqa: E402
+from app.models.match import UserMatchCandidate  # noqa: E402
+from app.services.match_candidates_service import (  # noqa: E402
+    rebuild_match_candidates,
+    get_stored_matches,
+)
+from app.services.matching_service import load_eligible_candidates, rank_pool, rank_potential_matches  # noqa: E402
+from app.services.topk_maintenance import push_candidate, pop_candidates  # noqa: E402
+from app.services.scoring_engine import (  # noqa: E402
+    PERSONALITY_TRAITS,
+    CandidatePool,
+    score_components,
+    compatibility_scores,
+    rank_candidates,
+)
+from app.services.cascade_ranker import rank_top_k  # noqa: E402
+from app.services.hard_filters import HardFilters, hard_filter_mask  # noqa: E402
+from app.services.pair_scores import get_pair_scores, pair_score_matrix  # noqa: E402
+from app.models.match import PairScore  # noqa: E402
+from app.models.group import GroupCentroid  # noqa: E402
+from app.services.group_matching import (  # noqa: E402
+    GroupFeatures,
+    backfill_group_centroids,
+    centroid_components,
+    centroid_scores,
+    rebuild_group_centroid,
+    suggest_group_members,
+)
+from app.services.geo_service import within_mutual_distance  # noqa: E402
+from app.models.match import LobbyEntry, LobbyProposal  # noqa: E402
+from app.services import lobby_service  # noqa: E402
+from app.services.exclusion_sets import ExclusionSet, backfill_exclusions, load_exclusions  # noqa: E402
+
+INTERESTS = ["technology", "hiking", "photography", "music", "art", "coffee", "travel", "Gaming", "Yoga"]
+GOALS = [
+    "networking", "professional_development", "mentorship",
+    "friendship", "socialising", "hobbies", "Creative collaboration", None,
+]
+
+
+def profile(user_id: int, interests, personality, primary_goal) -> SimpleNamespace:
+    """In-memory profile with interest bits from a local vocabulary."""
+    return SimpleNamespace(
+        id=user_id,
+        interests=interests,
+        interest_bits=encode_interest_bits(INTERESTS.index(i) for i in interests),
+        personality=personality,
+        primary_goal=primary_goal,
+    )
+
+
+def make_random_user(rng: random.Random, user_id: int) -> SimpleNamespace:
+    """Random profile, including the edge cases the scalar scorer handles."""
+    personality = {
+        trait: rng.randint(1, 10)
+        for trait in PERSONALITY_TRAITS
+        if rng.random() > 0.15
+    }
+    return profile(
+        user_id,
+        [rng.choice(INTERESTS) for _ in range(rng.randint(0, 6))],
+        personality,
+        rng.choice(GOALS),
+    )
+
+
+@pytest.fixture
+def db():
+    """Fresh schema for every test."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    clear_vocabulary_cache()
+    match_cache.clear()
+    match_snapshots.clear()
+    feature_snapshots.clear()
+    eligibility.clear()
+    match_warmup.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def add_user(db, rng: random.Random, n: int, **overrides) -> User:
+    """Insert a verified user with a random profile, as signup would."""
+    fields = dict(
+        email=f"user{n}@test.com",
+        password_hash="x",
+        email_verified=True,
+        first_name=f"User{n}",
+        surname="Test",
+        age=rng.randint(20, 40),
+        profession="Tester",
+        primary_goal=rng.choice(GOALS[:-1]),
+        interests=rng.sample(INTERESTS, 3),
+        personality={trait: rng.randint(1, 10) for trait in PERSONALITY_TRAITS},
+        gender_preference=["any"],
+        age_preference={"min": 18, "max": 100},
+        location="London",
+    )
+    fields.update(overrides)
+    user = User(**fields)
+    sync_interest_bits(db, user)
+    sync_coordinates(user)
+    sync_cohort(user)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def populate(db, rng: random.Random, me: User, start: int, count: int) -> None:
+    """Add users, some of them grouped or with pending requests."""
+    for n in range(start, start + count):
+        other = add_user(db, rng, n)
+        if n % 5 == 0:
+            group = Group()
+            db.add(group)
+            db.flush()
+            db.add(GroupMember(group_id=group.id, user_id=other.id, status="active"))
+        elif n % 7 == 0:
+            db.add(MatchRequest(from_user_id=other.id, to_user_id=me.id, status="pending"))
+        db.commit()
+
+
+def is_grouped(db, user_id: int) -> bool:
+    """Whether a user is in an active group."""
+    return db.query(GroupMember).filter(GroupMember.user_id == user_id, GroupMember.status == "active").first() is not None
+
+
+def stored_list(db, owner_id: int):
+    """A user's stored (candidate, score) list in rank order."""
+    rows = db.query(UserMatchCandidate).filter(
+        UserMatchCandidate.user_id == owner_id
+    ).order_by(UserMatchCandidate.rank).all()
+    return [(r.candidate_id, r.compatibility_score) for r in rows]
+
+
+def test_batch_scores_match_scalar_scores_exactly():
+    """Every component and the rounded total must be bit-identical."""
+    rng = random.Random(42)
+    users = [make_random_user(rng, i) for i in range(300)]
+    pool = CandidatePool(users)
+
+    for user in users[:40]:
+        interest, personality, goal = score_components(user, pool)
+        totals = compatibility_scores(user, pool)
+
+        for row, other in enumerate(users):
+            assert interest[row] == calculate_interest_score(user.interests, other.interests)
+            assert interest[row] == calculate_interest_bits_score(user.interest_bits, other.interest_bits)
+            assert personality[row] == calculate_personality_score(user.personality, other.personality)
+            assert goal[row] == calculate_goal_score(user.primary_goal, other.primary_goal)
+            assert totals[row] == calculate_compatibility_score(user, other)
+
+
+def test_cascade_ranking_matches_exhaustive_ranking():
+    """Bound-based pruning returns exactly the exhaustive top K, ties included."""
+    rng = random.Random(7)
+    users = [make_random_user(rng, i) for i in range(2000)]
+    pool = CandidatePool(users)
+
+    before = metrics.snapshot()
+    for user in users[:30]:
+        scores = compatibility_scores(user, pool)
+        for limit in (1, 3, 20, 500):
+            rows, top_scores = rank_top_k(user, pool, limit)
+            expected = rank_candidates(scores, limit)
+            assert rows.tolist() == expected.tolist()
+            assert top_scores.tolist() == scores[expected].tolist()
+
+    pruned = metrics.get("match_cascade.bound_pruned") - before.get("match_cascade.bound_pruned", 0)
+    scored = metrics.get("match_cascade.scored") - before.get("match_cascade.scored", 0)
+    assert pruned > scored
+
+
+def test_upper_triangular_matrix_matches_ordered_scoring():
+    """Scoring each pair once and mirroring equals scoring every ordered pair."""
+    rng = random.Random(5)
+    users = [make_random_user(rng, i) for i in range(300)]
+    pool = CandidatePool(users)
+
+    matrix = pair_score_matrix(users)
+    assert (matrix == matrix.T).all()
+    for row, user in enumerate(users):
+        expected = compatibility_scores(user, pool)
+        expected[row] = 0
+        assert matrix[row].tolist() == expected.tolist()
+
+
+def test_pair_scores_are_stored_once_and_follow_profile_versions(db):
+    """Both directions read one row; editing a scored field recomputes it."""
+    rng = random.Random(23)
+    users = [add_user(db, rng, n) for n in range(6)]
+    me, others = users[0], users[1:]
+    before = metrics.snapshot()
+
+    first = get_pair_scores(db, me, others)
+    db.commit()
+    for other in others:
+        assert first[other.id][0] == calculate_compatibility_score(me, other)
+        assert get_pair_scores(db, other, [me])[me.id] == first[other.id]
+    assert db.query(PairScore).count() == len(others)
+    assert metrics.get("pair_scores.computed") - before.get("pair_scores.computed", 0) == len(others)
+    assert metrics.get("pair_scores.hits") - before.get("pair_scores.hits", 0) == len(others)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': others[0].id})}"}
+    response = TestClient(app).put("/api/user/profile", headers=headers, json={"interests": ["Yoga", "Gaming"]})
+    assert response.status_code == 200
+    db.expire_all()
+    assert others[0].profile_version == 2
+
+    again = get_pair_scores(db, me, others)
+    db.commit()
+    assert again[others[0].id][0] == calculate_compatibility_score(me, others[0])
+    assert again[others[0].id][1]["interests"] != first[others[0].id][1]["interests"]
+    assert metrics.get("pair_scores.computed") - before.get("pair_scores.computed", 0) == len(others) + 1
+    assert db.query(PairScore).count() == len(others)
+
+
+def test_hard_filter_index_matches_scalar_checks():
+    """Index lookups and masks equal matches_preferences/deal breakers both ways."""
+    rng = random.Random(11)
+    pronouns = ["She/her", "He/him", "They/them", "Other", "Prefer not to say", None]
+    preferences = [["Any"], ["any"], [], ["Female"], ["Male", "Non-binary"], ["Other"]]
+    users = []
+    for i in range(400):
+        low = rng.randint(18, 50)
+        users.append(SimpleNamespace(
+            id=i,
+            age=rng.randint(18, 70),
+            age_preference=rng.choice([None, {"min": low, "max": low + rng.randint(0, 30)}, {"max": 40}]),
+            gender=rng.choice(pronouns),
+            gender_preference=rng.choice(preferences),
+            commitment_level=rng.choice(["Just exploring", "Semi serious", None]),
+            deal_breakers=rng.sample(["No flakiness", "No ghosting", "No negativity"], rng.randint(0, 2)),
+            age_collab_only=rng.random() < 0.2,
+            gender_collab_only=rng.random() < 0.2,
+        ))
+    filters = HardFilters(users)
+
+    for row, user in enumerate(users[:60]):
+        expected = [
+            other.id for other in users
+            if matches_preferences(user, other) and matches_preferences(other, user)
+            and not violates_deal_breakers(user, other) and not violates_deal_breakers(other, user)
+        ]
+        assert np.flatnonzero(hard_filter_mask(user, users)).tolist() == expected
+        assert filters.candidates(filters, row).tolist() == expected
+
+
+def test_user_features_outside_pool_vocabulary():
+    """Interests and goals no candidate has still score correctly."""
+    others = [
+        profile(1, ["hiking"], {"openness": 3}, "networking"),
+        profile(2, [], {}, "mentorship"),
+    ]
+    user = profile(0, ["hiking", "Yoga"], {"openness": 7, "extroversion": 2}, "professional_development")
+
+    totals = compatibility_scores(user, CandidatePool(others))
+
+    assert list(totals) == [calculate_compatibility_score(user, other) for other in others]
+
+
+def test_candidate_query_applies_eligibility_rules(db):
+    """Grouped, pending, rejected, unverified, out-of-range and mutually unwanted users are filtered."""
+    rng = random.Random(1)
+    me = add_user(db, rng, 0, age=28, age_preference={"min": 25, "max": 35}, gender="They/them",
+                  commitment_level="Just exploring")
+    grouped = add_user(db, rng, 1, age=30)
+    pending = add_user(db, rng, 2, age=30)
+    unverified = add_user(db, rng, 3, age=30, email_verified=False)
+    too_old = add_user(db, rng, 4, age=50)
+    rejected = add_user(db, rng, 5, age=30)
+    eligible = add_user(db, rng, 6, age=30)
+    add_user(db, rng, 7, age=30, gender="He/him", gender_preference=["Male"])
+    add_user(db, rng, 8, age=30, age_preference={"min": 40, "max": 50})
+    add_user(db, rng, 9, age=30, gender_collab_only=True, gender="She/her")
+    add_user(db, rng, 10, age=30, deal_breakers=["No flakiness"])
+
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add(GroupMember(group_id=group.id, user_id=grouped.id, status="active"))
+    db.add(MatchRequest(from_user_id=me.id, to_user_id=pending.id, status="pending"))
+    db.add(MatchRequest(from_user_id=rejected.id, to_user_id=me.id, status="rejected"))
+    db.commit()
+    assert backfill_exclusions(db) == 2
+
+    matches = find_potential_matches(db, me)
+
+    assert {m["user_id"] for m in matches} == {eligible.id}
+    assert unverified.id not in {m["user_id"] for m in matches}
+    assert too_old.id not in {m["user_id"] for m in matches}
+
+
+def test_users_without_interest_bits_are_backfilled(db):
+    """Rows from before interest bitsets existed still score correctly."""
+    rng = random.Random(3)
+    me = add_user(db, rng, 0, interests=["hiking", "music"])
+    legacy = add_user(db, rng, 1, interests=["music", "art"])
+    legacy.interest_bits = None
+    db.commit()
+
+    matches = find_potential_matches(db, me)
+
+    db.refresh(legacy)
+    assert legacy.interest_bits is not None
+    assert matches[0]["compatibility_score"] == calculate_compatibility_score(
+        SimpleNamespace(interests=me.interests, personality=me.personality, primary_goal=me.primary_goal),
+        SimpleNamespace(interests=legacy.interests, personality=legacy.personality, primary_goal=legacy.primary_goal),
+    )
+
+
+def test_matches_endpoint_query_count_is_constant(db):
+    """GET /api/matches issues the same number of queries at any pool size."""
+    rng = random.Random(7)
+    me = add_user(db, rng, 0)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    client = TestClient(app)
+
+    populate(db, rng, me, 1, 10)
+    match_cache.clear()
+    with count_queries() as small:
+        response = client.get("/api/matches", headers=headers)
+    assert response.status_code == 200
+
+    populate(db, rng, me, 11, 200)
+    match_cache.clear()
+    with count_queries() as large:
+        response = client.get("/api/matches", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+    assert len(large) == len(small)
+
+
+def test_matches_endpoint_reads_stored_list(db):
+    """A fresh stored list gives the live ranking; new requests patch it."""
+    rng = random.Random(11)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 30)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    client = TestClient(app)
+
+    live = client.get("/api/matches", headers=headers).json()
+
+    rebuild_match_candidates(db, me.id)
+    stored = client.get("/api/matches", headers=headers).json()
+    assert stored == live
+
+    response = client.post("/api/matches/request", headers=headers, json={"to_user_id": live[0]["user_id"]})
+    assert response.status_code == 200
+    assert get_stored_matches(db, me.id, 3) == find_potential_matches(db, me, 3)
+    assert live[0]["user_id"] not in {m["user_id"] for m in client.get("/api/matches", headers=headers).json()}
+
+
+def test_streamed_matches_send_provisional_then_final(db):
+    """The stream answers from a stale list first and ends with the sync endpoint's top 3."""
+    rng = random.Random(13)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 40)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    client = TestClient(app)
+
+    def stream():
+        response = client.get("/api/matches/stream", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    # No stored list: the live ranking is the only line
+    assert [line["stage"] for line in stream()] == ["final"]
+
+    rebuild_match_candidates(db, me.id)
+    stale = get_stored_matches(db, me.id, 3)
+    db.query(UserMatchCandidate).update({"computed_at": UserMatchCandidate.computed_at - timedelta(days=1)})
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add(GroupMember(group_id=group.id, user_id=stale[0]["user_id"], status="active"))
+    db.commit()
+    match_cache.clear()
+
+    provisional, final = stream()
+    assert provisional["stage"] == "provisional" and final["stage"] == "final"
+    # The stale list, minus the candidate who has since joined a group
+    assert [m["user_id"] for m in provisional["matches"][:2]] == [m["user_id"] for m in stale[1:]]
+    assert len(provisional["matches"]) == 3
+
+    # The final line is what the sync endpoint serves, now from the cache
+    assert final["matches"] == client.get("/api/matches", headers=headers).json()
+    assert stream() == [final]
+
+
+def test_login_and_verify_warm_the_first_match_fetch(db):
+    """Signing in caches the user's top 3; only the first fetch after it is counted."""
+    rng = random.Random(17)
+    me = add_user(db, rng, 0, email_verified=False, verification_token="123456",
+                  password_hash=hash_password("secret"))
+    populate(db, rng, me, 1, 30)
+    client = TestClient(app)
+    match_worker.drain()
+    before = metrics.snapshot()
+
+    def counted(name):
+        return metrics.get(name) - before.get(name, 0)
+
+    response = client.post("/auth/verify", json={"email": me.email, "code": "123456"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    match_worker.drain()
+
+    db.expire_all()
+    assert client.get("/api/matches", headers=headers).json() == find_potential_matches(db, me, 3)
+    assert (counted("warmup.first_fetches"), counted("warmup.first_fetches_warm")) == (1, 1)
+    client.get("/api/matches", headers=headers)
+    assert counted("warmup.first_fetches") == 1
+
+    # Repeated logins queue one warm job, which finds the list fresh
+    match_cache.clear()
+    for _ in range(3):
+        assert client.post("/auth/login", json={"email": me.email, "password": "secret"}).status_code == 200
+    assert match_worker.drain() == 1
+    assert counted("warmup.rebuilds") == 1 and counted("warmup.warmed") == 2
+
+    # A fetch before the warm job ran is cold
+    client.post("/auth/login", json={"email": me.email, "password": "secret"})
+    match_cache.clear()
+    db.query(UserMatchCandidate).delete()
+    db.commit()
+    client.get("/api/matches", headers=headers)
+    assert (counted("warmup.first_fetches"), counted("warmup.first_fetches_warm")) == (2, 1)
+    match_worker.drain()
+
+
+def test_match_pipeline_stages_are_counted_and_timed(db, monkeypatch):
+    """Live ranking records every stage and filter, and can report them in Server-Timing."""
+    rng = random.Random(19)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 40)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    client = TestClient(app)
+    monkeypatch.setattr(settings, "MATCH_SERVER_TIMING", True)
+    metrics.reset()
+
+    response = client.get("/api/matches", headers=headers)
+    assert response.status_code == 200
+    timed = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert timed == ["matches.cache", "matches.stored", "matches.load", "matches.score",
+                     "matches.profiles", "matches.serialize"]
+
+    pipeline = metrics.stage_stats()
+    stages, filters = pipeline["stages"], pipeline["filters"]
+    assert stages["matches.score"]["calls"] == 1 and stages["matches.score"]["wall_ms_avg"] >= 0
+    assert stages["matches.profiles"]["rows"] == 3 and stages["matches.profiles"]["json_bytes"] > 0
+    distance, hard = filters["matches.distance"], filters["matches.hard_filters"]
+    assert distance["in"] == stages["matches.load"]["rows"] >= distance["out"]
+    assert hard["in"] == distance["out"] and hard["out"] == stages["matches.score"]["candidates"]
+
+    # Served from the cache: only the cache lookup is timed
+    response = client.get("/api/matches", headers=headers)
+    assert response.headers["Server-Timing"].startswith("matches.cache;dur=")
+    assert "matches.score" not in response.headers["Server-Timing"]
+
+    monkeypatch.setattr(settings, "MATCH_SERVER_TIMING", False)
+    assert "Server-Timing" not in client.get("/api/matches", headers=headers).headers
+
+
+def test_match_requests_store_scores_for_the_inbox(db):
+    """Requests are scored once when sent; the inbox reads them in one query."""
+    rng = random.Random(13)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 20)
+    assert backfill_request_scores(db) == 2
+
+    sender = add_user(db, rng, 21)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    sender_headers = {"Authorization": f"Bearer {create_access_token({'user_id': sender.id})}"}
+    client = TestClient(app)
+    assert client.post("/api/matches/request", headers=sender_headers, json={"to_user_id": me.id}).status_code == 200
+
+    with count_queries() as few:
+        inbox = client.get("/api/matches/requests", headers=headers).json()
+    assert len(inbox) == 3
+    for entry in inbox:
+        other = db.query(User).filter(User.id == entry["from_user"]["user_id"]).first()
+        assert entry["from_user"]["compatibility_score"] == calculate_compatibility_score(me, other)
+        assert entry["score_breakdown"] == calculate_score_breakdown(me, other)
+
+    populate(db, rng, me, 22, 20)
+    backfill_request_scores(db)
+    with count_queries() as more:
+        inbox = client.get("/api/matches/requests", headers=headers).json()
+    assert len(inbox) == 4
+    assert len(more) == len(few)
+
+
+def test_ranked_pages_follow_the_snapshot(db):
+    """Cursor pages concatenate to the full ranking and are dropped on eligibility changes."""
+    rng = random.Random(17)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 40)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    client = TestClient(app)
+    expected = [candidate_id for candidate_id, _ in rank_potential_matches(db, me)]
+    created = metrics.get("match_snapshots.created")
+
+    first = client.get("/api/matches/ranked?limit=7", headers=headers).json()
+    seen, cursor = [m["user_id"] for m in first["matches"]], first["next_cursor"]
+    page_queries = []
+    while cursor:
+        with count_queries() as statements:
+            page = client.get(f"/api/matches/ranked?limit=7&cursor={cursor}", headers=headers).json()
+        page_queries.append(len(statements))
+        seen += [m["user_id"] for m in page["matches"]]
+        cursor = page["next_cursor"]
+    assert seen == expected
+    # Auth, group check and one profile query: the pool is not ranked again
+    assert max(page_queries) <= 3
+    assert metrics.get("match_snapshots.created") == created + 1
+
+    second = client.get("/api/matches/ranked?limit=7", headers=headers).json()
+    target = second["matches"][0]["user_id"]
+    assert client.post("/api/matches/request", headers=headers, json={"to_user_id": target}).status_code == 200
+    page = client.get(f"/api/matches/ranked?limit=7&cursor={second['next_cursor']}", headers=headers).json()
+    assert [m["user_id"] for m in page["matches"]] == [c for c in expected if c != target][7:14]
+
+    assert client.get("/api/matches/ranked?cursor=not-a-cursor", headers=headers).status_code == 400
+
+
+def test_feature_snapshot_ranks_like_the_database(db, monkeypatch, tmp_path):
+    """Rankings read from the mapped snapshot equal the SQL path, and new versions swap in."""
+    rng = random.Random(31)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 40)
+    add_user(db, rng, 41, age_preference=None, personality={"openness": 7.5})
+    add_user(db, rng, 42, email_verified=False)
+    for n in range(43, 53):
+        add_user(
+            db, rng, n,
+            gender=rng.choice(["She/her", "He/him", "They/them"]),
+            gender_preference=rng.choice([["Any"], ["Female"], ["Male", "Non-binary"]]),
+            deal_breakers=rng.choice([[], ["No ghosting"]]),
+            commitment_level=rng.choice(["Just exploring", None]),
+            gender_collab_only=n % 5 == 0,
+        )
+    users = db.query(User).order_by(User.id).all()
+    expected = {user.id: rank_potential_matches(db, user) for user in users}
+    top = {user.id: rank_potential_matches(db, user, 3) for user in users}
+
+    monkeypatch.setattr(settings, "MATCH_FEATURES_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "MATCH_FEATURES_CHECK_SECONDS", 0)
+    stats = feature_snapshots.publish(db)
+    snapshot = feature_snapshots.current()
+    assert stats["users"] == len(users) and snapshot.version == 1
+    assert not snapshot.columns["personality"].flags.writeable
+
+    served = metrics.get("feature_snapshots.requests")
+    for user in users:
+        assert rank_potential_matches(db, user) == expected[user.id], user.id
+        assert rank_potential_matches(db, user, 3) == top[user.id], user.id
+    assert metrics.get("feature_snapshots.requests") == served + 2 * len(users)
+
+    # Group joins after publishing are caught before results go out
+    joined = top[me.id][0][0]
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add(GroupMember(group_id=group.id, user_id=joined, status="active"))
+    db.commit()
+    assert rank_potential_matches(db, me, 3) == [m for m in expected[me.id] if m[0] != joined][:3]
+
+    # New users appear once a new version is published; old files are pruned
+    newcomer = add_user(db, rng, 60, interests=me.interests, personality=me.personality, primary_goal=me.primary_goal)
+    feature_snapshots.mark_dirty()
+    assert feature_snapshots.publish_if_due(db) is None
+    monkeypatch.setattr(settings, "MATCH_FEATURES_MIN_INTERVAL_SECONDS", 0)
+    assert feature_snapshots.publish_if_due(db)["version"] == 2
+    feature_snapshots.publish(db)
+    assert feature_snapshots.current().version == 3
+    assert len([f for f in os.listdir(tmp_path) if f.startswith("features-")]) == 2
+    assert newcomer.id in [c for c, _ in rank_potential_matches(db, me)]
+
+
+def test_incremental_top_k_matches_full_rebuild(db, monkeypatch):
+    """Pushing and popping users leaves every list as a rebuild would."""
+    monkeypatch.setattr(settings, "MATCH_CANDIDATES_TOP_K", 5)
+    rng = random.Random(17)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 30)
+    for n in range(31, 36):
+        add_user(db, rng, n, age_preference={"min": 25, "max": 32})
+    users = db.query(User).all()
+    for user in users:
+        rebuild_match_candidates(db, user.id)
+
+    patched = set()
+
+    def apply(result):
+        changed, refill = result
+        patched.update(changed)
+        for owner_id in refill:
+            rebuild_match_candidates(db, owner_id)
+
+    # A new user verifies
+    newcomer = add_user(db, rng, 36, email_verified=False)
+    newcomer.email_verified = True
+    db.commit()
+    rebuild_match_candidates(db, newcomer.id)
+    apply(push_candidate(db, newcomer.id))
+
+    # Profile edits that raise and lower scores
+    for user in users[1:6]:
+        user.personality = {trait: rng.randint(1, 10) for trait in PERSONALITY_TRAITS}
+        user.age = rng.randint(20, 40)
+        db.commit()
+        rebuild_match_candidates(db, user.id)
+        apply(push_candidate(db, user.id))
+
+    # Users leave the pool
+    leaving = [users[6].id, users[7].id]
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add_all([GroupMember(group_id=group.id, user_id=u, status="active") for u in leaving])
+    db.commit()
+    for user_id in leaving:
+        rebuild_match_candidates(db, user_id)
+    apply(pop_candidates(db, leaving))
+
+    assert len(patched) > 10
+    for user in db.query(User).all():
+        db.refresh(user)
+        grouped = db.query(GroupMember).filter(GroupMember.user_id == user.id).first()
+        expected = [] if grouped else rank_potential_matches(db, user, 5)
+        assert stored_list(db, user.id) == expected, user.id
+
+
+def test_cohort_shards_fall_back_and_stay_consistent(db, monkeypatch):
+    """Sharded ranking, incremental patches and the batch agree, with fallback."""
+    monkeypatch.setattr(settings, "MATCH_CANDIDATES_TOP_K", 5)
+    rng = random.Random(29)
+    users = [add_user(db, rng, n, country=rng.choice(["United Kingdom", "France"])) for n in range(40)]
+    users += [add_user(db, rng, n, country="Iceland") for n in range(40, 42)]
+
+    unsharded = {user.id: {c for c, _ in rank_potential_matches(db, user)} for user in users}
+    cohorts = {user.id: user.cohort for user in users}
+    monkeypatch.setattr(settings, "MATCH_SHARDING_ENABLED", True)
+
+    fallbacks = metrics.get("match_shards.fallbacks")
+    for user in users:
+        same = {c for c in unsharded[user.id] if cohorts[c] == user.cohort}
+        expected = same if len(same) >= settings.MATCH_SHARD_MIN_MATCHES else unsharded[user.id]
+        assert {c for c, _ in rank_potential_matches(db, user)} == expected
+    assert metrics.get("match_shards.fallbacks") > fallbacks
+
+    for user in users:
+        rebuild_match_candidates(db, user.id)
+
+    def apply(result):
+        for owner_id in result[1]:
+            rebuild_match_candidates(db, owner_id)
+
+    # Moving into Iceland lifts its shard to the minimum; moving out shrinks another
+    for user, country in ((users[0], "Iceland"), (users[1], "Germany"), (users[2], "France")):
+        user.country = country
+        sync_cohort(user)
+        db.commit()
+        rebuild_match_candidates(db, user.id)
+        apply(push_candidate(db, user.id))
+
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add(GroupMember(group_id=group.id, user_id=users[3].id, status="active"))
+    db.commit()
+    rebuild_match_candidates(db, users[3].id)
+    apply(pop_candidates(db, [users[3].id]))
+
+    expected = {}
+    for user in users:
+        db.refresh(user)
+        expected[user.id] = [] if user is users[3] else rank_potential_matches(db, user, 5)
+        assert stored_list(db, user.id) == expected[user.id], user.id
+
+    stats = recompute_all_matches(db, workers=2)
+    assert stats["shards"] >= 4 and stats["fallback_users"] > 0
+    assert {user.id: stored_list(db, user.id) for user in users} == expected
+
+
+def test_batch_recompute_matches_per_user_rebuild(db):
+    """The process-pool batch writes the same lists as one rebuild per user."""
+    rng = random.Random(23)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 40)
+    add_user(db, rng, 41, age_preference={"min": 25, "max": 30})
+    add_user(db, rng, 42, age_preference=None)
+    for n in range(43, 53):
+        add_user(
+            db, rng, n,
+            gender=rng.choice(["She/her", "He/him", "They/them"]),
+            gender_preference=rng.choice([["Any"], ["Female"], ["Male", "Non-binary"]]),
+            commitment_level=rng.choice(["Just exploring", None]),
+            deal_breakers=rng.choice([[], ["No ghosting"]]),
+            age_collab_only=n % 4 == 0,
+            gender_collab_only=n % 5 == 0,
+        )
+
+    expected = {}
+    for user in db.query(User).all():
+        rebuild_match_candidates(db, user.id)
+        expected[user.id] = stored_list(db, user.id)
+
+    stats = recompute_all_matches(db, workers=3)
+    assert stats["users"] > 0 and stats["pairs_per_second"] > 0
+    assert {user_id: stored_list(db, user_id) for user_id in expected} == expected
+
+
+def test_mutual_max_distance_is_honored_everywhere(db):
+    """Distance rules match across live ranking, incremental and batch lists."""
+    assert resolve_location("NYC") == resolve_location("New York, United States")
+    assert resolve_location("Atlantis") is None
+    london = resolve_location("London", "United Kingdom")
+    assert len(geohash_cover(*london, 5)) <= 16 and geohash_cover(*london, 25000) == [""]
+
+    rng = random.Random(31)
+    cities = ["London", "Paris", "Manchester", "Atlantis"]
+    users = [
+        add_user(db, rng, n, location=rng.choice(cities), max_distance=rng.choice([5, 300, 400, 20000]))
+        for n in range(40)
+    ]
+
+    def allowed(a, b):
+        if a.latitude is None or b.latitude is None:
+            return True
+        distance = distances_km(a.latitude, a.longitude, [b.latitude], [b.longitude])[0]
+        return distance <= min(a.max_distance, b.max_distance)
+
+    for user in users:
+        matched = {m["user_id"] for m in find_potential_matches(db, user, limit=100)}
+        assert matched == {o.id for o in users if o.id != user.id and allowed(user, o)}
+
+    expected = {}
+    for user in users:
+        rebuild_match_candidates(db, user.id)
+        expected[user.id] = stored_list(db, user.id)
+
+    # A move is pushed into the other users' lists incrementally
+    mover = users[0]
+    mover.location = "Paris" if mover.location != "Paris" else "London"
+    sync_coordinates(mover)
+    db.commit()
+    push_candidate(db, mover.id)
+    for user in users[1:]:
+        listed = mover.id in {candidate_id for candidate_id, _ in stored_list(db, user.id)}
+        if listed or len(stored_list(db, user.id)) < settings.MATCH_CANDIDATES_TOP_K:
+            assert listed == allowed(user, mover)
+
+    for user in users:
+        rebuild_match_candidates(db, user.id)
+        expected[user.id] = stored_list(db, user.id)
+    recompute_all_matches(db, workers=2)
+    assert {user.id: stored_list(db, user.id) for user in users} == expected
+
+    groups, _ = optimize_groups(load_optimizer_users(db), target_size=3, time_budget=5)
+    by_id = {user.id: user for user in users}
+    for member_ids, _ in groups:
+        for a in member_ids:
+            for b in member_ids:
+                assert allowed(by_id[a], by_id[b])
+
+
+def test_group_proposals_respect_hard_constraints(db):
+    """Optimizer groups never pair users who rule each other out."""
+    rng = random.Random(29)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 60)
+    for n in range(61, 71):
+        add_user(
+            db, rng, n,
+            age_preference={"min": 30, "max": 40},
+            commitment_level=rng.choice(["Just exploring", "Fully committed"]),
+            deal_breakers=rng.choice([[], ["No flakiness"]]),
+        )
+
+    stale = GroupProposal(batch_id="old", score=0, status="pending")
+    db.add(stale)
+    db.commit()
+
+    stats = form_group_proposals(db, target_size=3, time_budget=1.0)
+    assert stats["groups"] > 0 and stats["objective"] >= stats["greedy_objective"]
+    db.refresh(stale)
+    assert stale.status == "superseded"
+
+    users = {u.id: u for u in db.query(User).all()}
+    grouped = set()
+    for proposal in db.query(GroupProposal).filter(GroupProposal.batch_id == stats["batch_id"]).all():
+        members = [users[m.user_id] for m in proposal.members]
+        assert 2 <= len(members) <= 3
+        assert proposal.score == sum(
+            calculate_compatibility_score(a, b) for i, a in enumerate(members) for b in members[i + 1:]
+        )
+        for a in members:
+            assert not is_grouped(db, a.id) and a.id not in grouped
+            for b in members:
+                if a is not b:
+                    assert matches_preferences(a, b) and not violates_deal_breakers(a, b)
+        grouped.update(m.id for m in members)
+
+
+def centroid_state(centroid):
+    """Comparable view of a centroid's totals."""
+    return (
+        centroid.member_count, centroid.personality_sums, centroid.personality_counts,
+        centroid.interest_counts, sorted(centroid.goal_counts, key=str),
+    )
+
+
+def test_group_centroids_follow_membership_and_fit_candidates(db):
+    """Centroids update incrementally, a group of one scores like its member, and batch fill is exact."""
+    rng = random.Random(37)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 30)
+    for n in range(31, 41):
+        add_user(
+            db, rng, n,
+            gender=rng.choice(["She/her", "He/him"]),
+            gender_preference=rng.choice([["Any"], ["Female"]]),
+            deal_breakers=rng.choice([[], ["No ghosting"]]),
+            commitment_level=rng.choice(["Just exploring", None]),
+        )
+    assert backfill_group_centroids(db) == 6
+    solo = db.query(GroupMember).filter(GroupMember.status == "active").first()
+    member = db.get(User, solo.user_id)
+
+    # A group of one scores exactly like its member
+    others = [u for u in db.query(User).order_by(User.id).all() if not is_grouped(db, u.id)]
+    groups = GroupFeatures([db.get(GroupCentroid, solo.group_id)])
+    components = centroid_components(groups, CandidatePool(others))
+    for position, other in enumerate(others):
+        breakdown = calculate_score_breakdown(member, other)
+        assert [c[0, position] for c in components] == [breakdown["interests"], breakdown["personality"], breakdown["goal"]]
+
+    # Sender already grouped: accepting joins their group and updates its centroid
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    client = TestClient(app)
+    db.add(MatchRequest(from_user_id=member.id, to_user_id=me.id, status="pending"))
+    db.commit()
+    inbox = client.get("/api/matches/requests", headers=headers).json()
+    fit = [r["group_compatibility_score"] for r in inbox if r["from_user"]["user_id"] == member.id]
+    assert fit == [int(centroid_scores(groups, CandidatePool([me]))[0, 0])]
+    request_id = [r["request_id"] for r in inbox if r["from_user"]["user_id"] == member.id][0]
+    assert client.post(f"/api/matches/{request_id}/accept", headers=headers).json()["group_id"] == solo.group_id
+
+    incremental = centroid_state(db.get(GroupCentroid, solo.group_id))
+    assert incremental[0] == 2
+    assert centroid_state(rebuild_group_centroid(db, solo.group_id)) == incremental
+    assert client.post(f"/api/groups/{solo.group_id}/leave", headers=headers).status_code == 200
+    db.expire_all()
+    assert centroid_state(db.get(GroupCentroid, solo.group_id))[0] == 1
+
+    # Batch suggestions equal scoring every (group, candidate) pair on its own
+    suggestions = suggest_group_members(db, per_group=4)
+    users = {u.id: u for u in db.query(User).all()}
+    candidates = [u for u in users.values() if not is_grouped(db, u.id)]
+    my_fit = {}
+    for centroid in db.query(GroupCentroid).all():
+        members = [users[m.user_id] for m in db.query(GroupMember).filter(
+            GroupMember.group_id == centroid.group_id, GroupMember.status == "active")]
+        features = GroupFeatures([centroid])
+        expected = []
+        for candidate in candidates:
+            if all(
+                matches_preferences(candidate, m) and matches_preferences(m, candidate)
+                and not violates_deal_breakers(candidate, m) and not violates_deal_breakers(m, candidate)
+                and within_mutual_distance(candidate, [m])[0]
+                for m in members
+            ):
+                expected.append((candidate.id, int(centroid_scores(features, CandidatePool([candidate]))[0, 0])))
+        expected.sort(key=lambda pair: (-pair[1], pair[0]))
+        assert suggestions[centroid.group_id] == expected[:4]
+        my_fit.update({centroid.group_id: score for user_id, score in expected if user_id == me.id})
+
+    best = client.get("/api/matches/groups?limit=2", headers=headers).json()
+    assert len(best) == 2
+    assert [(g["group_id"], g["compatibility_score"]) for g in best] == sorted(
+        my_fit.items(), key=lambda pair: (-pair[1], pair[0]))[:2]
+
+
+def test_lobby_pairs_waiting_users_like_greedy_brute_force(db, monkeypatch):
+    """Longest wait first, each user gets their best free partner in the bucket; claims never double up."""
+    monkeypatch.setattr(settings, "LOBBY_WIDEN_SECONDS", 10 ** 6)
+    rng = random.Random(41)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 30)
+    client = TestClient(app)
+    users = db.query(User).order_by(User.id).all()
+    for user in users:
+        headers = {"Authorization": f"Bearer {create_access_token({'user_id': user.id})}"}
+        response = client.post("/api/matches/lobby", headers=headers)
+        assert response.status_code == (400 if is_grouped(db, user.id) else 200)
+
+    # Stagger the queue; a user who joined a group since entering is dropped
+    now = lobby_service._now()
+    entries = db.query(LobbyEntry).order_by(LobbyEntry.user_id).all()
+    for position, entry in enumerate(entries):
+        entry.entered_at = now - timedelta(seconds=rng.randint(0, 1000) + position / 1000)
+    late = entries[-1].user_id
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add(GroupMember(group_id=group.id, user_id=late, status="active"))
+    db.commit()
+
+    waiting = sorted((e for e in entries if e.user_id != late), key=lambda e: (e.entered_at, e.user_id))
+    by_id = {u.id: u for u in users}
+    pending = {frozenset((r.from_user_id, r.to_user_id)) for r in db.query(MatchRequest).all()}
+    buckets = {}
+    for entry in waiting:
+        buckets.setdefault((entry.cohort, entry.score_band), []).append(entry.user_id)
+    expected, taken = set(), set()
+    for members in buckets.values():
+        for user_id in members:
+            if user_id in taken:
+                continue
+            best = None
+            for other_id in members:
+                a, b = by_id[user_id], by_id[other_id]
+                if other_id == user_id or other_id in taken or frozenset((user_id, other_id)) in pending:
+                    continue
+                if not (matches_preferences(a, b) and matches_preferences(b, a)
+                        and not violates_deal_breakers(a, b) and not violates_deal_breakers(b, a)
+                        and within_mutual_distance(a, [b])[0]):
+                    continue
+                score = calculate_compatibility_score(a, b)
+                if score >= settings.LOBBY_MIN_SCORE and (best is None or score > best[1]):
+                    best = (other_id, score)
+            if best:
+                taken.update([user_id, best[0]])
+                expected.add((min(user_id, best[0]), max(user_id, best[0]), best[1]))
+
+    before = metrics.get("lobby.proposals")
+    result = lobby_service.schedule_pairs(db)
+    proposals = db.query(LobbyProposal).all()
+    assert {(p.user_low_id, p.user_high_id, p.compatibility_score) for p in proposals} == expected
+    assert result["proposals"] == len(expected) > 0
+    assert metrics.get("lobby.proposals") - before == len(expected)
+    assert db.query(LobbyEntry).filter(LobbyEntry.user_id == late).first() is None
+
+    # Both users see the proposal; passing puts them back without re-pairing them
+    proposal = proposals[0]
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': proposal.user_low_id})}"}
+    state = client.get("/api/matches/lobby", headers=headers).json()
+    assert state["status"] == "proposed"
+    assert state["proposal"]["partner"]["user_id"] == proposal.user_high_id
+    assert state["proposal"]["partner"]["compatibility_score"] == proposal.compatibility_score
+    assert client.post(f"/api/matches/lobby/{proposal.id}/pass", headers=headers).json()["status"] == "waiting"
+    lobby_service.schedule_pairs(db)
+    db.expire_all()
+    assert db.query(LobbyProposal).filter(
+        LobbyProposal.user_low_id == proposal.user_low_id,
+        LobbyProposal.user_high_id == proposal.user_high_id,
+    ).count() == 1
+
+    # Taking a proposal up with a request closes it and empties both entries
+    other = proposals[1]
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': other.user_low_id})}"}
+    assert client.post("/api/matches/request", json={"to_user_id": other.user_high_id}, headers=headers).status_code == 200
+    db.expire_all()
+    assert db.get(LobbyProposal, other.id).status == "requested"
+    assert db.query(LobbyEntry).filter(LobbyEntry.user_id.in_([other.user_low_id, other.user_high_id])).count() == 0
+
+    # A pass that loaded stale rows can't claim a user another process already paired
+    db.query(LobbyEntry).update({"status": "waiting", "proposal_id": None})
+    db.query(LobbyProposal).delete()
+    db.commit()
+    db.expunge_all()
+    stale = lobby_service._load_waiting(db)
+    target = next(r.id for r in stale if any(r.id in pair[:2] for pair in expected))
+    db.query(LobbyEntry).filter(LobbyEntry.user_id == target).update({"status": "proposed"})
+    db.commit()
+    monkeypatch.setattr(lobby_service, "_load_waiting", lambda session: stale)
+    lobby_service.schedule_pairs(db)
+    claimed = [p for p in db.query(LobbyProposal).all() if target in (p.user_low_id, p.user_high_id)]
+    assert claimed == []
+    assert db.query(LobbyEntry).filter(LobbyEntry.status == "proposed").count() == 2 * db.query(LobbyProposal).count() + 1
+
+    # Users who stop polling drop out
+    db.query(LobbyEntry).update({"last_seen_at": now - timedelta(seconds=settings.LOBBY_IDLE_SECONDS + 1)})
+    db.commit()
+    monkeypatch.undo()
+    lobby_service.schedule_pairs(db)
+    assert db.query(LobbyEntry).count() == 0
+    assert client.get("/api/admin/metrics").json()["lobby"]["waiting"] == 0
+
+
+def test_exclusion_sets_hide_turned_down_pairs_everywhere(db, monkeypatch):
+    """Bloom sets have no false negatives; rejections and passes exclude a pair in every ranking path."""
+    rng = np.random.default_rng(43)
+    members = rng.choice(10 ** 7, 2000, replace=False)
+    others = np.setdiff1d(rng.choice(10 ** 7, 20000, replace=False), members)
+    bloom = ExclusionSet.build(members.tolist(), false_positive_rate=0.01)
+    assert bloom.contains(members).all()
+    assert bloom.contains(others).mean() < 0.02
+    assert 5 in ExclusionSet(bloom.words, bloom.hash_count, [5]) and not ExclusionSet.empty()
+
+    monkeypatch.setattr(settings, "MATCH_EXCLUSION_OVERFLOW_MAX", 1)
+    rng = random.Random(43)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 40)
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    senders = [r.from_user_id for r in db.query(MatchRequest).filter(MatchRequest.to_user_id == me.id).all()]
+    for user in db.query(User).all():
+        rebuild_match_candidates(db, user.id)
+
+    # Each rejection lands in both users' sets; the second overflows and rebuilds mine
+    for request in db.query(MatchRequest).filter(MatchRequest.to_user_id == me.id).all():
+        assert client.post(f"/api/matches/{request.id}/reject", headers=headers).status_code == 200
+    mine = load_exclusions(db, me.id)
+    assert all(sender in mine for sender in senders) and len(mine.overflow) <= 1
+    assert all(me.id in load_exclusions(db, sender) for sender in senders)
+    db.expire_all()
+    assert not {m["user_id"] for m in find_potential_matches(db, me)} & set(senders)
+
+    # A passed lobby proposal excludes the pair and pops them from each other's stored lists
+    partner = rank_potential_matches(db, me, 1)[0][0]
+    proposal = LobbyProposal(user_low_id=me.id, user_high_id=partner, compatibility_score=0,
+                             status="pending", created_at=lobby_service._now())
+    db.add(proposal)
+    db.commit()
+    assert client.post(f"/api/matches/lobby/{proposal.id}/pass", headers=headers).status_code == 200
+    assert partner not in [c for c, _ in stored_list(db, me.id)]
+    assert me.id not in [c for c, _ in stored_list(db, partner)]
+    assert partner not in [c for c, _ in rank_potential_matches(db, me)]
+
+    # Rebuilds, incremental pushes and the batch all agree with the live ranking
+    live = {user.id: rank_potential_matches(db, user, settings.MATCH_CANDIDATES_TOP_K) for user in db.query(User).all()
+            if not is_grouped(db, user.id)}
+    assert me.id not in [c for c, _ in live[partner]]
+    push_candidate(db, partner)
+    assert me.id not in [c for c, _ in stored_list(db, partner)] and partner not in [c for c, _ in stored_list(db, me.id)]
+    recompute_all_matches(db, workers=1)
+    assert {user_id: stored_list(db, user_id) for user_id in live} == live
+
+
+def test_eligibility_bitmap_follows_events_and_reconciles(db, monkeypatch, tmp_path):
+    """Snapshot rankings filtered by the bitmap equal the SQL path; hooks and reconciliation keep it exact."""
+    rng = random.Random(47)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 30)
+    unverified = add_user(db, rng, 31, email_verified=False, verification_token="123456")
+    monkeypatch.setattr(settings, "MATCH_FEATURES_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "MATCH_FEATURES_CHECK_SECONDS", 0)
+    feature_snapshots.publish(db)
+    assert eligibility.rebuild(db) == len([u for u in db.query(User).all() if u.email_verified and not is_grouped(db, u.id)])
+
+    def database_ranking(user):
+        return rank_pool(user, CandidatePool(load_eligible_candidates(db, user)))
+
+    # Verifying, accepting a request and leaving a group flip bits through the hooks
+    client = TestClient(app)
+    assert client.post("/auth/verify", json={"email": unverified.email, "code": "123456"}).status_code == 200
+    request = db.query(MatchRequest).filter(MatchRequest.to_user_id == me.id, MatchRequest.status == "pending").first()
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': me.id})}"}
+    assert client.post(f"/api/matches/{request.id}/accept", headers=headers).status_code == 200
+    db.expire_all()
+    assert not eligibility.is_eligible(me.id) and eligibility.is_eligible(unverified.id)
+    other = db.get(User, [u.id for u in db.query(User).all() if not is_grouped(db, u.id)][0])
+    with count_queries() as statements:
+        ranked = rank_potential_matches(db, other)
+    assert ranked == database_ranking(other)
+    assert unverified.id in [c for c, _ in ranked] and me.id not in [c for c, _ in ranked]
+    assert not any("group_members" in statement for statement in statements)
+
+    group_id = db.query(GroupMember).filter(GroupMember.user_id == me.id).first().group_id
+    assert client.post(f"/api/groups/{group_id}/leave", headers=headers).status_code == 200
+    assert eligibility.is_eligible(me.id)
+
+    # A change made elsewhere is only seen after reconciliation
+    joined = database_ranking(other)[0][0]
+    group = Group()
+    db.add(group)
+    db.flush()
+    db.add(GroupMember(group_id=group.id, user_id=joined, status="active"))
+    db.commit()
+    assert joined in [c for c, _ in rank_potential_matches(db, other)]
+    assert eligibility.reconcile(db) == 1
+    assert not eligibility.is_eligible(joined) and eligibility.stats()["last_drift"] == 1
+    assert rank_potential_matches(db, other) == database_ranking(other)
+
+
+def test_eligibility_refresh_adds_new_users_without_touching_others(db):
+    """A user registered after the rebuild is added on verification; everyone else keeps their bit."""
+    rng = random.Random(53)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 20)
+    eligibility.rebuild(db)
+    eligible_before = eligibility.user_ids[eligibility.bits].tolist()
+    assert me.id in eligible_before
+
+    newcomer = add_user(db, rng, 21, email_verified=False, verification_token="123456")
+    updates = metrics.get("eligibility.updates")
+    response = TestClient(app).post("/auth/verify", json={"email": newcomer.email, "code": "123456"})
+    assert response.status_code == 200
+
+    assert eligibility.mask(np.array(eligible_before)).all()
+    assert eligibility.is_eligible(newcomer.id)
+    assert metrics.get("eligibility.updates") == updates + 1
+    assert eligibility.reconcile(db) == 0
+
+
+def test_candidate_index_retrieval_is_rescored_exactly(db, monkeypatch):
+    """With the ANN index on, a small pool ranks exactly as brute force."""
+    rng = random.Random(5)
+    me = add_user(db, rng, 0)
+    populate(db, rng, me, 1, 60)
+    exhaustive = find_potential_matches(db, me, limit=10)
+
+    build_candidate_index(db)
+    monkeypatch.setattr(settings, "MATCH_ANN_MIN_POOL", 1)
+    try:
+        assert find_potential_matches(db, me, limit=10) == exhaustive
+
+        candidate_index.remove(exhaustive[0]["user_id"])
+        assert exhaustive[0]["user_id"] not in candidate_index.query(me, 300)
+    finally:
+        candidate_index.clear()
+        candidate_index.built = False
+
+
+def test_candidate_index_falls_back_when_retrieval_is_too_far(db, monkeypatch):
+    """Retrieved candidates out of range don't leave a large pool short of matches."""
+    rng = random.Random(23)
+    me = add_user(db, rng, 0)
+    # Far away clones of me: the index ranks them first, the distance rule drops them all
+    for n in range(1, 41):
+        add_user(db, rng, n, location="Manchester", interests=me.interests, personality=me.personality,
+                 primary_goal=me.primary_goal)
+    for n in range(41, 46):
+        add_user(db, rng, n)
+    exhaustive = find_potential_matches(db, me, limit=3)
+    assert len(exhaustive) == 3
+
+    build_candidate_index(db)
+    monkeypatch.setattr(settings, "MATCH_ANN_MIN_POOL", 1)
+    monkeypatch.setattr(settings, "MATCH_ANN_CANDIDATES", 10)
+    try:
+        fallbacks = metrics.get("candidate_index.fallbacks")
+        assert find_potential_matches(db, me, limit=3) == exhaustive
+        assert metrics.get("candidate_index.fallbacks") == fallbacks + 1
+    finally:
+        candidate_index.clear()
+        candidate_index.built = False
+
+
+def test_match_cache_invalidation_and_eviction():
+    """Entries drop when a shown candidate changes, and the LRU stays bounded."""
+    cache = MatchCache(max_entries=2, ttl_seconds=60)
+    cache.set(1, 3, [{"user_id": 10}, {"user_id": 11}])
+    cache.set(2, 3, [{"user_id": 12}])
+
+    assert cache.get(1, 3) == [{"user_id": 10}, {"user_id": 11}]
+    assert cache.get(1, 5) is None
+
+    cache.invalidate_candidates([12])
+    assert cache.get(2, 3) is None
+    assert cache.get(1, 3) is not None
+
+    evictions = metrics.get("match_cache.evictions")
+    cache.set(3, 3, [])
+    cache.set(4, 3, [])
+    assert metrics.get("match_cache.evictions") == evictions + 1
+    assert cache.stats()["size"] == 2
+
+    # Each shard has its own bound
+    sharded = MatchCache(max_entries=10, ttl_seconds=60, max_entries_per_shard=2)
+    for user_id in (1, 2, 3):
+        sharded.set(user_id, 3, [], shard="uk:friendship")
+    sharded.set(4, 3, [], shard="fr:friendship")
+    assert sharded.get(1, 3) is None and sharded.get(3, 3) == [] and sharded.get(4, 3) == []
+    assert sharded.stats()["shards"] == 2
+
+
+class DictBackend:
+    """In-memory stand-in for the Redis backend, shared by several caches."""
+
+    def __init__(self):
+        self.entries, self.owners = {}, {}
+
+    def get(self, user_id):
+        return json.loads(self.entries[user_id]) if user_id in self.entries else None
+
+    def set(self, user_id, entry, candidate_ids):
+        self.entries[user_id] = json.dumps(entry)
+        for candidate_id in candidate_ids:
+            self.owners.setdefault(candidate_id, set()).add(user_id)
+
+    def delete_users(self, user_ids):
+        return sum(self.entries.pop(user_id, None) is not None for user_id in user_ids)
+
+    def owners_of(self, candidate_ids):
+        return set().union(*(self.owners.get(c, set()) for c in candidate_ids))
+
+
+def test_shared_match_cache_invalidates_every_process():
+    """With a shared backend, an invalidation in one process is seen by the others."""
+    backend = DictBackend()
+    first = MatchCache(max_entries=10, ttl_seconds=60, shared_backend=backend)
+    second = MatchCache(max_entries=10, ttl_seconds=60, shared_backend=backend)
+
+    first.set(1, 3, [{"user_id": 10}])
+    first.set(2, 3, [{"user_id": 11}])
+    assert second.get(1, 3) == [{"user_id": 10}] and second.get(2, 3) == [{"user_id": 11}]
+
+    first.invalidate_candidates([10])
+    assert second.get(1, 3) is None and first.get(1, 3) is None
+    second.invalidate_users([2])
+    assert first.get(2, 3) is None
@@ -20,14 +20,19 @@ function MatchingScreen({ data, onBack, onLogout, onProfile, onGroupFormed }) {
     loadMatches();
     checkExistingGroup();
     loadRequests();
-    // One interval covers incoming requests, outgoing requests and group
-    // creation, so a user waiting on someone else's answer gets moved on
-    // automatically.
+    matchingAPI.enterLobby().then(showProposal).catch(() => {});
+    // One interval covers incoming requests, outgoing requests, group
+    // creation and the lobby, so a user waiting on someone else's answer
+    // gets moved on automatically and stays in the lobby while here.
     const pollInterval = setInterval(() => {
       loadRequests();
       checkExistingGroup();
+      matchingAPI.getLobbyStatus().then(showProposal).catch(() => {});
     }, 5000);
-    return () => clearInterval(pollInterval);
+    return () => {
+      clearInterval(pollInterval);
+      matchingAPI.leaveLobby().catch(() => {});
+    };
   // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
@@ -40,9 +45,18 @@ function MatchingScreen({ data, onBack, onLogout, onProfile, onGroupFormed }) {
   const loadMatches = async () => {
     try {
       setLoading(true);
-      const matchesData = await matchingAPI.getMatches();
-      setMatches(matchesData);
-      setTimeout(() => setMatchState('found'), 1500);
+      // Cards appear with the first (possibly provisional) answer and are
+      // replaced when the final ranking arrives. A lobby partner shown in
+      // the meantime stays first.
+      await matchingAPI.streamMatches(({ matches: matchesData }) => {
+        setMatches(prev => {
+          const partner = prev.find(m => m.lobby);
+          return partner
+            ? [partner, ...matchesData.filter(m => m.user_id !== partner.user_id)]
+            : matchesData;
+        });
+        setMatchState('found');
+      });
     } catch (err) {
       console.error('Error loading matches:', err);
       // Don't show error if user is already in a group — that's expected
@@ -56,6 +70,13 @@ function MatchingScreen({ data, onBack, onLogout, onProfile, onGroupFormed }) {
     }
   };
 
+  // A lobby proposal is someone else waiting right now: show them first
+  const showProposal = (lobby) => {
+    const partner = lobby?.proposal?.partner;
+    if (!partner) return;
+    setMatches(prev => [{ ...partner, lobby: true }, ...prev.filter(m => m.user_id !== partner.user_id)]);
+  };
+
   const checkExistingGroup = async () => {
     try {
       const groupData = await groupsAPI.getMyGroup();
@@ -78,6 +78,41 @@ export const matchingAPI = {
     const response = await api.get('/api/matches');
     return response.data;
   },
+  // Reads /api/matches/stream (newline-delimited JSON), calling onStage
+  // with each { stage, matches } line: maybe a 'provisional' answer, then
+  // the 'final' one. axios can't read a response as it arrives, so this
+  // uses fetch; resolves with the final matches.
+  streamMatches: async (onStage) => {
+    const token = localStorage.getItem('auth_token');
+    const response = await fetch(`${API_BASE_URL}/api/matches/stream`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}));
+      const err = new Error(data.detail || 'Failed to load matches');
+      err.response = { status: response.status, data };
+      throw err;
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let final = null;
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const stage = JSON.parse(line);
+        if (stage.stage === 'final') final = stage.matches;
+        onStage(stage);
+      }
+      if (done) break;
+    }
+    if (final === null) throw new Error('Match stream ended early');
+    return final;
+  },
   sendMatchRequest: async (toUserId) => {
     const response = await api.post('/api/matches/request', { to_user_id: toUserId });
     return response.data;
@@ -98,6 +133,22 @@ export const matchingAPI = {
     const response = await api.post(`/api/matches/${requestId}/reject`);
     return response.data;
   },
+  enterLobby: async () => {
+    const response = await api.post('/api/matches/lobby');
+    return response.data;
+  },
+  getLobbyStatus: async () => {
+    const response = await api.get('/api/matches/lobby');
+    return response.data;
+  },
+  leaveLobby: async () => {
+    const response = await api.delete('/api/matches/lobby');
+    return response.data;
+  },
+  passLobbyProposal: async (proposalId) => {
+    const response = await api.post(`/api/matches/lobby/${proposalId}/pass`);
+    return response.data;
+  },
 };
 
 // Groups API